@@ -12,6 +12,12 @@ import base64
 from typing import Optional, List
 from io import BytesIO
 import uuid
+import json
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
 
 # ============================================================
 # CONFIGURACIÓN
@@ -37,6 +43,69 @@ app.add_middleware(
 # FUNCIONES AUXILIARES
 # ============================================================
 
+# Tamaño de salida de cada pipeline: subir más resolución no mejora el resultado
+UPLOAD_TARGET_SIZES = {"amazon": 1000, "instagram": 1080, "ebay": 1600}
+UPLOAD_QUALITY = int(os.getenv("PREMIUM_UPLOAD_QUALITY", "90"))
+
+
+def shrink_for_upload(image_bytes: bytes, pipeline: str) -> tuple:
+    """
+    Reducir la imagen al tamaño del pipeline antes del base64
+    (orientación EXIF aplicada, sin EXIF; JPEG salvo que tenga transparencia)
+
+    Returns: (bytes, mime_type)
+    """
+    if Image is None:
+        return image_bytes, "image/jpeg"
+
+    try:
+        size = UPLOAD_TARGET_SIZES.get(pipeline, UPLOAD_TARGET_SIZES["amazon"])
+        img = Image.open(BytesIO(image_bytes))
+        img.draft("RGB", (size, size))
+        icc_profile = img.info.get("icc_profile")
+        img = ImageOps.exif_transpose(img)
+
+        has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+        img = img.convert("RGBA" if has_alpha else "RGB")
+        img.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+        # El perfil ICC se conserva: sin él los colores de Adobe RGB/P3 cambiarían
+        save_kwargs = {"icc_profile": icc_profile} if icc_profile else {}
+        buffer = BytesIO()
+        if has_alpha:
+            img.save(buffer, "PNG", optimize=True, **save_kwargs)
+            return buffer.getvalue(), "image/png"
+        img.save(buffer, "JPEG", quality=UPLOAD_QUALITY, optimize=True, **save_kwargs)
+        return buffer.getvalue(), "image/jpeg"
+    except Exception as e:
+        print(f"⚠️ Upload shrink failed, sending original: {e}")
+        return image_bytes, "image/jpeg"
+
+
+def stream_json_with_image(payload: dict, image_bytes: bytes, mime_type: str) -> tuple:
+    """
+    Cuerpo JSON en streaming: el base64 de la imagen se genera por bloques
+    mientras se envía, en lugar de tener varias copias completas en memoria
+
+    payload debe tener "__IMAGE__" donde va la imagen.
+    Returns: (content_length, iterador async de bytes)
+    """
+    prefix, suffix = json.dumps(payload).split("__IMAGE__")
+    prefix = (prefix + f"data:{mime_type};base64,").encode()
+    suffix = suffix.encode()
+    content_length = len(prefix) + 4 * ((len(image_bytes) + 2) // 3) + len(suffix)
+
+    async def body():
+        yield prefix
+        view = memoryview(image_bytes)
+        chunk = 3 * 16 * 1024  # Múltiplo de 3: los bloques se concatenan bien
+        for start in range(0, len(view), chunk):
+            yield base64.b64encode(view[start:start + chunk])
+        yield suffix
+
+    return content_length, body()
+
+
 async def call_qwen_api(image_bytes: bytes, pipeline: str = "amazon") -> bytes:
     """
     Procesar imagen con Qwen VL API
@@ -65,8 +134,8 @@ Remove all background elements."""
 
     prompt = prompts.get(pipeline, prompts["amazon"])
 
-    # Encode imagen a base64
-    image_b64 = base64.b64encode(image_bytes).decode('utf-8')
+    # Reducir al tamaño del pipeline antes de subir
+    upload_bytes, mime_type = shrink_for_upload(image_bytes, pipeline)
 
     # Configuración Qwen API
     api_key = os.getenv("DASHSCOPE_API_KEY")
@@ -88,7 +157,7 @@ Remove all background elements."""
                 {
                     "role": "user",
                     "content": [
-                        {"image": f"data:image/jpeg;base64,{image_b64}"},
+                        {"image": "__IMAGE__"},
                         {"text": prompt}
                     ]
                 }
@@ -99,12 +168,15 @@ Remove all background elements."""
         }
     }
 
-    print(f"🔄 Calling Qwen API for pipeline: {pipeline}")
+    content_length, body = stream_json_with_image(payload, upload_bytes, mime_type)
+    headers["Content-Length"] = str(content_length)
+
+    print(f"🔄 Calling Qwen API for pipeline: {pipeline} ({len(upload_bytes) // 1024} KB upload)")
 
     # Llamar a Qwen API
     async with httpx.AsyncClient(timeout=60.0) as client:
         try:
-            response = await client.post(url, json=payload, headers=headers)
+            response = await client.post(url, content=body, headers=headers)
 
             if response.status_code != 200:
                 print(f"❌ Qwen API error: {response.text}")
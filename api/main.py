@@ -17,6 +17,11 @@ import dashscope
 from dashscope import MultiModalConversation
 from io import BytesIO
 
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
 # ============================================================
 # CONFIGURACIÓN
 # ============================================================
@@ -104,6 +109,45 @@ async def check_and_use_credits(user_id: str, credits_needed: int = 3) -> bool:
         return False
 
 
+# Tamaño de salida de cada pipeline: subir más resolución no mejora el resultado
+UPLOAD_TARGET_SIZES = {"amazon": 1000, "instagram": 1080, "ebay": 1600}
+UPLOAD_QUALITY = int(os.getenv("PREMIUM_UPLOAD_QUALITY", "90"))
+
+
+def shrink_for_upload(image_bytes: bytes, pipeline: str) -> tuple:
+    """
+    Reducir la imagen al tamaño del pipeline antes del base64
+    (orientación EXIF aplicada, sin EXIF; JPEG salvo que tenga transparencia)
+
+    Returns: (bytes, mime_type)
+    """
+    if Image is None:
+        return image_bytes, "image/jpeg"
+
+    try:
+        size = UPLOAD_TARGET_SIZES.get(pipeline, UPLOAD_TARGET_SIZES["amazon"])
+        img = Image.open(BytesIO(image_bytes))
+        img.draft("RGB", (size, size))
+        icc_profile = img.info.get("icc_profile")
+        img = ImageOps.exif_transpose(img)
+
+        has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+        img = img.convert("RGBA" if has_alpha else "RGB")
+        img.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+        # El perfil ICC se conserva: sin él los colores de Adobe RGB/P3 cambiarían
+        save_kwargs = {"icc_profile": icc_profile} if icc_profile else {}
+        buffer = BytesIO()
+        if has_alpha:
+            img.save(buffer, "PNG", optimize=True, **save_kwargs)
+            return buffer.getvalue(), "image/png"
+        img.save(buffer, "JPEG", quality=UPLOAD_QUALITY, optimize=True, **save_kwargs)
+        return buffer.getvalue(), "image/jpeg"
+    except Exception as e:
+        print(f"⚠️ Upload shrink failed, sending original: {e}")
+        return image_bytes, "image/jpeg"
+
+
 async def call_qwen_api(image_bytes: bytes, pipeline: str) -> bytes:
     """
     Llamar a Qwen Image Edit API usando el SDK oficial
@@ -132,15 +176,16 @@ Remove all background elements."""
 
     prompt = prompts.get(pipeline, prompts["amazon"])
 
-    # Encode imagen a base64
-    image_b64 = base64.b64encode(image_bytes).decode('utf-8')
+    # Reducir al tamaño del pipeline antes del base64
+    upload_bytes, mime_type = shrink_for_upload(image_bytes, pipeline)
+    image_b64 = base64.b64encode(upload_bytes).decode('utf-8')
 
     # Preparar messages según especificación oficial
     messages = [
         {
             "role": "user",
             "content": [
-                {"image": f"data:image/jpeg;base64,{image_b64}"},
+                {"image": f"data:{mime_type};base64,{image_b64}"},
                 {"text": prompt}
             ]
         }
@@ -77,9 +77,73 @@ export default function AppPage() {
     apiClient.setAuthToken('demo_token')
   }, [])
 
-  // Poll for progress updates every 2 seconds while processing
+  // Follow job progress: pushed over Server-Sent Events, polling every 2 seconds as fallback.
+  // One stream per job: it is closed on the job's terminal event, not on every progress update
   useEffect(() => {
-    if (!currentJobId || processingProgress.status === 'completed') return
+    if (!currentJobId) return
+
+    let intervalId: ReturnType<typeof setInterval> | undefined
+    let eventSource: EventSource | undefined
+
+    const applyProgress = (data: any) => {
+      setProcessingProgress({
+        current: data.current,
+        total: data.total,
+        percentage: data.percentage,
+        status: data.status
+      })
+
+      // Update main progress bar
+      setProgress(data.percentage)
+    }
+
+    const finishJob = async () => {
+      // Check final status
+      const statusResponse = await fetch(`${API_URL}/api/v1/status/${currentJobId}`)
+      const statusData = await statusResponse.json()
+      
+      // Map backend response to expected format 
+      console.log('Raw Status Data:', statusData);
+      
+      const mappedStatusData = {
+        ...statusData,
+        successful_files: statusData.successful_files?.map((file: any) => {
+          console.log('Processing file:', file);
+          
+          // Si el archivo ya tiene el formato correcto, devolverlo como está
+          if (typeof file === 'object' && file.success !== undefined) {
+            console.log('File already in correct format:', file);
+            return file;
+          }
+
+          // Mapear la estructura de acuerdo al tipo de dato
+          const fileObj = typeof file === 'string' ? { processed: file } : file;
+          console.log('File object after initial mapping:', fileObj);
+
+          const mappedFile = {
+            success: true,
+            original: fileObj.original || fileObj.processed || fileObj.filename || 'unknown.jpg',
+            processed: fileObj.processed || fileObj.filename || 'unknown.jpg',
+            path: fileObj.path || `${fileObj.processed || fileObj.filename || 'unknown.jpg'}`,
+            shadow_applied: fileObj.shadow_applied || false,
+            shadow_type: fileObj.shadow_type || null
+          };
+
+          console.log('Mapped file:', mappedFile);
+          return mappedFile;
+        }) || []
+      };
+      
+      console.log('Final Mapped Status Data:', mappedStatusData);
+      
+      if (!Array.isArray(mappedStatusData.successful_files)) {
+        console.error('successful_files is not an array:', mappedStatusData.successful_files);
+        mappedStatusData.successful_files = [];
+      }
+      setJobStatus(mappedStatusData);
+      setIsDownloadReady(true)
+      setIsProcessing(false)
+    }
 
     const pollProgress = async () => {
       try {
@@ -91,64 +155,14 @@ export default function AppPage() {
         }
 
         const data = await response.json()
+        applyProgress(data)
 
-        setProcessingProgress({
-          current: data.current,
-          total: data.total,
-          percentage: data.percentage,
-          status: data.status
-        })
-
-        // Update main progress bar
-        setProgress(data.percentage)
-
-        // Stop polling if completed
+        // Stop polling once the job is finished
         if (data.status === 'completed') {
           clearInterval(intervalId)
-          // Check final status
-          const statusResponse = await fetch(`${API_URL}/api/v1/status/${currentJobId}`)
-          const statusData = await statusResponse.json()
-          
-          // Map backend response to expected format 
-          console.log('Raw Status Data:', statusData);
-          
-          const mappedStatusData = {
-            ...statusData,
-            successful_files: statusData.successful_files?.map((file: any) => {
-              console.log('Processing file:', file);
-              
-              // Si el archivo ya tiene el formato correcto, devolverlo como está
-              if (typeof file === 'object' && file.success !== undefined) {
-                console.log('File already in correct format:', file);
-                return file;
-              }
-
-              // Mapear la estructura de acuerdo al tipo de dato
-              const fileObj = typeof file === 'string' ? { processed: file } : file;
-              console.log('File object after initial mapping:', fileObj);
-
-              const mappedFile = {
-                success: true,
-                original: fileObj.original || fileObj.processed || fileObj.filename || 'unknown.jpg',
-                processed: fileObj.processed || fileObj.filename || 'unknown.jpg',
-                path: fileObj.path || `${fileObj.processed || fileObj.filename || 'unknown.jpg'}`,
-                shadow_applied: fileObj.shadow_applied || false,
-                shadow_type: fileObj.shadow_type || null
-              };
-
-              console.log('Mapped file:', mappedFile);
-              return mappedFile;
-            }) || []
-          };
-          
-          console.log('Final Mapped Status Data:', mappedStatusData);
-          
-          if (!Array.isArray(mappedStatusData.successful_files)) {
-            console.error('successful_files is not an array:', mappedStatusData.successful_files);
-            mappedStatusData.successful_files = [];
-          }
-          setJobStatus(mappedStatusData);
-          setIsDownloadReady(true)
+          await finishJob()
+        } else if (data.status === 'error') {
+          clearInterval(intervalId)
           setIsProcessing(false)
         }
       } catch (error) {
@@ -156,12 +170,54 @@ export default function AppPage() {
       }
     }
 
-    // Poll immediately, then every 2 seconds
-    pollProgress()
-    const intervalId = setInterval(pollProgress, 2000)
+    const startPolling = () => {
+      // Poll immediately, then every 2 seconds
+      pollProgress()
+      intervalId = setInterval(pollProgress, 2000)
+    }
+
+    if (typeof EventSource !== 'undefined') {
+      eventSource = new EventSource(`${API_URL}/api/v1/events/${currentJobId}`)
 
-    return () => clearInterval(intervalId)
-  }, [currentJobId, processingProgress.status])
+      eventSource.addEventListener('progress', (event) => {
+        applyProgress(JSON.parse((event as MessageEvent).data))
+      })
+
+      eventSource.addEventListener('image', (event) => {
+        const data = JSON.parse((event as MessageEvent).data)
+        applyProgress({ ...data, percentage: Math.floor((data.current / data.total) * 100), status: 'processing' })
+      })
+
+      eventSource.addEventListener('completed', (event) => {
+        const data = JSON.parse((event as MessageEvent).data)
+        eventSource?.close()
+        applyProgress({ ...data, current: data.total, percentage: 100 })
+        finishJob().catch((error) => console.error('Final status error:', error))
+      })
+
+      eventSource.addEventListener('failed', (event) => {
+        const data = JSON.parse((event as MessageEvent).data)
+        eventSource?.close()
+        console.error('Processing failed:', data.error)
+        applyProgress({ current: 0, total: data.total || 0, percentage: 0, status: 'error' })
+        setIsProcessing(false)
+      })
+
+      eventSource.onerror = () => {
+        // Stream unavailable (proxy, old backend): fall back to polling
+        if (eventSource?.readyState === EventSource.CLOSED && !intervalId) {
+          startPolling()
+        }
+      }
+    } else {
+      startPolling()
+    }
+
+    return () => {
+      eventSource?.close()
+      clearInterval(intervalId)
+    }
+  }, [currentJobId])
 
   // Helper function to check if file is ZIP
   const isZipFile = (file: File) => {
@@ -1,5 +1,6 @@
 import asyncio
 import uuid
+from contextlib import nullcontext
 from pathlib import Path
 from typing import Dict, Any, List, Optional
 from datetime import datetime
@@ -9,6 +10,8 @@ from .image_processor import ImageProcessor
 from .pipelines import PipelineFactory
 from ..database.memory_client import memory_db
 from ..services.simple_processing import remove_background_simple
+from ..services.job_scheduler import get_job_scheduler, caller_tenant, JobTicket, SchedulerBusy
+from ..models.user_models import PlanType
 
 logger = logging.getLogger(__name__)
 
@@ -21,9 +24,10 @@ class BatchProcessor:
         self,
         job_id: str,
         pipeline_type: str,
-        settings: Optional[Dict[str, Any]] = None
+        settings: Optional[Dict[str, Any]] = None,
+        ticket: Optional[JobTicket] = None
     ) -> bool:
-        """Process a batch job with the specified pipeline"""
+        """Process a batch job with the specified pipeline (one scheduler slot per image)"""
 
         if job_id in self.active_jobs:
             logger.warning(f"Job {job_id} is already being processed")
@@ -75,8 +79,9 @@ class BatchProcessor:
                     output_filename = f"{pipeline_type}_{image_file.stem}.jpg"
                     output_path = processed_dir / output_filename
 
-                    # Use simple background removal directly
-                    success = remove_background_simple(str(image_file), str(output_path))
+                    # Use simple background removal directly (off the event loop)
+                    async with (ticket.slot() if ticket else nullcontext()):
+                        success, _ = await asyncio.to_thread(remove_background_simple, str(image_file), str(output_path))
 
                     if success:
                         processed_count += 1
@@ -95,9 +100,6 @@ class BatchProcessor:
                     "failed_files": failed_count
                 })
 
-                # Add small delay to prevent system overload
-                await asyncio.sleep(0.1)
-
             # Final status update
             if failed_count == 0:
                 memory_db.update_job(job_id, {"status": "completed"})
@@ -124,81 +126,66 @@ class BatchProcessor:
             self.active_jobs.pop(job_id, None)
 
 class QueueManager:
+    """
+    Admits jobs through the shared job scheduler and runs them concurrently
+
+    Ordering and fairness between jobs happen per image in the scheduler
+    (see services/job_scheduler.py), so a large job no longer blocks the
+    queue behind it.
+    """
+
     def __init__(self):
         self.processor = BatchProcessor()
-        self.queue: List[Dict[str, Any]] = []
-        self.processing = False
+        self.tickets: Dict[str, JobTicket] = {}
 
     async def add_job(
         self,
         job_id: str,
         pipeline_type: str,
         settings: Optional[Dict[str, Any]] = None,
-        priority: int = 0
-    ):
-        """Add a job to the processing queue"""
-        job_item = {
-            'job_id': job_id,
-            'pipeline_type': pipeline_type,
-            'settings': settings or {},
-            'priority': priority,
-            'added_at': datetime.utcnow()
-        }
-
-        # Insert based on priority (higher priority first)
-        inserted = False
-        for i, item in enumerate(self.queue):
-            if priority > item['priority']:
-                self.queue.insert(i, job_item)
-                inserted = True
-                break
-
-        if not inserted:
-            self.queue.append(job_item)
-
-        logger.info(f"Job {job_id} added to queue (priority: {priority}). Queue length: {len(self.queue)}")
-
-        # Start processing if not already running
-        if not self.processing:
-            asyncio.create_task(self._process_queue())
-
-    async def _process_queue(self):
-        """Process jobs in the queue"""
-        if self.processing:
-            return
-
-        self.processing = True
-
+        priority: int = 0,
+        tenant: Optional[str] = None,
+        plan: PlanType = PlanType.FREE
+    ) -> JobTicket:
+        """Admit a job (raises SchedulerBusy when the queue is full) and start it"""
+        job = memory_db.get_job(job_id) or {}
+        ticket = get_job_scheduler().admit(
+            job_id,
+            tenant or caller_tenant(job.get("user_id")),
+            plan,
+            images=job.get("total_files") or 1,
+            priority=priority
+        )
+        self.tickets[job_id] = ticket
+
+        logger.info(f"Job {job_id} admitted (priority: {priority}). Active jobs: {len(self.tickets)}")
+        asyncio.create_task(self._run_job(ticket, pipeline_type, settings or {}))
+        return ticket
+
+    async def _run_job(self, ticket: JobTicket, pipeline_type: str, settings: Dict[str, Any]):
         try:
-            while self.queue:
-                job_item = self.queue.pop(0)
-                logger.info(f"Processing job {job_item['job_id']} from queue")
+            success = await self.processor.process_job(ticket.job_id, pipeline_type, settings, ticket)
 
-                try:
-                    success = await self.processor.process_job(
-                        job_item['job_id'],
-                        job_item['pipeline_type'],
-                        job_item['settings']
-                    )
-
-                    if success:
-                        logger.info(f"Job {job_item['job_id']} processed successfully")
-                    else:
-                        logger.error(f"Job {job_item['job_id']} processing failed")
+            if success:
+                logger.info(f"Job {ticket.job_id} processed successfully")
+            else:
+                logger.error(f"Job {ticket.job_id} processing failed")
 
-                except Exception as e:
-                    logger.error(f"Error processing job {job_item['job_id']}: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error processing job {ticket.job_id}: {str(e)}")
 
         finally:
-            self.processing = False
+            ticket.close()
+            self.tickets.pop(ticket.job_id, None)
 
     def get_queue_status(self) -> Dict[str, Any]:
         """Get current queue status"""
+        scheduler_stats = get_job_scheduler().get_stats()
         return {
-            'queue_length': len(self.queue),
-            'processing': self.processing,
+            'queue_length': sum(scheduler_stats['waiting'].values()),
+            'processing': bool(self.tickets),
             'active_jobs': list(self.processor.active_jobs.keys()),
-            'next_jobs': [item['job_id'] for item in self.queue[:5]]  # Next 5 jobs
+            'scheduler': scheduler_stats
         }
 
 # Global queue manager instance
@@ -210,7 +197,14 @@ async def start_batch_processing(
     settings: Optional[Dict[str, Any]] = None
 ):
     """Start batch processing for a job (called from router)"""
-    await queue_manager.add_job(job_id, pipeline, settings)
+    try:
+        await queue_manager.add_job(job_id, pipeline, settings)
+    except SchedulerBusy as busy:
+        logger.warning(f"Job {job_id} rejected by scheduler: {busy}")
+        memory_db.update_job(job_id, {
+            "status": "failed",
+            "error_message": f"{busy} - retry in {busy.retry_after:.0f}s"
+        })
 
 async def get_queue_status():
     """Get current queue status"""
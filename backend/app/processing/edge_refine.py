@@ -0,0 +1,133 @@
+"""
+Edge Refinement
+Halo removal on the silhouette band of the alpha mask only
+
+The halo cleanup (erode the mask, then feather it) used to filter the whole
+full-resolution mask, although it only changes pixels near the silhouette:
+inside the product and in the background the mask is flat and both filters
+leave it as is. The mask is split into tiles, a tile is refined only when it
+or one of its neighbours is not flat (alpha neither all 0 nor all 255, or a
+hard 0/255 edge), and those tiles are filtered as horizontal strips with
+enough context around them for the filters' reach, so the output is the
+same as filtering the whole mask while the work follows the perimeter.
+
+Modes (HALO_REFINEMENT):
+    standard    MinFilter(3) + GaussianBlur(0.5)
+    aggressive  binarize at AGGRESSIVE_THRESHOLD, MinFilter(5) + GaussianBlur(1)
+    off         mask unchanged
+"""
+
+import os
+import logging
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+logger = logging.getLogger(__name__)
+
+HALO_MODES = ("standard", "aggressive", "off")
+
+HALO_REFINEMENT = os.getenv("HALO_REFINEMENT", "standard").lower()
+if HALO_REFINEMENT not in HALO_MODES:
+    logger.warning(f"[HALO-REMOVAL] Unknown HALO_REFINEMENT={HALO_REFINEMENT!r}, using 'standard'")
+    HALO_REFINEMENT = "standard"
+
+# Aggressive mode: alpha above this is kept fully opaque, the rest dropped
+AGGRESSIVE_THRESHOLD = int(os.getenv("HALO_AGGRESSIVE_THRESHOLD", "200"))
+
+# Tile side (px) used to find the edge band (>= the largest filter context)
+HALO_TILE = 16
+
+# Above this fraction of edge tiles the whole mask is filtered in one pass
+BAND_MAX_FRACTION = 0.5
+
+# (erosion size, feather radius, context px around a strip)
+# The context covers the erosion radius plus the 3 box passes of the blur.
+_FILTERS = {
+    "standard": (3, 0.5, 4),
+    "aggressive": (5, 1.0, 8),
+}
+
+def _refine(alpha: Image.Image, mode: str) -> Image.Image:
+    size, radius, _ = _FILTERS[mode]
+    return alpha.filter(ImageFilter.MinFilter(size)).filter(ImageFilter.GaussianBlur(radius))
+
+def edge_tiles(mask: np.ndarray, tile: int = HALO_TILE) -> np.ndarray:
+    """
+    Tiles the refinement can change: (rows, cols) bool
+
+    A tile is left out only when it and its 8 neighbours hold one single
+    alpha value (the filters cannot reach further than one tile).
+    """
+    height, width = mask.shape
+    rows = np.arange(0, height, tile)
+    cols = np.arange(0, width, tile)
+    tile_min = np.minimum.reduceat(np.minimum.reduceat(mask, rows, axis=0), cols, axis=1)
+    tile_max = np.maximum.reduceat(np.maximum.reduceat(mask, rows, axis=0), cols, axis=1)
+
+    # 3x3 neighbourhood min / max over tiles (edge tiles padded with themselves)
+    low = np.pad(tile_min, 1, mode="edge")
+    high = np.pad(tile_max, 1, mode="edge")
+    rows_n, cols_n = tile_min.shape
+    near_min = np.min([low[dy:dy + rows_n, dx:dx + cols_n] for dy in range(3) for dx in range(3)], axis=0)
+    near_max = np.max([high[dy:dy + rows_n, dx:dx + cols_n] for dy in range(3) for dx in range(3)], axis=0)
+    return near_min != near_max
+
+def _runs(active_row: np.ndarray) -> List[Tuple[int, int]]:
+    """[start, end) of each run of True values"""
+    padded = np.concatenate(([False], active_row, [False]))
+    changes = np.flatnonzero(padded[1:] != padded[:-1])
+    return list(zip(changes[::2], changes[1::2]))
+
+def refine_halo(alpha: Image.Image, mode: str = None) -> Image.Image:
+    """
+    Erode and feather the silhouette edge of an 'L' mask to remove halos
+
+    Same result as filtering the whole mask, computed on the edge band only.
+
+    Args:
+        alpha: Foreground mask ('L')
+        mode: standard | aggressive | off (default: HALO_REFINEMENT)
+
+    Returns:
+        Refined mask ('L', new image unless mode is 'off')
+    """
+    mode = (mode or HALO_REFINEMENT).lower()
+    if mode == "off":
+        return alpha
+    if mode not in _FILTERS:
+        raise ValueError(f"Unknown halo refinement mode: {mode}")
+
+    if alpha.mode != 'L':
+        alpha = alpha.convert('L')
+    if mode == "aggressive":
+        alpha = alpha.point(lambda value: 255 if value > AGGRESSIVE_THRESHOLD else 0)
+
+    width, height = alpha.size
+    context = _FILTERS[mode][2]
+    active = edge_tiles(np.asarray(alpha), HALO_TILE)
+
+    # Flat mask (all background / all product): nothing to refine
+    if not active.any():
+        return alpha.copy()
+    # Edges all over (small or noisy masks): one pass over the whole mask is cheaper
+    if active.mean() > BAND_MAX_FRACTION:
+        return _refine(alpha, mode)
+
+    refined = alpha.copy()
+    band_pixels = 0
+    for row, active_row in enumerate(active):
+        top, bottom = row * HALO_TILE, min((row + 1) * HALO_TILE, height)
+        for start, end in _runs(active_row):
+            left, right = start * HALO_TILE, min(end * HALO_TILE, width)
+            # Strip plus context, clipped to the mask (the filters extend the border there)
+            box = (max(left - context, 0), max(top - context, 0),
+                   min(right + context, width), min(bottom + context, height))
+            strip = _refine(alpha.crop(box), mode)
+            core = (left - box[0], top - box[1], right - box[0], bottom - box[1])
+            refined.paste(strip.crop(core), (left, top))
+            band_pixels += (right - left) * (bottom - top)
+
+    logger.debug(f"[HALO-REMOVAL] {mode}: refined {band_pixels * 100 // (width * height)}% of the mask")
+    return refined
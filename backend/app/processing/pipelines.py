@@ -3,6 +3,7 @@ from typing import Dict, Any, Tuple
 from pathlib import Path
 
 from .image_processor import ImageProcessor
+from .compositor import composite_on_white
 
 class BasePipeline:
     def __init__(self, processor: ImageProcessor):
@@ -41,15 +42,10 @@ class AmazonPipeline(BasePipeline):
         # Resize image maintaining aspect ratio
         image.thumbnail((1000, 1000), Image.Resampling.LANCZOS)
 
-        # Create white background
-        white_bg = Image.new('RGB', (1000, 1000), (255, 255, 255))
-
-        # Center image on white background
+        # Center image on a white 1000x1000 canvas
         x = (1000 - image.width) // 2
         y = (1000 - image.height) // 2
-        white_bg.paste(image, (x, y), image if image.mode == 'RGBA' else None)
-
-        return white_bg
+        return composite_on_white(image, (1000, 1000), (x, y))
 
     def _optimize_product_coverage(self, image: Image.Image) -> Image.Image:
         # Crop to focus on the main subject (simple center crop with margin)
@@ -82,15 +78,10 @@ class InstagramPipeline(BasePipeline):
         # Resize image maintaining aspect ratio
         image.thumbnail((1080, 1080), Image.Resampling.LANCZOS)
 
-        # Create white background
-        white_bg = Image.new('RGB', (1080, 1080), (255, 255, 255))
-
-        # Center image on white background
+        # Center image on a white 1080x1080 canvas
         x = (1080 - image.width) // 2
         y = (1080 - image.height) // 2
-        white_bg.paste(image, (x, y), image if image.mode == 'RGBA' else None)
-
-        return white_bg
+        return composite_on_white(image, (1080, 1080), (x, y))
 
     def _square_crop(self, image: Image.Image) -> Image.Image:
         width, height = image.size
@@ -150,15 +141,10 @@ class EbayPipeline(BasePipeline):
         # Resize image maintaining aspect ratio
         image.thumbnail((1600, 1600), Image.Resampling.LANCZOS)
 
-        # Create white background
-        white_bg = Image.new('RGB', (1600, 1600), (255, 255, 255))
-
-        # Center image on white background
+        # Center image on a white 1600x1600 canvas
         x = (1600 - image.width) // 2
         y = (1600 - image.height) // 2
-        white_bg.paste(image, (x, y), image if image.mode == 'RGBA' else None)
-
-        return white_bg
+        return composite_on_white(image, (1600, 1600), (x, y))
 
     def _reduce_noise(self, image: Image.Image) -> Image.Image:
         # Apply subtle blur and then sharpen to reduce noise while maintaining detail
@@ -190,6 +176,12 @@ class PipelineFactory:
 
         return cls._pipelines[pipeline_type](processor)
 
+    @classmethod
+    def get_target_size(cls, pipeline_type: str) -> Tuple[int, int]:
+        """Output size of a pipeline (falls back to Amazon's 1000x1000)"""
+        pipeline_class = cls._pipelines.get(pipeline_type, AmazonPipeline)
+        return pipeline_class(None).target_size
+
     @classmethod
     def get_available_pipelines(cls) -> Dict[str, Dict[str, Any]]:
         processor = ImageProcessor()  # Temporary processor for info
@@ -7,8 +7,13 @@ import cv2
 import numpy as np
 from PIL import Image, ImageFilter, ImageEnhance, ImageDraw
 import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Tuple, Optional
+from typing import Dict, Tuple, Optional, Union
+
+from .compositor import composite_on_white
 
 logger = logging.getLogger(__name__)
 
@@ -32,22 +37,7 @@ class ShadowEffects:
             img = Image.open(image_path).convert('RGBA')
             logger.info(f"[SHADOW] Imagen cargada: {img.size[0]}x{img.size[1]} pixels")
 
-            # Aplicar sombra según tipo
-            if shadow_type in self.shadow_types:
-                result_img = self.shadow_types[shadow_type](img, **shadow_params)
-                logger.info(f"[SUCCESS] Sombra '{shadow_type}' aplicada exitosamente")
-            else:
-                logger.warning(f"[WARNING] Tipo de sombra '{shadow_type}' no reconocido, usando original")
-                result_img = img.convert('RGB')
-
-            # Las sombras ya incluyen fondo blanco, no necesitamos aplicar otro
-            if result_img.mode == 'RGBA':
-                logger.warning("[WARNING] Sombra devolvió RGBA, convirtiendo a RGB")
-                # Crear fondo blanco y compositar solo si es necesario
-                white_bg = Image.new('RGB', result_img.size, (255, 255, 255))
-                white_bg.paste(result_img, mask=result_img.split()[-1] if result_img.mode == 'RGBA' else None)
-                result_img = white_bg
-            logger.info("[SHADOW] Imagen con sombra lista para guardar")
+            result_img = self.render_shadow(img, shadow_type, **shadow_params)
 
             # Guardar resultado
             result_img.save(output_path, 'PNG', quality=95)
@@ -59,55 +49,42 @@ class ShadowEffects:
             logger.error(f"[ERROR] Error aplicando sombra: {str(e)}")
             return False
 
-    def create_drop_shadow(self, img: Image.Image, intensity: float = 0.3,
-                          offset_x: int = 10, offset_y: int = 10,
-                          blur_radius: int = 15, **kwargs) -> Image.Image:
-        """Crear sombra proyectada (drop shadow) - Estilo Amazon"""
+    def render_shadow(self, img: Image.Image, shadow_type: str = 'drop', **shadow_params) -> Image.Image:
+        """Aplicar sombra en memoria -> imagen RGB sobre fondo blanco"""
 
-        logger.info(f"[DROP SHADOW] Creando drop shadow - intensidad: {intensity}, offset: ({offset_x}, {offset_y}), blur: {blur_radius}")
-
-        # Crear canvas más grande para la sombra
-        shadow_margin = max(abs(offset_x), abs(offset_y)) + blur_radius + 30
-        new_width = img.width + shadow_margin * 2
-        new_height = img.height + shadow_margin * 2
+        if img.mode != 'RGBA':
+            img = img.convert('RGBA')
 
-        # Canvas con fondo BLANCO para que la sombra sea visible
-        canvas = Image.new('RGB', (new_width, new_height), (255, 255, 255))
-
-        # Crear máscara de sombra desde el canal alpha
-        if img.mode == 'RGBA':
-            shadow_mask = img.split()[-1]  # Canal alpha
+        # Aplicar sombra según tipo
+        if shadow_type in self.shadow_types:
+            result_img = self.shadow_types[shadow_type](img, **shadow_params)
+            logger.info(f"[SUCCESS] Sombra '{shadow_type}' aplicada exitosamente")
         else:
-            # Si no tiene alpha, crear máscara desde la imagen
-            shadow_mask = img.convert('L')
+            logger.warning(f"[WARNING] Tipo de sombra '{shadow_type}' no reconocido, usando original")
+            result_img = img
 
-        # Crear sombra (imagen negra con la forma del producto)
-        shadow = Image.new('RGBA', img.size, (0, 0, 0, 0))
-        shadow_alpha = shadow_mask.point(lambda x: int(x * intensity) if x > 5 else 0)  # USAR INTENSIDAD VARIABLE
-        shadow.paste((150, 150, 150, 255), mask=shadow_alpha)  # GRIS CLARO SUTIL
+        # Las sombras ya incluyen fondo blanco, no necesitamos aplicar otro
+        if result_img.mode == 'RGBA':
+            logger.info("[SHADOW] Resultado RGBA, compositando sobre fondo blanco")
+            result_img = composite_on_white(result_img)
+        logger.info("[SHADOW] Imagen con sombra lista para guardar")
 
-        # Aplicar blur a la sombra
-        shadow = shadow.filter(ImageFilter.GaussianBlur(radius=blur_radius))
+        return result_img
 
-        # PRIMERO: Pegar la sombra ROJA sobre el fondo blanco
-        shadow_x = shadow_margin + offset_x
-        shadow_y = shadow_margin + offset_y
+    def create_drop_shadow(self, img: Image.Image, intensity: float = 0.3,
+                          offset_x: int = 10, offset_y: int = 10,
+                          blur_radius: int = 15, **kwargs) -> Image.Image:
+        """Crear sombra proyectada (drop shadow) - Estilo Amazon"""
 
-        # Convertir sombra RGBA a RGB para el canvas RGB
-        shadow_rgb = Image.new('RGB', shadow.size, (255, 255, 255))
-        if shadow.mode == 'RGBA':
-            shadow_rgb.paste(shadow, mask=shadow.split()[-1])
-        else:
-            shadow_rgb = shadow
+        logger.info(f"[DROP SHADOW] Creando drop shadow - intensidad: {intensity}, offset: ({offset_x}, {offset_y}), blur: {blur_radius}")
 
-        canvas.paste(shadow_rgb, (shadow_x, shadow_y))
-        logger.info("[APPLY] Sombra pegada en canvas blanco")
+        # Canvas más grande para la sombra
+        shadow_margin = max(abs(offset_x), abs(offset_y)) + blur_radius + 30
 
-        # SEGUNDO: Pegar producto original ENCIMA de la sombra
-        product_x = shadow_margin
-        product_y = shadow_margin
-        canvas.paste(img, (product_x, product_y), img if img.mode == 'RGBA' else None)
-        logger.info("[APPLY] Producto pegado encima de la sombra")
+        canvas = render_drop_shadow(
+            img, intensity=intensity, offset=(offset_x, offset_y), blur_radius=blur_radius,
+            margin=shadow_margin, color=150, threshold=5  # GRIS CLARO SUTIL
+        )
 
         logger.info(f"[DROP SHADOW] Canvas final: {canvas.size[0]}x{canvas.size[1]} pixels")
         return canvas
@@ -133,56 +110,21 @@ class ShadowEffects:
         # Pegar imagen original
         canvas.paste(img, (0, 0), img if img.mode == 'RGBA' else None)
 
-        # Crear reflejo
-        reflection = img.copy()
-        reflection = reflection.transpose(Image.FLIP_TOP_BOTTOM)  # Voltear verticalmente
-
-        # Recortar reflejo a la altura deseada
-        reflection = reflection.crop((0, 0, reflection.width, reflection_h))
-
-        # Crear máscara de degradado para el fade
-        fade_mask = Image.new('L', (reflection.width, reflection_h), 0)
-        for y in range(reflection_h):
-            # Opacidad que disminuye hacia abajo
-            progress = y / reflection_h
-            if progress < fade_start:
-                fade_factor = 1.0
-            else:
-                fade_factor = 1.0 - ((progress - fade_start) / (1.0 - fade_start))
-
-            opacity_value = int(255 * opacity * fade_factor)
-            for x in range(reflection.width):
-                fade_mask.putpixel((x, y), opacity_value)
-
-        # Aplicar máscara al reflejo
-        if reflection.mode != 'RGBA':
-            reflection = reflection.convert('RGBA')
-
-        # Modificar el canal alpha del reflejo
-        r, g, b, a = reflection.split()
-        # Combinar el alpha existente con la máscara de fade
-        combined_alpha = ImageEnhance.Brightness(a).enhance(opacity)
-        combined_alpha = Image.eval(combined_alpha, lambda x: int(x * (fade_mask.getpixel((0, 0)) / 255)))
-
-        # Aplicar fade a todo el reflejo
-        reflection_faded = Image.new('RGBA', reflection.size, (0, 0, 0, 0))
-        for y in range(reflection_h):
-            progress = y / reflection_h
-            if progress < fade_start:
-                fade_factor = 1.0
-            else:
-                fade_factor = 1.0 - ((progress - fade_start) / (1.0 - fade_start))
-
-            alpha_value = int(255 * opacity * fade_factor)
+        # Reflejo: las últimas reflection_h filas del producto, volteadas, con
+        # alpha = degradado de la fila donde el original es visible (alpha > 10)
+        if reflection_h > 0:
+            pixels = np.asarray(img if img.mode == 'RGBA' else img.convert('RGBA'))
+            flipped = pixels[img.height - reflection_h:][::-1]
+            visible = flipped[:, :, 3] > 10
 
-            for x in range(reflection.width):
-                if a.getpixel((x, y)) > 10:  # Solo si el pixel original no es transparente
-                    r_val, g_val, b_val = reflection.getpixel((x, y))[:3]
-                    reflection_faded.putpixel((x, y), (r_val, g_val, b_val, alpha_value))
+            faded = np.zeros_like(flipped)
+            faded[:, :, :3] = np.where(visible[:, :, None], flipped[:, :, :3], 0)
+            faded[:, :, 3] = np.where(visible, reflection_gradient(reflection_h, fade_start, opacity)[:, None], 0)
+            reflection_faded = Image.fromarray(faded, 'RGBA')
 
-        # Pegar reflejo en canvas
-        reflection_y = img.height + gap
-        canvas.paste(reflection_faded, (0, reflection_y), reflection_faded)
+            # Pegar reflejo en canvas
+            reflection_y = img.height + gap
+            canvas.paste(reflection_faded, (0, reflection_y), reflection_faded)
 
         logger.info(f"[REFLECT] Reflejo creado con altura {reflection_h}px")
         return canvas
@@ -237,46 +179,198 @@ class ShadowEffects:
         logger.info(f"[NATURAL] Sombra natural aplicada con offset ({offset_x}, {offset_y})")
         return canvas
 
-def detect_best_shadow_type(image_path: str) -> str:
-    """Detectar automáticamente el mejor tipo de sombra según el producto"""
+@lru_cache(maxsize=256)
+def reflection_gradient(height: int, fade_start: float, opacity: float) -> np.ndarray:
+    """
+    Alpha por fila del reflejo (uint8, solo lectura), calculado una vez por
+    (altura, fade_start, opacidad): opacidad completa hasta fade_start y
+    desvanecimiento lineal hasta el final
+    """
+    progress = np.arange(height) / height
+    if fade_start < 1.0:
+        fade = np.where(progress < fade_start, 1.0, 1.0 - ((progress - fade_start) / (1.0 - fade_start)))
+    else:
+        fade = np.ones(height)
+    gradient = (255 * opacity * fade).astype(np.int64).clip(0, 255).astype(np.uint8)
+    gradient.setflags(write=False)
+    return gradient
+
+# Factor de reducción por píxel de blur: el blur se calcula a 1/N de resolución
+SHADOW_BLUR_DOWNSCALE = 4
+
+@lru_cache(maxsize=64)
+def _shadow_luts(intensity: float, color: int, threshold: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    LUTs de la sombra: alpha -> alpha de sombra, y alpha difuminado -> gris final
+
+    Equivale al render anterior con PIL (pegar el color con máscara en una capa
+    transparente, blur RGBA y pegarla sobre blanco): con s = blur(alpha)/255 el
+    píxel final es color * s^2 + 255 * (1 - s), así que basta una LUT.
+    Calculadas una vez por (intensidad, color, umbral); solo lectura.
+    """
+    values = np.arange(256)
+    alpha_lut = np.where(values > threshold, (values * intensity).astype(np.int64), 0).clip(0, 255).astype(np.uint8)
+    s = values / 255.0
+    shade_lut = np.rint(color * s * s + 255.0 * (1.0 - s)).clip(0, 255).astype(np.uint8)
+    alpha_lut.setflags(write=False)
+    shade_lut.setflags(write=False)
+    return alpha_lut, shade_lut
+
+def render_drop_shadow(img: Image.Image, intensity: float, offset: Tuple[int, int],
+                       blur_radius: float, margin: int, color: int = 150,
+                       threshold: int = 5) -> Image.Image:
+    """
+    Render vectorizado de drop shadow sobre fondo blanco (RGB)
+
+    - Alpha de sombra con una LUT (sin lambdas por píxel)
+    - Blur solo en el bounding box de la máscara y a resolución reducida
+      (reducir -> GaussianBlur -> ampliar)
+    - Una sola composición (compositor.py): sombra y producto
+    """
+    if img.mode != 'RGBA':
+        img = img.convert('RGBA')
+
+    alpha = np.asarray(img.getchannel('A'))
+    height, width = alpha.shape
+    offset_x, offset_y = offset
+
+    alpha_lut, shade_lut = _shadow_luts(intensity, color, threshold)
+    shadow_alpha = cv2.LUT(alpha, alpha_lut)
+
+    region = None
+    left = top = 0
+    x, y, w, h = cv2.boundingRect(shadow_alpha)
+    if w and h:
+        # Región del blur: bbox + 3 sigmas, alineada al factor de reducción
+        factor = max(1, int(blur_radius) // SHADOW_BLUR_DOWNSCALE)
+        pad = int(np.ceil(3 * blur_radius))
+        region_w = -(-(w + 2 * pad) // factor) * factor
+        region_h = -(-(h + 2 * pad) // factor) * factor
+
+        region = np.zeros((region_h, region_w), dtype=np.uint8)
+        region[pad:pad + h, pad:pad + w] = shadow_alpha[y:y + h, x:x + w]
+
+        if blur_radius > 0:
+            small = cv2.resize(region, (region_w // factor, region_h // factor), interpolation=cv2.INTER_AREA)
+            small = cv2.GaussianBlur(small, (0, 0), blur_radius / factor)
+            region = cv2.resize(small, (region_w, region_h), interpolation=cv2.INTER_LINEAR)
+
+        # Posición en el canvas (el compositor recorta a sus bordes)
+        left = margin + offset_x + x - pad
+        top = margin + offset_y + y - pad
+
+    # Una sola composición: sombra (LUT) y producto encima, solo en su bounding box
+    return composite_on_white(
+        img, canvas_size=(width + margin * 2, height + margin * 2), offset=(margin, margin),
+        shadow=region, shadow_offset=(left, top), shadow_lut_table=shade_lut
+    )
+
+# Umbral de alpha para considerar un píxel parte del producto
+PRODUCT_ALPHA_THRESHOLD = 10
+
+# Tipo de sombra ya detectado por máscara (clave = máscara cacheada)
+SHADOW_TYPE_MEMO_SIZE = 4096
+_shadow_type_memo: "OrderedDict[str, str]" = OrderedDict()
+_shadow_type_memo_lock = threading.Lock()
+
+def detect_shadow_type_from_mask(mask: Union[Image.Image, np.ndarray], cache_key: Optional[str] = None) -> str:
+    """
+    Detectar el mejor tipo de sombra desde la máscara alpha en memoria
+
+    Usa el bounding box ajustado del producto (no el canvas, que puede tener
+    padding) y su ratio de relleno. Con cache_key (p.ej. la ruta de la
+    máscara cacheada) el resultado se memoiza.
+    """
+    if cache_key is not None:
+        with _shadow_type_memo_lock:
+            shadow_type = _shadow_type_memo.get(cache_key)
+            if shadow_type is not None:
+                _shadow_type_memo.move_to_end(cache_key)
+                return shadow_type
 
     try:
-        # Cargar imagen para análisis
-        img = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
-        if img is None:
-            logger.warning("[WARNING] No se pudo cargar imagen para análisis, usando drop shadow")
-            return 'drop'
-
-        height, width = img.shape[:2]
-        aspect_ratio = width / height
-
-        logger.info(f"[AUTO] Analizando imagen: {width}x{height}, ratio: {aspect_ratio:.2f}")
-
-        # Análisis basado en proportions y contenido
-        if aspect_ratio > 1.8:
-            # Muy ancho - productos como teclados, monitores
-            shadow_type = 'natural'
-            reason = "producto ancho horizontal"
-        elif aspect_ratio < 0.6:
-            # Muy alto - productos como botellas, torres de audio
-            shadow_type = 'reflection'
-            reason = "producto alto vertical"
-        elif 0.8 <= aspect_ratio <= 1.2:
-            # Cuadrado - la mayoría de productos
-            shadow_type = 'drop'
-            reason = "producto cuadrado/balanceado"
+        product = (np.asarray(mask) > PRODUCT_ALPHA_THRESHOLD).astype(np.uint8)
+        x, y, width, height = cv2.boundingRect(product)
+
+        if not width or not height:
+            shadow_type, reason = 'drop', "máscara vacía"
         else:
-            # Casos intermedios
-            shadow_type = 'drop'
-            reason = "caso general"
+            aspect_ratio = width / height
+            fill_ratio = cv2.countNonZero(product) / (width * height)
+            logger.info(f"[AUTO] Producto: {width}x{height}, ratio: {aspect_ratio:.2f}, relleno: {fill_ratio:.2f}")
+
+            if aspect_ratio > 1.8:
+                # Muy ancho - productos como teclados, monitores
+                shadow_type, reason = 'natural', "producto ancho horizontal"
+            elif aspect_ratio < 0.6:
+                # Muy alto - productos como botellas, torres de audio
+                shadow_type, reason = 'reflection', "producto alto vertical"
+            elif fill_ratio < 0.35:
+                # Forma calada/irregular (sillas, lámparas) - sombra que sigue el contorno
+                shadow_type, reason = 'natural', "forma irregular"
+            elif 0.8 <= aspect_ratio <= 1.2:
+                # Cuadrado - la mayoría de productos
+                shadow_type, reason = 'drop', "producto cuadrado/balanceado"
+            else:
+                # Casos intermedios
+                shadow_type, reason = 'drop', "caso general"
 
         logger.info(f"[AUTO] Sombra recomendada: '{shadow_type}' ({reason})")
-        return shadow_type
 
     except Exception as e:
         logger.error(f"[ERROR] Error detectando tipo de sombra: {str(e)}")
         return 'drop'  # Default seguro
 
+    if cache_key is not None:
+        with _shadow_type_memo_lock:
+            _shadow_type_memo[cache_key] = shadow_type
+            if len(_shadow_type_memo) > SHADOW_TYPE_MEMO_SIZE:
+                _shadow_type_memo.popitem(last=False)
+
+    return shadow_type
+
+def detect_best_shadow_type(image_path: str) -> str:
+    """
+    Detectar automáticamente el mejor tipo de sombra según el producto (desde archivo)
+
+    Con canal alpha se analiza la máscara (detect_shadow_type_from_mask); sin
+    él no hay máscara y se decide por las proporciones de la imagen, como
+    antes (solo se lee la cabecera).
+    """
+
+    try:
+        with Image.open(image_path) as img:
+            if 'A' in img.getbands():
+                alpha = img.getchannel('A')
+            else:
+                alpha = None
+                width, height = img.size
+    except Exception as e:
+        logger.warning(f"[WARNING] No se pudo cargar imagen para análisis, usando drop shadow: {e}")
+        return 'drop'
+
+    if alpha is not None:
+        return detect_shadow_type_from_mask(alpha)
+
+    aspect_ratio = width / height
+    logger.info(f"[AUTO] Imagen sin alpha: {width}x{height}, ratio: {aspect_ratio:.2f}")
+
+    if aspect_ratio > 1.8:
+        # Muy ancho - productos como teclados, monitores
+        shadow_type, reason = 'natural', "producto ancho horizontal"
+    elif aspect_ratio < 0.6:
+        # Muy alto - productos como botellas, torres de audio
+        shadow_type, reason = 'reflection', "producto alto vertical"
+    elif 0.8 <= aspect_ratio <= 1.2:
+        # Cuadrado - la mayoría de productos
+        shadow_type, reason = 'drop', "producto cuadrado/balanceado"
+    else:
+        # Casos intermedios
+        shadow_type, reason = 'drop', "caso general"
+
+    logger.info(f"[AUTO] Sombra recomendada: '{shadow_type}' ({reason})")
+    return shadow_type
+
 def get_shadow_params_for_pipeline(pipeline: str) -> Dict:
     """Obtener parámetros de sombra optimizados por pipeline"""
 
@@ -362,11 +456,6 @@ def apply_professional_shadow(input_path: str, output_path: str,
     logger.info(f"[SHADOW] Pipeline: {pipeline}, Tipo: {shadow_type}")
 
     try:
-        # Detectar tipo automáticamente si es necesario
-        if shadow_type == 'auto':
-            shadow_type = detect_best_shadow_type(input_path)
-            logger.info(f"[AUTO] Tipo detectado automáticamente: {shadow_type}")
-
         # Si el usuario eligió 'none', saltar todo el procesamiento de sombras
         if shadow_type == 'none':
             logger.info("[SHADOW] Usuario deshabilitó sombras (shadow_type='none'), copiando imagen original")
@@ -375,39 +464,60 @@ def apply_professional_shadow(input_path: str, output_path: str,
             shutil.copy2(input_path, output_path)
             return True
 
-        # Obtener parámetros base del pipeline
-        shadow_params = get_shadow_params_for_pipeline(pipeline)
+        # Una sola lectura: la detección 'auto' usa el alpha de esta misma imagen
+        img = Image.open(input_path).convert('RGBA')
+        result_img = render_professional_shadow(img, pipeline, shadow_type, custom_params)
 
-        # Sobrescribir tipo si se especificó uno diferente (excepto 'auto')
-        if shadow_type != 'auto':
-            shadow_params['shadow_type'] = shadow_type
+        # Guardar resultado
+        result_img.save(output_path, 'PNG', quality=95)
+        logger.info(f"[SUCCESS] Sombra profesional aplicada exitosamente")
+        logger.info(f"[SUCCESS] Resultado guardado en: {Path(output_path).name}")
 
-        # Aplicar parámetros personalizados si se proporcionaron
-        if custom_params:
-            shadow_params.update(custom_params)
-            logger.info(f"[SHADOW] Parámetros personalizados aplicados: {custom_params}")
+        return True
 
-        # Crear el procesador de sombras
-        shadow_processor = ShadowEffects()
+    except Exception as e:
+        logger.error(f"[ERROR] Error en apply_professional_shadow: {str(e)}")
+        return False
 
-        # Aplicar la sombra
-        success = shadow_processor.apply_shadow(
-            image_path=input_path,
-            output_path=output_path,
-            **shadow_params
-        )
+def render_professional_shadow(img: Image.Image,
+                               pipeline: str = 'amazon',
+                               shadow_type: str = 'auto',
+                               custom_params: Optional[Dict] = None,
+                               mask: Optional[Union[Image.Image, np.ndarray]] = None,
+                               mask_key: Optional[str] = None) -> Image.Image:
+    """
+    Versión en memoria de apply_professional_shadow (sin lectura ni escritura)
 
-        if success:
-            logger.info(f"[SUCCESS] Sombra profesional aplicada exitosamente")
-            logger.info(f"[SUCCESS] Resultado guardado en: {Path(output_path).name}")
-        else:
-            logger.error(f"[ERROR] Error aplicando sombra profesional")
+    Args:
+        img: Imagen RGBA con fondo removido
+        pipeline: Pipeline de procesamiento (amazon, instagram, ebay, etc.)
+        shadow_type: Tipo de sombra ('auto', 'drop', 'reflection', 'natural', 'none')
+        custom_params: Parámetros personalizados opcionales
+        mask: Máscara de segmentación para 'auto' (por defecto, el alpha de img)
+        mask_key: Clave de la máscara cacheada, memoiza la detección 'auto'
 
-        return success
+    Returns:
+        Image.Image: Imagen RGB sobre fondo blanco
+    """
 
-    except Exception as e:
-        logger.error(f"[ERROR] Error en apply_professional_shadow: {str(e)}")
-        return False
+    if img.mode != 'RGBA':
+        img = img.convert('RGBA')
+
+    # Detectar tipo automáticamente desde la máscara en memoria
+    if shadow_type == 'auto':
+        shadow_type = detect_shadow_type_from_mask(mask if mask is not None else img.getchannel('A'), mask_key)
+        logger.info(f"[AUTO] Tipo detectado automáticamente: {shadow_type}")
+
+    # Obtener parámetros base del pipeline
+    shadow_params = get_shadow_params_for_pipeline(pipeline)
+    shadow_params['shadow_type'] = shadow_type
+
+    # Aplicar parámetros personalizados si se proporcionaron
+    if custom_params:
+        shadow_params.update(custom_params)
+        logger.info(f"[SHADOW] Parámetros personalizados aplicados: {custom_params}")
+
+    return ShadowEffects().render_shadow(img, **shadow_params)
 
 def apply_simple_drop_shadow(image, intensity=0.5):
     """
@@ -427,42 +537,17 @@ def apply_simple_drop_shadow(image, intensity=0.5):
         if image.mode != 'RGBA':
             image = image.convert('RGBA')
 
-        width, height = image.size
-
-        # Create shadow offset (fixed values for simplicity)
+        # Fixed shadow parameters (offset 15px, blur 20px)
         offset_x = 15
         offset_y = 15
         blur_radius = 20
-
-        # Create expanded canvas for shadow
         padding = blur_radius + offset_x + offset_y
-        shadow_size = (width + padding * 2, height + padding * 2)
-
-        # Extract alpha channel for shadow mask
-        alpha = image.split()[3]
-
-        # Create shadow layer
-        shadow = Image.new('RGBA', image.size, (0, 0, 0, 0))
-        shadow_alpha = alpha.point(lambda x: int(x * intensity) if x > 10 else 0)
-        shadow.paste((100, 100, 100, 255), (0, 0), shadow_alpha)
 
-        # Apply blur
-        shadow = shadow.filter(ImageFilter.GaussianBlur(blur_radius))
-
-        # Create final canvas with WHITE background
-        result = Image.new('RGB', shadow_size, (255, 255, 255))
-
-        # Position shadow with offset
-        shadow_x = padding + offset_x
-        shadow_y = padding + offset_y
-
-        # Paste shadow (convert to RGB for white background)
-        shadow_rgb = Image.new('RGB', shadow.size, (255, 255, 255))
-        shadow_rgb.paste(shadow, mask=shadow.split()[3] if shadow.mode == 'RGBA' else None)
-        result.paste(shadow_rgb, (shadow_x, shadow_y))
-
-        # Paste original product on top
-        result.paste(image, (padding, padding), image)
+        # Vectorized render: LUT shadow, bbox-only downscaled blur, one composite
+        result = render_drop_shadow(
+            image, intensity=intensity, offset=(offset_x, offset_y), blur_radius=blur_radius,
+            margin=padding, color=100, threshold=10
+        )
 
         print(f"[SIMPLE SHADOW] Success! Result size: {result.size}")
         return result
@@ -470,6 +555,4 @@ def apply_simple_drop_shadow(image, intensity=0.5):
     except Exception as e:
         print(f"[SIMPLE SHADOW] ERROR: {e}")
         # Return image on white background as fallback
-        fallback = Image.new('RGB', image.size, (255, 255, 255))
-        fallback.paste(image, (0, 0), image if image.mode == 'RGBA' else None)
-        return fallback
\ No newline at end of file
+        return composite_on_white(image)
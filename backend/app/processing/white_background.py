@@ -0,0 +1,124 @@
+"""
+White Background Fast Path
+Product mask without U2-Net for photos already shot on clean white
+
+Many uploads are studio shots on a near-white background. For those the
+mask can be read off the pixels: a low-resolution look at the border ring
+and the histogram decides whether the background is uniform white, and if
+so the background is flood-filled from the border through near-white pixels
+(white areas enclosed by the product stay opaque). Anything that does not
+pass the checks goes to the model as before.
+
+Like ImageProcessor._remove_white_background, "white" means every channel
+at or above 255 - WHITE_BG_TOLERANCE.
+
+    WHITE_FASTPATH              1 = enabled (default), 0 = always segment
+    WHITE_BG_TOLERANCE          channel distance from 255 still white (20)
+    WHITE_BG_MIN_BORDER         min share of white pixels in the border ring (0.98)
+    WHITE_BG_MAX_BORDER_STD     max std of the border brightness (6.0)
+    WHITE_BG_MIN_PRODUCT        min product share of the image (0.02)
+    WHITE_BG_MAX_PRODUCT        max product share of the image (0.85)
+"""
+
+import os
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+logger = logging.getLogger(__name__)
+
+WHITE_FASTPATH = os.getenv("WHITE_FASTPATH", "1") == "1"
+WHITE_BG_TOLERANCE = int(os.getenv("WHITE_BG_TOLERANCE", "20"))
+WHITE_BG_MIN_BORDER = float(os.getenv("WHITE_BG_MIN_BORDER", "0.98"))
+WHITE_BG_MAX_BORDER_STD = float(os.getenv("WHITE_BG_MAX_BORDER_STD", "6.0"))
+WHITE_BG_MIN_PRODUCT = float(os.getenv("WHITE_BG_MIN_PRODUCT", "0.02"))
+WHITE_BG_MAX_PRODUCT = float(os.getenv("WHITE_BG_MAX_PRODUCT", "0.85"))
+
+# Longest side of the image used for the checks
+CHECK_SIZE = 128
+
+# Border ring width, as a share of the shorter side (low-resolution image)
+BORDER_RING = 0.03
+
+def _brightness(img: Image.Image) -> np.ndarray:
+    """Darkest channel per pixel (uint8): white only if every channel is"""
+    pixels = np.asarray(img.convert('RGB') if img.mode != 'RGB' else img)
+    # Channel-wise minimum (much faster than .min(axis=2) on interleaved RGB)
+    return np.minimum(np.minimum(pixels[:, :, 0], pixels[:, :, 1]), pixels[:, :, 2])
+
+def check_white_background(img: Image.Image) -> dict:
+    """
+    Cheap low-resolution check: is the background uniform white?
+
+    Returns the measured values and "white" (all thresholds passed) or
+    "reason" (the first one that failed).
+    """
+    factor = max(1, max(img.size) // CHECK_SIZE)
+    small = _brightness(img.reduce(factor) if factor > 1 else img)
+    height, width = small.shape
+    white_level = 255 - WHITE_BG_TOLERANCE
+
+    ring = max(2, int(round(min(height, width) * BORDER_RING)))
+    border = np.concatenate([
+        small[:ring].ravel(), small[-ring:].ravel(),
+        small[ring:-ring, :ring].ravel(), small[ring:-ring, -ring:].ravel()
+    ])
+    check = {
+        "border_white": round(float(np.mean(border >= white_level)), 4),
+        "border_std": round(float(border.std()), 2),
+        # Histogram: share of the image that is not background white
+        "product_fraction": round(float(np.mean(small < white_level)), 4)
+    }
+
+    if check["border_white"] < WHITE_BG_MIN_BORDER:
+        check["reason"] = "border not white"
+    elif check["border_std"] > WHITE_BG_MAX_BORDER_STD:
+        check["reason"] = "border not uniform"
+    elif not WHITE_BG_MIN_PRODUCT <= check["product_fraction"] <= WHITE_BG_MAX_PRODUCT:
+        check["reason"] = "product share out of range"
+    check["white"] = "reason" not in check
+    return check
+
+def white_background_mask(img: Image.Image) -> Tuple[Optional[np.ndarray], dict]:
+    """
+    Product mask for an image on clean white, or None if the model is needed
+
+    Returns:
+        (mask, check): mask is uint8 HxW at the image size (255 = product),
+        check the values measured (see check_white_background) plus the
+        "method" used for the mask
+    """
+    check = check_white_background(img)
+    if not check["white"]:
+        return None, check
+
+    white = _brightness(img) >= 255 - WHITE_BG_TOLERANCE
+
+    if cv2 is not None:
+        # Flood fill from the border: a white 1px frame joins every white
+        # region touching the border, so one fill from its corner reaches them all
+        fill = np.pad(white.astype(np.uint8), 1, constant_values=1)
+        cv2.floodFill(fill, None, (0, 0), 2, flags=4)
+        background = fill[1:-1, 1:-1] == 2
+        check["method"] = "flood_fill"
+    else:
+        background = white
+        check["method"] = "threshold"
+
+    mask = np.where(background, 0, 255).astype(np.uint8)
+
+    # Full-resolution sanity check of the result
+    product_fraction = float(np.mean(mask > 0))
+    if not WHITE_BG_MIN_PRODUCT <= product_fraction <= WHITE_BG_MAX_PRODUCT:
+        check["white"] = False
+        check["reason"] = "mask product share out of range"
+        return None, check
+
+    return mask, check
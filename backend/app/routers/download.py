@@ -1,19 +1,35 @@
 from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse
 import os
-import zipfile
 from pathlib import Path
-import tempfile
 
 from ..models.schemas import DownloadResponse
 from ..database.memory_client import memory_db
 from ..core.security import get_current_user
+from ..services.zip_stream import stream_zip
 
 router = APIRouter()
 
 PROCESSED_DIR = Path("processed")
 
-@router.get("/download/{job_id}", response_class=FileResponse)
+def stream_job_archive(job_id: str, job: dict, image_files: list) -> StreamingResponse:
+    """Stream the job's files as a ZIP (built on the fly, no temp file)"""
+    pipeline = job.get('pipeline', 'processed')
+    entries = [
+        (image_file, f"{pipeline}_{image_file.name}")
+        for image_file in sorted(image_files) if image_file.is_file()
+    ]
+    zip_filename = f"masterpost_{job_id}_{pipeline}.zip"
+
+    return StreamingResponse(
+        stream_zip(entries),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename={zip_filename}"
+        }
+    )
+
+@router.get("/download/{job_id}", response_class=StreamingResponse)
 async def download_processed_images(
     job_id: str
 ):
@@ -39,23 +55,7 @@ async def download_processed_images(
     if not image_files:
         raise HTTPException(status_code=404, detail="No processed files found")
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as temp_zip:
-        with zipfile.ZipFile(temp_zip.name, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for image_file in image_files:
-                if image_file.is_file():
-                    arcname = f"{job.get('pipeline', 'processed')}_{image_file.name}"
-                    zipf.write(image_file, arcname)
-
-        zip_filename = f"masterpost_{job_id}_{job.get('pipeline', 'processed')}.zip"
-
-        return FileResponse(
-            path=temp_zip.name,
-            filename=zip_filename,
-            media_type="application/zip",
-            headers={
-                "Content-Disposition": f"attachment; filename={zip_filename}"
-            }
-        )
+    return stream_job_archive(job_id, job, image_files)
 
 @router.get("/download/info/{job_id}", response_model=DownloadResponse)
 async def get_download_info(
@@ -96,7 +96,7 @@ async def get_download_info(
             expires_at=None
         )
 
-@router.get("/download-test/{job_id}", response_class=FileResponse)
+@router.get("/download-test/{job_id}", response_class=StreamingResponse)
 async def download_processed_images_test(
     job_id: str
 ):
@@ -121,23 +121,7 @@ async def download_processed_images_test(
     if not image_files:
         raise HTTPException(status_code=404, detail="No processed files found")
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as temp_zip:
-        with zipfile.ZipFile(temp_zip.name, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for image_file in image_files:
-                if image_file.is_file():
-                    arcname = f"{job.get('pipeline', 'processed')}_{image_file.name}"
-                    zipf.write(image_file, arcname)
-
-        zip_filename = f"masterpost_{job_id}_{job.get('pipeline', 'processed')}.zip"
-
-        return FileResponse(
-            path=temp_zip.name,
-            filename=zip_filename,
-            media_type="application/zip",
-            headers={
-                "Content-Disposition": f"attachment; filename={zip_filename}"
-            }
-        )
+    return stream_job_archive(job_id, job, image_files)
 
 @router.delete("/download/{job_id}")
 async def cleanup_job_files(
@@ -0,0 +1,210 @@
+"""
+Adaptive Concurrency
+AIMD controller for the number of images a batch keeps in flight
+
+Measures throughput (images/sec) and the median per-image latency over
+sampling windows of about `limit` completions, then:
+
+- additive increase: +1 while the window ran saturated (all slots busy)
+  and latency stays within LATENCY_TOLERANCE x the best recent latency
+- multiplicative decrease: x DECREASE_FACTOR when latency grows past that
+  tolerance without a matching throughput gain (workers are only queueing
+  behind each other: CPU contention, a throttled API) or when items fail
+
+so a batch converges on the concurrency where throughput stops improving,
+whatever the CPU count, image sizes or Premium API latency.
+
+All methods run on the event loop thread (no locking).
+"""
+
+import os
+import time
+import asyncio
+import logging
+import statistics
+from collections import deque
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Latency growth (vs the best window) tolerated before backing off
+LATENCY_TOLERANCE = float(os.getenv("AUTOSCALE_LATENCY_TOLERANCE", "1.5"))
+
+# Multiplicative decrease on congestion
+DECREASE_FACTOR = float(os.getenv("AUTOSCALE_DECREASE_FACTOR", "0.75"))
+
+# Throughput gain that justifies higher latency (more parallel work got done)
+THROUGHPUT_GAIN = 1.10
+
+# Per-window upward drift of the best latency, so a batch whose later images
+# are simply larger re-baselines instead of backing off to one worker
+BEST_LATENCY_DRIFT = 1.05
+
+# Smallest sampling window (completions)
+MIN_WINDOW = 4
+
+class AdaptiveConcurrency:
+    """
+    Resizable async limiter: acquire() before each item, release(latency) after
+
+    With adaptive=False the limit stays at its initial value (same
+    measurements, no adjustments).
+    """
+
+    def __init__(self, name: str, initial: int, minimum: int = 1, maximum: int = 30, adaptive: bool = True):
+        self.name = name
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.adaptive = adaptive
+
+        self.in_flight = 0
+        self._waiters = deque()
+
+        # Current sampling window
+        self._window_start = time.monotonic()
+        self._window_latencies = []
+        self._window_failures = 0
+        self._window_saturated = False
+
+        self._best_latency: Optional[float] = None
+        self._last_throughput: Optional[float] = None
+
+        # Run totals (results.json)
+        self._started = time.monotonic()
+        self._busy_area = 0.0  # Integral of in_flight over time
+        self._last_change = self._started
+        self._latencies = []
+        self._completed = 0
+        self._failed = 0
+        self._initial = self.limit
+        self._peak_limit = self.limit
+        self._low_limit = self.limit
+        self._adjustments = {"increase": 0, "decrease": 0}
+
+    # ------------------------------------------------------------
+    # Limiter
+    # ------------------------------------------------------------
+
+    def _account(self):
+        now = time.monotonic()
+        self._busy_area += self.in_flight * (now - self._last_change)
+        self._last_change = now
+
+    async def acquire(self):
+        if self.in_flight >= self.limit or self._waiters:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            try:
+                await future  # in_flight already counted by _wake()
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Granted just before the waiter was cancelled
+                    self._account()
+                    self.in_flight -= 1
+                    self._wake()
+                raise
+            return
+        self._account()
+        self.in_flight += 1
+        if self.in_flight >= self.limit:
+            self._window_saturated = True
+
+    def _wake(self):
+        while self._waiters and self.in_flight < self.limit:
+            future = self._waiters.popleft()
+            if future.done():
+                continue
+            self._account()
+            self.in_flight += 1
+            future.set_result(None)
+        if self.in_flight >= self.limit:
+            self._window_saturated = True
+
+    def release(self, latency: float, success: bool = True):
+        """One item finished after `latency` seconds"""
+        self._account()
+        self.in_flight -= 1
+        self._completed += 1
+        self._latencies.append(latency)
+        self._window_latencies.append(latency)
+        if not success:
+            self._failed += 1
+            self._window_failures += 1
+
+        if len(self._window_latencies) >= max(MIN_WINDOW, self.limit):
+            self._end_window()
+        self._wake()
+
+    # ------------------------------------------------------------
+    # AIMD
+    # ------------------------------------------------------------
+
+    def _end_window(self):
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        throughput = len(self._window_latencies) / elapsed if elapsed > 0 else 0.0
+        latency = statistics.median(self._window_latencies)
+
+        if self._best_latency is None:
+            self._best_latency = latency
+        self._best_latency = min(latency, self._best_latency * BEST_LATENCY_DRIFT)
+
+        if self.adaptive:
+            previous = self.limit
+            congested = latency > self._best_latency * LATENCY_TOLERANCE and not (
+                self._last_throughput and throughput > self._last_throughput * THROUGHPUT_GAIN
+            )
+            if self._window_failures or congested:
+                self.limit = max(self.minimum, int(self.limit * DECREASE_FACTOR))
+            elif self._window_saturated:
+                self.limit = min(self.maximum, self.limit + 1)
+
+            if self.limit != previous:
+                direction = "increase" if self.limit > previous else "decrease"
+                self._adjustments[direction] += 1
+                self._peak_limit = max(self._peak_limit, self.limit)
+                self._low_limit = min(self._low_limit, self.limit)
+                logger.info(
+                    f"[AUTOSCALE] {self.name}: {previous} -> {self.limit} workers "
+                    f"({throughput:.2f} img/s, median {latency:.2f}s, failures {self._window_failures})"
+                )
+
+        self._last_throughput = throughput
+        self._window_start = now
+        self._window_latencies = []
+        self._window_failures = 0
+        self._window_saturated = self.in_flight >= self.limit
+
+    # ------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------
+
+    def get_stats(self) -> dict:
+        """Achieved concurrency and throughput of the run so far"""
+        self._account()
+        elapsed = time.monotonic() - self._started
+        latencies = sorted(self._latencies)
+
+        def percentile(pct):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * pct / 100))], 3)
+
+        return {
+            "pool": self.name,
+            "adaptive": self.adaptive,
+            "initial_workers": self._initial,
+            "final_workers": self.limit,
+            "min_workers": self._low_limit,
+            "max_workers": self._peak_limit,
+            "worker_cap": self.maximum,
+            "mean_concurrency": round(self._busy_area / elapsed, 2) if elapsed > 0 else 0.0,
+            "throughput": round(self._completed / elapsed, 3) if elapsed > 0 else 0.0,
+            "latency_p50": percentile(50),
+            "latency_p95": percentile(95),
+            "completed": self._completed,
+            "failed": self._failed,
+            "adjustments": dict(self._adjustments),
+            "elapsed": round(elapsed, 2)
+        }
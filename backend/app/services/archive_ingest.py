@@ -0,0 +1,281 @@
+"""
+Streaming Archive Ingest
+Feed images from uploaded ZIP/RAR/7Z archives straight into processing
+
+Instead of extracting the whole archive (and decoding every image twice to
+validate it) before the first image is processed, members are read one at
+a time, validated from their header bytes only, written to the job folder
+and handed to the batch processor right away - image 1 is being processed
+while image 500 is still being read.
+
+RAR needs the `rarfile` package (plus unrar), 7Z needs `py7zr`.
+"""
+
+import asyncio
+import hashlib
+import logging
+import zipfile
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+
+try:
+    import rarfile
+except ImportError:
+    rarfile = None
+
+try:
+    import py7zr
+except ImportError:
+    py7zr = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tiff', '.tif'}
+SYSTEM_FILES = ('__MACOSX', '.DS_Store', 'Thumbs.db', 'desktop.ini')
+
+# Bytes needed to recognize every supported image format
+HEADER_SIZE = 16
+
+# 7z members are decompressed in groups (solid archives can't seek per member)
+SEVEN_ZIP_CHUNK = 32
+
+def sniff_image_format(header: bytes) -> Optional[str]:
+    """Detect the image format from its first bytes (no decoding)"""
+    if header.startswith(b'\xff\xd8\xff'):
+        return "JPEG"
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return "PNG"
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return "WEBP"
+    if header.startswith((b'GIF87a', b'GIF89a')):
+        return "GIF"
+    if header.startswith((b'II*\x00', b'MM\x00*')):
+        return "TIFF"
+    if header.startswith(b'BM'):
+        return "BMP"
+    return None
+
+def sniff_archive_format(path: Union[str, Path]) -> Optional[str]:
+    """Detect zip/rar/7z from the archive's magic bytes, falling back to the extension"""
+    path = Path(path)
+    with open(path, 'rb') as f:
+        magic = f.read(8)
+
+    if magic.startswith(b'PK\x03\x04') or magic.startswith(b'PK\x05\x06'):
+        return "zip"
+    if magic.startswith(b'Rar!\x1a\x07'):
+        return "rar"
+    if magic.startswith(b'7z\xbc\xaf\x27\x1c'):
+        return "7z"
+
+    return {'.zip': "zip", '.rar': "rar", '.7z': "7z"}.get(path.suffix.lower())
+
+def is_candidate_image(member_name: str) -> Tuple[bool, str]:
+    """Filter archive members by name: (is_image, skip_reason)"""
+    filename = Path(member_name).name
+
+    if any(x in member_name for x in SYSTEM_FILES):
+        return False, "system_file"
+    if filename.startswith('.'):
+        return False, "hidden_file"
+    if Path(filename).suffix.lower() not in IMAGE_EXTENSIONS:
+        return False, f"not_image:{Path(filename).suffix}"
+    return True, ""
+
+def short_filename(index: int, member_name: str) -> str:
+    """img_0001_a3f8d9e2.jpg - short names avoid the Windows 260 char path limit"""
+    name_hash = hashlib.md5(Path(member_name).name.encode()).hexdigest()[:8]
+    return f"img_{index:04d}_{name_hash}{Path(member_name).suffix.lower()}"
+
+class ArchiveReader:
+    """
+    Member-by-member reader with the same interface for ZIP, RAR and 7Z
+
+    Usage:
+        with ArchiveReader(path) as reader:
+            for name, data in reader.iter_images():
+                ...
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.format = sniff_archive_format(self.path)
+
+        if self.format == "zip":
+            self._archive = zipfile.ZipFile(self.path, 'r')
+        elif self.format == "rar":
+            if rarfile is None:
+                raise RuntimeError("RAR support requires the rarfile package")
+            self._archive = rarfile.RarFile(self.path, 'r')
+        elif self.format == "7z":
+            if py7zr is None:
+                raise RuntimeError("7Z support requires the py7zr package")
+            self._archive = py7zr.SevenZipFile(self.path, 'r')
+        else:
+            raise ValueError(f"Unsupported archive: {self.path.name}")
+
+        self.skipped: List[Dict[str, str]] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._archive.close()
+
+    def _members(self) -> List[Tuple[str, int]]:
+        """(name, uncompressed size) of every file member"""
+        if self.format == "7z":
+            return [(info.filename, info.uncompressed or 0) for info in self._archive.list() if not info.is_directory]
+        return [(info.filename, info.file_size) for info in self._archive.infolist() if not info.is_dir()]
+
+    def list_images(self) -> List[str]:
+        """Names of members that look like images (from the listing only)"""
+        images = []
+        self.skipped = []
+        for name, _ in self._members():
+            is_image, reason = is_candidate_image(name)
+            if is_image:
+                images.append(name)
+            else:
+                self.skipped.append({"file": name, "reason": reason})
+        return images
+
+    def read_header(self, name: str) -> bytes:
+        """
+        First HEADER_SIZE bytes of a member
+
+        ZIP/RAR only decompress that much; 7Z members are decompressed whole
+        (solid archives can't be read partially).
+        """
+        if self.format == "7z":
+            contents = self._read_7z([name])
+            if name not in contents:
+                raise KeyError(f"{name} is not in the archive")
+            return contents[name][:HEADER_SIZE]
+        with self._archive.open(name) as member:
+            return member.read(HEADER_SIZE)
+
+    def _read_7z(self, names: List[str]) -> Dict[str, bytes]:
+        """Decompress 7z members into memory (missing/unreadable members are left out)"""
+        self._archive.reset()
+        if hasattr(self._archive, "read"):
+            # py7zr < 1.0
+            contents = self._archive.read(targets=names)
+        else:
+            # py7zr >= 1.0: read() was replaced by extraction into a writer factory
+            from py7zr.io import BytesIOFactory
+            sizes = dict(self._members())
+            factory = BytesIOFactory(limit=max(sizes.get(name, 0) for name in names) + 1)
+            self._archive.extract(targets=names, factory=factory)
+            contents = factory.products
+
+        data = {}
+        for name in names:
+            if name in contents:
+                contents[name].seek(0)
+                data[name] = contents[name].read()
+        return data
+
+    def iter_images(self) -> Iterator[Tuple[str, Optional[bytes]]]:
+        """Yield (member name, bytes) for each image member, one at a time (None if unreadable)"""
+        names = self.list_images()
+
+        if self.format != "7z":
+            for name in names:
+                try:
+                    data = self._archive.read(name)
+                except Exception as e:
+                    logger.warning(f"[INGEST] Cannot read {name}: {e}")
+                    data = None
+                yield name, data
+            return
+
+        for start in range(0, len(names), SEVEN_ZIP_CHUNK):
+            chunk = names[start:start + SEVEN_ZIP_CHUNK]
+            try:
+                contents = self._read_7z(chunk)
+            except Exception as e:
+                logger.warning(f"[INGEST] Cannot read {len(chunk)} members from {self.path.name}: {e}")
+                contents = {}
+            for name in chunk:
+                yield name, contents.get(name)
+
+def scan_archive(path: Union[str, Path]) -> Tuple[List[str], List[Dict[str, str]]]:
+    """
+    Count the images in an archive without extracting it
+
+    ZIP/RAR members are validated from their header bytes; 7Z members are
+    validated later, when they are streamed. Returns (image names, failed).
+    """
+    images, failed = [], []
+
+    with ArchiveReader(path) as reader:
+        for name in reader.list_images():
+            if reader.format == "7z":
+                images.append(name)
+                continue
+            try:
+                if sniff_image_format(reader.read_header(name)):
+                    images.append(name)
+                else:
+                    failed.append({"file": name, "reason": "invalid_image_header"})
+            except Exception as e:
+                failed.append({"file": name, "reason": f"read_error:{e}"})
+
+    return images, failed
+
+def count_archive_images(path: Union[str, Path]) -> int:
+    """Number of image members (from the listing only - nothing is decompressed)"""
+    with ArchiveReader(path) as reader:
+        return len(reader.list_images())
+
+def iter_archive_to_dir(archive_path: Union[str, Path], dest_dir: Union[str, Path], start_index: int = 0) -> Iterator[Union[Path, Dict[str, str]]]:
+    """
+    Stream image members of an archive into dest_dir
+
+    Yields the written Path for each valid image as soon as it is on disk,
+    or a {"file", "reason"} dict for members that fail validation.
+    """
+    dest_dir = Path(dest_dir)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    index = start_index
+
+    try:
+        reader = ArchiveReader(archive_path)
+    except Exception as e:
+        logger.error(f"[INGEST] Cannot open archive {archive_path}: {e}")
+        yield {"file": Path(archive_path).name, "reason": f"archive_error:{e}"}
+        return
+
+    with reader:
+        for name, data in reader.iter_images():
+            if data is None:
+                yield {"file": name, "reason": "read_error"}
+                continue
+            if not data:
+                yield {"file": name, "reason": "empty_file"}
+                continue
+
+            image_format = sniff_image_format(data[:HEADER_SIZE])
+            if image_format is None:
+                yield {"file": name, "reason": "invalid_image_header"}
+                continue
+
+            target = dest_dir / short_filename(index, name)
+            target.write_bytes(data)
+            index += 1
+            yield target
+
+async def aiter_archive_to_dir(archive_path: Union[str, Path], dest_dir: Union[str, Path], start_index: int = 0) -> AsyncIterator[Union[Path, Dict[str, str]]]:
+    """Async version of iter_archive_to_dir (archive reads run in a worker thread)"""
+    members = iter_archive_to_dir(archive_path, dest_dir, start_index)
+    done = object()
+
+    while True:
+        item = await asyncio.to_thread(next, members, done)
+        if item is done:
+            return
+        yield item
@@ -1,123 +1,298 @@
 """
 Smart Parallel Image Processing
-Dynamically scales workers based on batch size
+Adapts each batch's worker count to its measured throughput
 OPTIMIZED: 60-87% faster than sequential processing
+NON-BLOCKING: batches run on shared executors driven by asyncio, so the
+event loop keeps serving progress polls, health checks and uploads
+
+CPU-bound Basic work (U2-Net) and I/O-bound Premium calls (Qwen API) run on
+separate executors with separate concurrency caps: a Premium batch waiting
+on the network can keep many requests in flight without taking threads
+from local segmentation.
 """
 
+import os
 import asyncio
 import time
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
-from typing import List, Callable, Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Callable, Dict, Any, AsyncIterable
 import multiprocessing
 import logging
 
+from .adaptive_concurrency import AdaptiveConcurrency
+
 logger = logging.getLogger(__name__)
 
+# Timeout per image (seconds)
+TASK_TIMEOUT = 300
+
+# AIMD worker autoscaling per batch (0 = fixed initial worker count)
+ADAPTIVE_WORKERS = os.getenv("ADAPTIVE_WORKERS", "1") == "1"
+
+# I/O pool for Premium (Qwen API) images: requests mostly wait on the network
+IO_MAX_WORKERS = int(os.getenv("IO_MAX_WORKERS", "32"))
+IO_INITIAL_WORKERS = int(os.getenv("IO_INITIAL_WORKERS", "8"))
+
+# Shared executor reused by every batch (created lazily on first use)
+_SHARED_EXECUTOR = None
+_executor_lock = threading.Lock()
+
+def get_shared_executor(max_workers: int) -> ThreadPoolExecutor:
+    """Return the process-wide executor used by all batches"""
+    global _SHARED_EXECUTOR
+
+    with _executor_lock:
+        if _SHARED_EXECUTOR is None:
+            _SHARED_EXECUTOR = ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix="batch-worker"
+            )
+            logger.info(f"[BATCH PROCESSOR] Shared executor created with {max_workers} threads")
+        return _SHARED_EXECUTOR
+
+_IO_EXECUTOR = None
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """Return the process-wide executor for I/O-bound (Premium) images"""
+    global _IO_EXECUTOR
+
+    with _executor_lock:
+        if _IO_EXECUTOR is None:
+            _IO_EXECUTOR = ThreadPoolExecutor(
+                max_workers=IO_MAX_WORKERS,
+                thread_name_prefix="premium-worker"
+            )
+            logger.info(f"[BATCH PROCESSOR] I/O executor created with {IO_MAX_WORKERS} threads")
+        return _IO_EXECUTOR
+
 class SmartBatchProcessor:
     """
     Intelligent batch processor that scales workers based on workload
 
-    Strategy (UPDATED for better small batch performance):
-    - 1-10 images: 2 workers (was 1, now parallel even for small batches)
-    - 11-50 images: 5 workers
-    - 51-100 images: 10 workers
-    - 101-200 images: 20 workers
-    - 201+ images: 30 workers (max)
+    Each batch starts at calculate_workers() and an AIMD controller
+    (adaptive_concurrency.py) then raises the worker count by one while
+    throughput keeps up and cuts it when per-image latency grows without a
+    throughput gain. The achieved concurrency and throughput of the last
+    run are kept in `run_stats` (written to results.json).
+
+    All batches share one executor per pool (CPU / I/O) so concurrent jobs
+    don't each spawn their own thread pool. With a scheduler ticket each
+    image also waits for a global worker slot, handed out fairly between
+    tenants (see job_scheduler.py), and the image processing itself waits
+    for its estimated memory in the process-wide budget (memory_budget.py).
     """
 
     def __init__(self):
         # For I/O-bound tasks (rembg), use more threads than CPUs
-        cpu_count = multiprocessing.cpu_count() or 4
-        self.max_workers = min(cpu_count * 3, 30)
+        self.cpu_count = multiprocessing.cpu_count() or 4
+        self.max_workers = min(self.cpu_count * 3, 30)
+        self.run_stats: Dict[str, Any] = {}
         logger.info(f"[BATCH PROCESSOR] Max workers: {self.max_workers}")
 
-    def calculate_workers(self, total_images: int) -> int:
-        """Calculate optimal worker count based on batch size"""
-        if total_images <= 10:
-            workers = 2  # UPDATED: Use 2 workers even for small batches
-        elif total_images <= 50:
-            workers = 5
-        elif total_images <= 100:
-            workers = 10
-        elif total_images <= 200:
-            workers = 20
-        else:
-            workers = 30
+    def calculate_workers(self, total_images: int, io_bound: bool = False) -> int:
+        """
+        Initial worker count for a batch (the controller adapts it from there)
 
-        # Never exceed system max
-        workers = min(workers, self.max_workers)
+        CPU-bound batches start at one worker per core; I/O-bound batches at
+        IO_INITIAL_WORKERS. Never more workers than images.
+        """
+        if io_bound:
+            workers = min(IO_INITIAL_WORKERS, IO_MAX_WORKERS)
+        else:
+            workers = min(self.cpu_count, self.max_workers)
+        workers = max(1, min(workers, total_images))
 
-        logger.info(f"[BATCH PROCESSOR] {total_images} images -> {workers} workers")
+        logger.info(f"[BATCH PROCESSOR] {total_images} images -> {workers} initial workers ({'io' if io_bound else 'cpu'})")
         return workers
 
     async def process_batch_async(
         self,
         items: List,
         process_func: Callable,
-        progress_callback: Callable = None
+        progress_callback: Callable = None,
+        item_callback: Callable = None,
+        ticket=None,
+        io_bound: bool = False
     ) -> List:
         """
         Process batch with optimal parallelization (async version)
 
+        Each item runs in the shared executor via loop.run_in_executor, so
+        awaiting this coroutine never blocks the event loop. Items are
+        dispatched through a bounded in-flight window (one per worker): a
+        5,000-image batch never has more than `workers` images submitted
+        at once.
+
         Args:
             items: List of items to process
             process_func: Function to apply to each item
             progress_callback: Optional callback for progress updates
+                (called on the event loop thread)
+            item_callback: Optional callback(result, processed, total) for
+                each finished item, called on the event loop thread
+            ticket: Optional JobTicket from the job scheduler
+            io_bound: Run on the I/O pool (Premium API calls)
 
         Returns:
-            List of results
+            List of results (completion order)
         """
         total = len(items)
-        workers = self.calculate_workers(total)
+        if total == 0:
+            return []
+
+        async def iter_items():
+            for item in items:
+                yield item
 
-        logger.info(f"[BATCH PROCESSOR] Starting batch: {total} items, {workers} workers")
+        return await self._process_window(iter_items(), total, process_func, progress_callback,
+                                          item_callback, ticket, io_bound, "batch")
+
+    async def process_stream_async(
+        self,
+        items: AsyncIterable,
+        total: int,
+        process_func: Callable,
+        progress_callback: Callable = None,
+        item_callback: Callable = None,
+        ticket=None,
+        io_bound: bool = False
+    ) -> List:
+        """
+        Process items as they arrive from an async iterable (e.g. archive members)
+
+        Like process_batch_async, but processing of the first items starts
+        while later ones are still being produced. The producer is only asked
+        for the next item when a slot in the window is free, so reading never
+        runs far ahead of processing.
+
+        Args:
+            items: Async iterable producing the items
+            total: Expected number of items (sizes the worker share and progress)
+            process_func: Function to apply to each item
+            progress_callback: Optional callback(processed, total)
+            item_callback: Optional callback(result, processed, total)
+            ticket: Optional JobTicket from the job scheduler
+            io_bound: Run on the I/O pool (Premium API calls)
+
+        Returns:
+            List of results (completion order)
+        """
+        return await self._process_window(items, total, process_func, progress_callback,
+                                          item_callback, ticket, io_bound, "stream")
+
+    async def _process_window(
+        self,
+        items: AsyncIterable,
+        total: int,
+        process_func: Callable,
+        progress_callback: Callable,
+        item_callback: Callable,
+        ticket,
+        io_bound: bool,
+        label: str
+    ) -> List:
+        """Run items with at most `limiter.limit` in flight (finished tasks are dropped as they land)"""
+        workers = self.calculate_workers(total, io_bound)
+
+        logger.info(f"[BATCH PROCESSOR] Starting {label}: ~{total} items, {workers} workers")
         start_time = time.time()
 
+        loop = asyncio.get_running_loop()
+        if io_bound:
+            executor, cap = get_io_executor(), IO_MAX_WORKERS
+        else:
+            executor, cap = get_shared_executor(self.max_workers), self.max_workers
+        limiter = AdaptiveConcurrency(
+            "io" if io_bound else "cpu", initial=workers, maximum=min(cap, max(total, 1)),
+            adaptive=ADAPTIVE_WORKERS
+        )
+
         results = []
-        processed = 0
+        in_flight = set()
 
-        # Use ThreadPoolExecutor for I/O-bound tasks (like rembg)
-        with ThreadPoolExecutor(max_workers=workers) as executor:
-            # Submit all tasks
-            future_to_item = {
-                executor.submit(process_func, item): item
-                for item in items
-            }
+        def release(started, healthy: bool, scheduled: bool):
+            limiter.release(time.monotonic() - started if started else 0.0, healthy)
+            if scheduled:
+                ticket.scheduler.release(ticket)
 
-            # Collect results as they complete (using as_completed for better progress)
-            for future in as_completed(future_to_item):
-                item = future_to_item[future]
+        async def run_item(item):
+            started = None
+            future = None
+            scheduled = False
+            healthy = True
+            try:
+                if ticket:
+                    await ticket.scheduler.acquire(ticket)
+                    scheduled = True
+                started = time.monotonic()
+                future = loop.run_in_executor(executor, process_func, item)
+                # shield(): a timeout would cancel the future although its thread keeps running
+                result = await asyncio.wait_for(asyncio.shield(future), timeout=TASK_TIMEOUT)
+                # A failed Premium call is the API pushing back (throttling, overload)
+                healthy = not (isinstance(result, dict) and result.get("premium_fallback") == "premium_failed")
+            except Exception as e:
+                logger.error(f"[BATCH PROCESSOR] Task failed: {e}")
+                result = {"success": False, "error": str(e)}
+                healthy = False
+            finally:
+                if future is not None and not future.done():
+                    # Timed out: the worker thread is still busy, keep its slots until it returns
+                    future.add_done_callback(lambda _: release(started, False, scheduled))
+                else:
+                    release(started, healthy, scheduled)
 
-                try:
-                    result = future.result(timeout=300)  # 5 min timeout per image
-                    results.append(result)
-                    processed += 1
-
-                    # Progress callback
-                    if progress_callback:
-                        progress_callback(processed, total)
-
-                    # Log every 10 images or at completion
-                    if processed % 10 == 0 or processed == total:
-                        elapsed = time.time() - start_time
-                        rate = processed / elapsed if elapsed > 0 else 0
-                        eta = (total - processed) / rate if rate > 0 else 0
-                        logger.info(
-                            f"[BATCH PROCESSOR] Progress: {processed}/{total} "
-                            f"({processed*100//total}%) | "
-                            f"Rate: {rate:.1f} img/sec | "
-                            f"ETA: {eta:.0f}s"
-                        )
+            results.append(result)
+            processed = len(results)
+            expected = max(total, processed)
 
+            # Per-item and progress callbacks (a failing callback must not abort the batch)
+            if item_callback:
+                try:
+                    item_callback(result, processed, expected)
                 except Exception as e:
-                    logger.error(f"[BATCH PROCESSOR] Task failed: {e}")
-                    results.append({"success": False, "error": str(e)})
-                    processed += 1
+                    logger.error(f"[BATCH PROCESSOR] Item callback failed: {e}")
+            if progress_callback:
+                try:
+                    progress_callback(processed, expected)
+                except Exception as e:
+                    logger.error(f"[BATCH PROCESSOR] Progress callback failed: {e}")
+
+            # Log every 10 images or at completion
+            if processed % 10 == 0 or processed == total:
+                elapsed = time.time() - start_time
+                rate = processed / elapsed if elapsed > 0 else 0
+                eta = (expected - processed) / rate if rate > 0 else 0
+                logger.info(
+                    f"[BATCH PROCESSOR] Progress: {processed}/{expected} "
+                    f"({processed*100//expected}%) | "
+                    f"Rate: {rate:.1f} img/sec | "
+                    f"ETA: {eta:.0f}s"
+                )
+
+        try:
+            async for item in items:
+                await limiter.acquire()
+                task = asyncio.create_task(run_item(item))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+        except BaseException:
+            # The producer failed (or the batch was cancelled): don't leave started items orphaned
+            tasks = list(in_flight)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        if in_flight:
+            await asyncio.gather(*in_flight)
 
         elapsed = time.time() - start_time
+        self.run_stats = limiter.get_stats()
         logger.info(
-            f"[BATCH PROCESSOR] Batch complete: {total} items in {elapsed:.1f}s "
-            f"({total/elapsed:.2f} img/sec)"
+            f"[BATCH PROCESSOR] {label.capitalize()} complete: {len(results)} items in {elapsed:.1f}s "
+            f"({len(results)/elapsed if elapsed > 0 else 0:.2f} img/sec, "
+            f"{self.run_stats['mean_concurrency']} mean / {self.run_stats['final_workers']} final workers)"
         )
 
         return results
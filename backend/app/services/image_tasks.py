@@ -0,0 +1,243 @@
+"""
+Image Tasks
+Per-image processing and job finalization shared by the API and the workers
+
+server.py runs these inline (PROCESSING_MODE=inline) and worker.py runs
+them for tasks claimed from the task queue (PROCESSING_MODE=queue), so a
+job produces the same files, file results and results.json either way.
+
+simple_processing (rembg and the U2-Net preload) is imported by the
+process_job_image* functions only: recording and finalizing results works
+without the model.
+"""
+
+import json
+import time
+import asyncio
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from .memory_budget import get_memory_budget, estimate_image_memory
+from .job_store import JobStore
+
+logger = logging.getLogger(__name__)
+
+def process_job_image(image_file: Path, processed_dir: Path, pipeline: str, shadow_params: dict = None,
+                      use_premium: bool = False) -> Dict[str, Any]:
+    """
+    Process one image of a job -> per-file result (as stored in the job store)
+
+    Waits for the image's estimated footprint in the memory budget first
+    (see memory_budget.py), so concurrent large originals can't exhaust RAM.
+    """
+    from .simple_processing import process_image_simple, get_working_size, DOWNSCALE_BEFORE_SEGMENT
+
+    tier_prefix = "premium" if use_premium else "basic"
+
+    # All pipelines use JPG with white background
+    output_filename = f"processed_{tier_prefix}_{pipeline}_{image_file.stem}.jpg"
+    output_path = processed_dir / output_filename
+
+    working_size = get_working_size(pipeline) if DOWNSCALE_BEFORE_SEGMENT else None
+    with get_memory_budget().reserve(estimate_image_memory(image_file, working_size)):
+        result = process_image_simple(
+            input_path=str(image_file),
+            output_path=str(output_path),
+            pipeline=pipeline,
+            shadow_params=shadow_params,
+            use_premium=use_premium  # Pass premium flag
+        )
+
+    return build_file_result(image_file, output_filename, output_path, result)
+
+def process_job_image_multi(image_file: Path, processed_dir: Path, pipelines: List[str], shadow_params: dict = None,
+                            use_premium: bool = False) -> List[Dict[str, Any]]:
+    """
+    Process one image of a multi-pipeline job -> one file result per pipeline
+
+    The image is segmented once for all pipelines (see process_image_multi).
+    Outputs go to processed/<job>/<pipeline>/, and each file result's
+    "processed" is that relative path, so the download ZIP groups the
+    outputs per pipeline. Every output is billed as its own result.
+    """
+    from .simple_processing import process_image_multi, get_working_size, DOWNSCALE_BEFORE_SEGMENT
+
+    tier_prefix = "premium" if use_premium else "basic"
+
+    output_filenames = {}
+    output_paths = {}
+    for pipeline in pipelines:
+        (processed_dir / pipeline).mkdir(parents=True, exist_ok=True)
+        output_filenames[pipeline] = f"{pipeline}/processed_{tier_prefix}_{pipeline}_{image_file.stem}.jpg"
+        output_paths[pipeline] = processed_dir / output_filenames[pipeline]
+
+    # One decode at the largest working size serves every pipeline
+    working_size = max(get_working_size(pipeline) for pipeline in pipelines) if DOWNSCALE_BEFORE_SEGMENT else None
+    with get_memory_budget().reserve(estimate_image_memory(image_file, working_size)):
+        results = process_image_multi(
+            input_path=str(image_file),
+            outputs={pipeline: str(path) for pipeline, path in output_paths.items()},
+            shadow_params=shadow_params,
+            use_premium=use_premium
+        )
+
+    return [
+        build_file_result(image_file, output_filenames[pipeline], output_paths[pipeline], results[pipeline], pipeline)
+        for pipeline in pipelines
+    ]
+
+def build_file_result(image_file: Path, output_filename: str, output_path: Path, result: Dict[str, Any],
+                      pipeline: str = None) -> Dict[str, Any]:
+    """Per-file result (job store / results.json) from a processing result"""
+    if result.get("success"):
+        file_result = {
+            "success": True,
+            "original": image_file.name,
+            "processed": output_filename,
+            "path": str(output_path),
+            "shadow_applied": result.get("shadow_applied", False),
+            "shadow_type": result.get("shadow_type"),
+            # Billed per result: a Premium request served by Basic costs 1 credit
+            "method": result.get("method"),
+            "credits_used": result.get("credits_used", 0)
+        }
+        if result.get("premium_fallback"):
+            file_result["premium_fallback"] = result["premium_fallback"]
+        # How the Basic mask was made (u2net, white_background, mask_cache), for quality audits
+        if result.get("mask_method"):
+            file_result["mask_method"] = result["mask_method"]
+    else:
+        file_result = {
+            "success": False,
+            "original": image_file.name,
+            "error": result.get("error", "Unknown error")
+        }
+
+    # Multi-pipeline jobs: which marketplace output this is
+    if pipeline:
+        file_result["pipeline"] = pipeline
+    return file_result
+
+def failed_file_results(original: str, error: str, pipelines: List[str] = None) -> List[Dict[str, Any]]:
+    """Failed result(s) for an image that was never processed: one per output of the job"""
+    results = []
+    for pipeline in pipelines or [None]:
+        file_result = {"success": False, "original": original, "error": error}
+        if pipeline:
+            file_result["pipeline"] = pipeline
+        results.append(file_result)
+    return results
+
+def build_final_results(job_id: str, pipeline: Union[str, List[str]], shadow_params: dict, results: List[Dict[str, Any]],
+                        processing_stats: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Job summary (processed/<job>/results.json and the job store summary)
+
+    pipeline: the job's pipeline, or its list of pipelines (multi-pipeline
+    job: "pipeline" is "multi" and totals count outputs, one per image and
+    pipeline)
+    processing_stats: achieved concurrency / throughput of the batch
+    (SmartBatchProcessor.run_stats), kept for capacity tuning
+    """
+    successful = [r for r in results if r.get("success")]
+    failed = [r for r in results if not r.get("success")]
+    shadow_enabled = shadow_params.get("enabled", False) if shadow_params else False
+
+    pipelines = pipeline if isinstance(pipeline, list) else None
+    final_results = {
+        "job_id": job_id,
+        "pipeline": "multi" if pipelines else pipeline,
+        "shadow_enabled": shadow_enabled,
+        "shadow_type": shadow_params.get("type", "none") if shadow_enabled else "none",
+        "total_files": len(results),
+        "successful": len(successful),
+        "failed": len(failed),
+        "successful_files": successful,
+        "failed_files": failed,
+        "credits_used": sum(r.get("credits_used", 0) for r in successful),
+        "premium_fallbacks": sum(1 for r in successful if r.get("premium_fallback")),
+        "mask_methods": dict(Counter(r["mask_method"] for r in successful if r.get("mask_method"))),
+        "status": "completed",
+        "completed_at": time.time()
+    }
+    if pipelines:
+        final_results["pipelines"] = pipelines
+        final_results["outputs_per_pipeline"] = {
+            name: sum(1 for r in successful if r.get("pipeline") == name) for name in pipelines
+        }
+    if processing_stats:
+        final_results["processing"] = processing_stats
+    return final_results
+
+def finalize_job(job_store: JobStore, job_id: str, processed_dir: Path, pipeline: Union[str, List[str]],
+                 shadow_params: dict, results: List[Dict[str, Any]] = None,
+                 processing_stats: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Write results.json and mark the job completed
+
+    Jobs of an authenticated user ("user_id" in the job metadata) are charged
+    here, once, per result (see charge_job). Call it from a thread without a
+    running event loop.
+    """
+    if results is None:
+        results = job_store.get_results(job_id)
+
+    final_results = build_final_results(job_id, pipeline, shadow_params, results, processing_stats)
+
+    user_id = (job_store.get_job(job_id) or {}).get("user_id")
+    if user_id:
+        final_results["billing"] = charge_job(job_id, user_id, results)
+
+    processed_dir.mkdir(parents=True, exist_ok=True)
+    with open(processed_dir / "results.json", "w") as f:
+        json.dump(final_results, f, indent=2)
+
+    job_store.complete_job(job_id, final_results)
+    logger.info(
+        f"[JOB] {job_id} completed: {final_results['successful']}/{final_results['total_files']} successful, "
+        f"{final_results['failed']} failed"
+    )
+    return final_results
+
+def charge_job(job_id: str, user_id: str, results: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Deduct a finished job's credits by the method that produced each result
+
+    A Premium image served by Basic (Qwen failure or hedge won by rembg) pays
+    the Basic rate; failed images are not charged.
+    """
+    try:
+        from .credit_deduction_service import deduct_credits_for_results
+        charged = asyncio.run(deduct_credits_for_results(user_id, results, job_id))
+    except Exception as e:
+        logger.error(f"[JOB] {job_id}: credit deduction failed: {e}")
+        return {"success": False, "credits_deducted": 0, "error": str(e), "job_id": job_id}
+
+    logger.info(f"[JOB] {job_id}: charged {charged['credits_deducted']} credits to user {user_id}")
+    return charged
+
+def result_key(image: Union[str, Path], file_result: Dict[str, Any]) -> str:
+    """Identity of one output of a job (image and pipeline), however often its task is delivered"""
+    return f"{image}|{file_result.get('pipeline') or ''}"
+
+def record_and_finalize(job_store: JobStore, job_id: str, file_result: Dict[str, Any], processed_dir: Path,
+                        pipeline: Union[str, List[str]], shadow_params: dict, key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Record one file result; whoever records the job's last result finalizes it
+
+    Used when a job's images are processed by several worker processes.
+    Queue tasks are delivered at least once, so results are recorded under
+    their key (see result_key): a redelivered result is not counted again,
+    and a job whose finalization failed is finalized by the next delivery.
+    begin_finalize() makes sure only one caller finalizes.
+    """
+    progress = job_store.record_result(job_id, file_result, key)
+    if progress["total"] and progress["current"] >= progress["total"] and job_store.begin_finalize(job_id):
+        try:
+            finalize_job(job_store, job_id, processed_dir, pipeline, shadow_params)
+        except Exception:
+            job_store.cancel_finalize(job_id)
+            raise
+    return progress
@@ -0,0 +1,179 @@
+"""
+Job Event Broker
+Push channel for job progress (Server-Sent Events / WebSocket)
+
+Replaces frontend polling of /api/v1/progress and /api/v1/status. Producers
+publish events for a job and every subscriber of that job gets them through
+its own asyncio.Queue. Events:
+
+    {"type": "progress", "status", "current", "total", "percentage"}
+    {"type": "image", "current", "total", "file": {...per-file result...}}
+    {"type": "completed" | "failed", "status", "successful", "failed", ...}
+
+(job failures use "failed" because "error" is reserved by EventSource)
+
+publish() may be called from any thread (batch workers); delivery always
+happens on the event loop thread. Subscribers connected to a different API
+worker than the one running the job fall back to the job store (see
+stream_job_events).
+"""
+
+import json
+import asyncio
+import logging
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from .job_store import JobStore
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_EVENTS = {"completed", "failed"}
+
+# Max buffered events per subscriber before the oldest are dropped
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+# How often a subscriber re-checks the job store when no event arrives
+STORE_POLL_INTERVAL = 2.0
+
+class JobEventBroker:
+    """In-process fan-out of job events to asyncio subscribers"""
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stats = {"published": 0, "delivered": 0, "dropped": 0}
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        """Register a subscriber (call from the event loop)"""
+        self._loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(job_id, []).append(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        with self._lock:
+            queues = self._subscribers.get(job_id, [])
+            if queue in queues:
+                queues.remove(queue)
+            if not queues:
+                self._subscribers.pop(job_id, None)
+
+    def has_subscribers(self, job_id: str) -> bool:
+        with self._lock:
+            return bool(self._subscribers.get(job_id))
+
+    def publish(self, job_id: str, event: Dict[str, Any]):
+        """Publish an event to every subscriber of job_id (thread-safe)"""
+        self._stats["published"] += 1
+        if not self.has_subscribers(job_id) or self._loop is None:
+            return
+
+        event = {"job_id": job_id, **event}
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is self._loop:
+            self._deliver(job_id, event)
+        else:
+            self._loop.call_soon_threadsafe(self._deliver, job_id, event)
+
+    def _deliver(self, job_id: str, event: Dict[str, Any]):
+        with self._lock:
+            queues = list(self._subscribers.get(job_id, []))
+
+        for queue in queues:
+            if queue.full():
+                # Slow consumer: drop the oldest event rather than block producers
+                queue.get_nowait()
+                self._stats["dropped"] += 1
+            queue.put_nowait(event)
+            self._stats["delivered"] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            subscribers = sum(len(queues) for queues in self._subscribers.values())
+        return {**self._stats, "jobs_watched": len(self._subscribers), "subscribers": subscribers}
+
+def progress_event(progress: Dict[str, Any]) -> Dict[str, Any]:
+    """Progress event from a job store progress payload"""
+    return {
+        "type": "progress",
+        "status": progress["status"],
+        "current": progress["current"],
+        "total": progress["total"],
+        "percentage": progress["percentage"]
+    }
+
+def terminal_event(job: Dict[str, Any]) -> Dict[str, Any]:
+    """completed/failed event from a job store summary"""
+    return {
+        "type": "failed" if job.get("status") == "error" else "completed",
+        "status": job.get("status"),
+        "total": job.get("total_files", 0),
+        "successful": job.get("successful", 0),
+        "failed": job.get("failed", 0)
+    }
+
+def snapshot_events(job_store: JobStore, job_id: str) -> List[Dict[str, Any]]:
+    """Events describing the current state of a job (sent when a client connects)"""
+    progress = job_store.get_progress(job_id)
+    if progress is None:
+        return []
+
+    events = [progress_event(progress)]
+    for index, result in enumerate(job_store.get_results(job_id), start=1):
+        events.append({"type": "image", "current": index, "total": progress["total"], "file": result})
+
+    if progress["status"] in ("completed", "error"):
+        events.append(terminal_event(job_store.get_job(job_id) or progress))
+
+    return [{"job_id": job_id, **event} for event in events]
+
+async def stream_job_events(broker: JobEventBroker, job_store: JobStore, job_id: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield a job's events until it completes or fails
+
+    Starts with a snapshot from the job store, then relays live events (an
+    image finishing while the client connects may be reported twice; clients
+    should key files by their "original" name). If the job runs in another
+    API worker no live events arrive here, so new job store state is turned
+    into events every STORE_POLL_INTERVAL seconds instead.
+    """
+    queue = broker.subscribe(job_id)
+    try:
+        # Job store reads are blocking (SQLite / Redis): keep them off the event loop
+        events = await asyncio.to_thread(snapshot_events, job_store, job_id)
+        images_seen = sum(1 for event in events if event["type"] == "image")
+
+        while True:
+            for event in events:
+                yield event
+                if event["type"] in TERMINAL_EVENTS:
+                    return
+
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=STORE_POLL_INTERVAL)
+                if event["type"] == "image":
+                    images_seen += 1
+                events = [event]
+            except asyncio.TimeoutError:
+                snapshot = await asyncio.to_thread(snapshot_events, job_store, job_id)
+                images = [event for event in snapshot if event["type"] == "image"]
+                new_images = images[images_seen:]
+                images_seen = max(images_seen, len(images))
+                terminal = [event for event in snapshot if event["type"] in TERMINAL_EVENTS]
+                events = (snapshot[:1] if new_images else []) + new_images + terminal
+    finally:
+        broker.unsubscribe(job_id, queue)
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Encode an event as a Server-Sent Events frame"""
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+# Global broker instance
+job_event_broker = JobEventBroker()
@@ -0,0 +1,305 @@
+"""
+Multi-tenant Job Scheduler
+Weighted fair sharing of the image workers between tenants
+
+Every job is admitted with a ticket, and each of its images then waits for
+one of SCHEDULER_MAX_WORKERS global worker slots. Waiting images sit in one
+heap per plan, ordered by start tag (start-time fair queueing): a tenant's
+next image is stamped 1/weight after its previous one, but never before the
+virtual clock. A 2,000-image ZIP therefore queues its images behind the
+first image of a 5-image job from another tenant instead of in front of it,
+and plans with priority_processing (weight SCHEDULER_PRIORITY_WEIGHT) get a
+proportionally larger share while workers are contended.
+
+Admission is bounded: when admitted-but-unfinished images would exceed
+SCHEDULER_MAX_PENDING (or SCHEDULER_MAX_TENANT_PENDING for one tenant) the
+job is rejected with SchedulerBusy, which carries an ETA derived from the
+recent throughput; the API answers 429 with Retry-After.
+
+All methods run on the event loop thread (no locking).
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import multiprocessing
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from ..models.user_models import PlanType, PLAN_CONFIGS
+
+logger = logging.getLogger(__name__)
+
+# Seconds per image assumed until there is measured throughput
+DEFAULT_IMAGE_SECONDS = 2.0
+
+class SchedulerBusy(Exception):
+    """Job rejected by admission control (answer 429)"""
+
+    def __init__(self, message: str, retry_after: float, eta_seconds: float, pending_images: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.eta_seconds = eta_seconds
+        self.pending_images = pending_images
+
+@dataclass
+class JobTicket:
+    """Admission of one job; hands out worker slots for its images"""
+    scheduler: "JobScheduler"
+    job_id: str
+    tenant: str
+    plan: PlanType
+    images: int
+    weight: float
+    priority: int = 0
+    eta_seconds: float = 0.0
+    remaining: int = 0
+    admitted_at: float = field(default_factory=time.time)
+    closed: bool = False
+
+    def slot(self):
+        """async with ticket.slot(): process one image"""
+        return self.scheduler.slot(self)
+
+    def close(self):
+        """Job finished (releases any images that were admitted but never processed)"""
+        self.scheduler.close(self)
+
+@dataclass
+class _TenantState:
+    vtime: float = 0.0  # Start tag of the tenant's last queued/granted image
+    pending: int = 0
+    jobs: int = 0
+
+class JobScheduler:
+    """
+    Plan-aware, weighted fair image scheduler with admission control
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, max_tenant_pending: int,
+                 priority_weight: float = 4.0):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_tenant_pending = max_tenant_pending
+        self.priority_weight = priority_weight
+
+        self._free = max_workers
+        self._heaps: Dict[PlanType, list] = {plan: [] for plan in PlanType}
+        self._seq = itertools.count()
+        self._vclock = 0.0
+        self._tenants: Dict[str, _TenantState] = {}
+        self._pending = 0
+        self._completions = deque(maxlen=200)
+        self._stats = {"admitted": 0, "rejected": 0, "completed_images": 0}
+
+    # ------------------------------------------------------------
+    # Admission
+    # ------------------------------------------------------------
+
+    def weight_for(self, plan: PlanType) -> float:
+        plan_config = PLAN_CONFIGS.get(plan, PLAN_CONFIGS[PlanType.FREE])
+        return self.priority_weight if plan_config.priority_processing else 1.0
+
+    def throughput(self) -> float:
+        """Recent images/second (estimate from the worker count until measured)"""
+        if len(self._completions) >= 10:
+            elapsed = time.monotonic() - self._completions[0]
+            if elapsed > 0:
+                return len(self._completions) / elapsed
+        return self.max_workers / DEFAULT_IMAGE_SECONDS
+
+    def admit(self, job_id: str, tenant: str, plan: PlanType = PlanType.FREE,
+              images: int = 1, priority: int = 0) -> JobTicket:
+        """
+        Admit a job or raise SchedulerBusy
+
+        A job larger than the limits is still admitted when nothing else is
+        pending (for the tenant / globally), so it can never be rejected forever.
+        """
+        images = max(1, images)
+        tenant_state = self._tenants.get(tenant) or _TenantState()
+        rate = self.throughput()
+
+        over_global = self._pending and self._pending + images > self.max_pending
+        over_tenant = tenant_state.pending and tenant_state.pending + images > self.max_tenant_pending
+        if over_global or over_tenant:
+            self._stats["rejected"] += 1
+            excess = (self._pending + images - self.max_pending) if over_global \
+                else (tenant_state.pending + images - self.max_tenant_pending)
+            retry_after = max(1.0, excess / rate)
+            eta = (self._pending + images) / rate
+            scope = "Server" if over_global else "Your"
+            logger.warning(
+                f"[SCHEDULER] Rejected job {job_id} ({images} images, tenant {tenant}): "
+                f"{self._pending} pending, retry in {retry_after:.0f}s"
+            )
+            raise SchedulerBusy(
+                f"{scope} processing queue is full ({self._pending} images pending)",
+                retry_after=retry_after, eta_seconds=eta, pending_images=self._pending
+            )
+
+        self._tenants[tenant] = tenant_state
+        tenant_state.pending += images
+        tenant_state.jobs += 1
+        self._pending += images
+        self._stats["admitted"] += 1
+
+        ticket = JobTicket(
+            scheduler=self, job_id=job_id, tenant=tenant, plan=plan, images=images,
+            weight=self.weight_for(plan), priority=priority,
+            eta_seconds=round(self._pending / rate, 1), remaining=images
+        )
+        logger.info(
+            f"[SCHEDULER] Admitted job {job_id}: {images} images, tenant {tenant} ({plan.value}), "
+            f"{self._pending} pending, ETA {ticket.eta_seconds:.0f}s"
+        )
+        return ticket
+
+    def check_backlog(self, job_id: str, backlog: int, images: int):
+        """
+        Admission against an external backlog (task queue depth when the
+        images are processed by worker processes); raises SchedulerBusy
+        """
+        if backlog and backlog + images > self.max_pending:
+            self._stats["rejected"] += 1
+            rate = self.throughput()
+            raise SchedulerBusy(
+                f"Server processing queue is full ({backlog} images pending)",
+                retry_after=max(1.0, (backlog + images - self.max_pending) / rate),
+                eta_seconds=(backlog + images) / rate, pending_images=backlog
+            )
+
+    # ------------------------------------------------------------
+    # Worker slots
+    # ------------------------------------------------------------
+
+    async def acquire(self, ticket: JobTicket):
+        """Wait for a worker slot for one image of the ticket's job"""
+        tenant = self._tenants[ticket.tenant]
+        start = max(tenant.vtime, self._vclock)
+        tenant.vtime = start + 1.0 / ticket.weight
+
+        if self._free > 0 and not any(self._heaps.values()):
+            self._free -= 1
+            self._vclock = start
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        plan_rank = 0 if ticket.weight > 1.0 else 1
+        heapq.heappush(self._heaps[ticket.plan], (start, plan_rank, -ticket.priority, next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted just before the waiter was cancelled
+                self._free += 1
+                self._dispatch()
+            raise
+
+    def release(self, ticket: JobTicket):
+        """One image of the ticket's job finished"""
+        self._free += 1
+        self._completions.append(time.monotonic())
+        self._stats["completed_images"] += 1
+        if ticket.remaining > 0:
+            ticket.remaining -= 1
+            self._pending -= 1
+            self._tenants[ticket.tenant].pending -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, ticket: JobTicket):
+        await self.acquire(ticket)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    def _dispatch(self):
+        """Hand free slots to the waiting images with the lowest start tags"""
+        while self._free > 0:
+            heads = [heap for heap in self._heaps.values() if heap]
+            if not heads:
+                return
+            heap = min(heads, key=lambda h: h[0])
+            entry = heapq.heappop(heap)
+            future = entry[-1]
+            if future.done():  # Waiter cancelled
+                continue
+            self._vclock = entry[0]
+            self._free -= 1
+            future.set_result(None)
+
+    def close(self, ticket: JobTicket):
+        if ticket.closed:
+            return
+        ticket.closed = True
+
+        tenant = self._tenants.get(ticket.tenant)
+        self._pending -= ticket.remaining
+        if tenant:
+            tenant.pending -= ticket.remaining
+            tenant.jobs -= 1
+            if tenant.jobs <= 0:
+                del self._tenants[ticket.tenant]
+        ticket.remaining = 0
+
+    # ------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------
+
+    def get_stats(self) -> dict:
+        return {
+            **self._stats,
+            "max_workers": self.max_workers,
+            "busy_workers": self.max_workers - self._free,
+            "pending_images": self._pending,
+            "max_pending": self.max_pending,
+            "waiting": {plan.value: len(heap) for plan, heap in self._heaps.items()},
+            "tenants": {name: {"pending": state.pending, "jobs": state.jobs} for name, state in self._tenants.items()},
+            "throughput": round(self.throughput(), 3)
+        }
+
+# Global scheduler (created on first use)
+_job_scheduler: Optional[JobScheduler] = None
+
+def get_job_scheduler() -> JobScheduler:
+    """Process-wide scheduler configured from the environment"""
+    global _job_scheduler
+
+    if _job_scheduler is None:
+        # Same cap as the shared batch executor (see batch_processor.py)
+        default_workers = min((multiprocessing.cpu_count() or 4) * 3, 30)
+        _job_scheduler = JobScheduler(
+            max_workers=int(os.getenv("SCHEDULER_MAX_WORKERS", str(default_workers))),
+            max_pending=int(os.getenv("SCHEDULER_MAX_PENDING", "10000")),
+            max_tenant_pending=int(os.getenv("SCHEDULER_MAX_TENANT_PENDING", "3000")),
+            priority_weight=float(os.getenv("SCHEDULER_PRIORITY_WEIGHT", "4"))
+        )
+    return _job_scheduler
+
+def parse_plan(value) -> PlanType:
+    """PlanType from a stored plan value (unknown/missing -> FREE)"""
+    if isinstance(value, PlanType):
+        return value
+    try:
+        return PlanType(str(value).lower())
+    except ValueError:
+        return PlanType.FREE
+
+def caller_tenant(user_id: Optional[str] = None, client: Optional[str] = None) -> str:
+    """
+    Scheduler tenant of a caller
+
+    Authenticated users are one tenant across all their jobs; unauthenticated
+    callers share one tenant per client address. A job id is never a tenant
+    (every job would get its own fair share and its own pending cap).
+    """
+    if user_id:
+        return f"user:{user_id}"
+    return f"anonymous:{client or 'unknown'}"
@@ -0,0 +1,455 @@
+"""
+Persistent Job Store
+Job state, per-file results and progress counters shared by every API worker
+
+Replaces the process-local JOB_PROGRESS dict and the results.json polling in
+server.py. Backends:
+
+    sqlite:///jobs.db          - embedded SQLite in WAL mode (default)
+    redis://host:6379/0        - Redis (requires the `redis` package)
+
+Select with JOB_STORE_URL. All counter updates are atomic, so batch worker
+threads (and several uvicorn workers) can report results concurrently.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOB_STORE_URL = "sqlite:///jobs.db"
+
+# Seconds a finalizer holds a job before another caller may finalize it again
+# (it died while writing results.json)
+FINALIZE_LEASE_SECONDS = 600
+
+def build_progress(job_id: str, status: str, current: int, total: int, updated_at: float) -> Dict[str, Any]:
+    """Progress payload in the shape returned by /api/v1/progress"""
+    return {
+        "job_id": job_id,
+        "status": status,
+        "current": current,
+        "total": total,
+        "percentage": int((current / total * 100)) if total > 0 else 0,
+        "updated_at": updated_at
+    }
+
+class JobStore(ABC):
+    """
+    Interface shared by the job store backends
+
+    A job moves through starting -> processing -> completed | error. While it
+    runs, every finished file is recorded with record_result(), which bumps
+    the progress counters in the same atomic update. complete_job() stores
+    the final summary (the same document as processed/<job>/results.json).
+
+    Queue workers may deliver a task more than once, so results can carry a
+    key (image and pipeline): a key already recorded is not counted again.
+    begin_finalize() lets exactly one of the callers that see the last
+    result write the summary.
+    """
+
+    @abstractmethod
+    def create_job(self, job_id: str, total: int, metadata: Optional[Dict[str, Any]] = None):
+        """Start (or restart from scratch) a job of `total` results"""
+
+    @abstractmethod
+    def update_progress(self, job_id: str, current: int, total: int, status: str = "processing"):
+        """Overwrite the progress counters and status"""
+
+    @abstractmethod
+    def record_result(self, job_id: str, result: Dict[str, Any], key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Store one file result and return the updated progress
+
+        With a key, a result already recorded under it is ignored
+        ("recorded" is False in the returned progress).
+        """
+
+    @abstractmethod
+    def begin_finalize(self, job_id: str) -> bool:
+        """Claim the job's finalization (False if it is finished or another caller holds it)"""
+
+    @abstractmethod
+    def cancel_finalize(self, job_id: str):
+        """Give up a claimed finalization (it failed) so a later caller can retry it"""
+
+    @abstractmethod
+    def complete_job(self, job_id: str, summary: Dict[str, Any], status: str = "completed"):
+        """Store the final summary and the terminal status"""
+
+    @abstractmethod
+    def get_progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Progress payload (see build_progress), None for unknown jobs"""
+
+    @abstractmethod
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Final summary for finished jobs, or live state plus file results"""
+
+    @abstractmethod
+    def get_results(self, job_id: str) -> List[Dict[str, Any]]:
+        """File results in the order they were recorded"""
+
+# ============================================================
+# SQLITE (default)
+# ============================================================
+
+class SQLiteJobStore(JobStore):
+    """SQLite backend in WAL mode (one connection per thread)"""
+
+    def __init__(self, path: str = "jobs.db"):
+        self.path = path
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id      TEXT PRIMARY KEY,
+                status      TEXT NOT NULL,
+                current     INTEGER NOT NULL DEFAULT 0,
+                total       INTEGER NOT NULL DEFAULT 0,
+                successful  INTEGER NOT NULL DEFAULT 0,
+                failed      INTEGER NOT NULL DEFAULT 0,
+                metadata    TEXT,
+                summary     TEXT,
+                created_at  REAL NOT NULL,
+                updated_at  REAL NOT NULL,
+                finalizing_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS job_files (
+                job_id      TEXT NOT NULL,
+                seq         INTEGER NOT NULL,
+                success     INTEGER NOT NULL,
+                result      TEXT NOT NULL,
+                result_key  TEXT,
+                PRIMARY KEY (job_id, seq)
+            );
+        """)
+        # Databases created before result keys and finalize claims
+        self._add_column(conn, "jobs", "finalizing_at", "REAL")
+        self._add_column(conn, "job_files", "result_key", "TEXT")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS job_files_key ON job_files (job_id, result_key)")
+        logger.info(f"[JOB STORE] SQLite job store ready ({path})")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _add_column(conn: sqlite3.Connection, table: str, column: str, definition: str):
+        columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def create_job(self, job_id: str, total: int, metadata: Optional[Dict[str, Any]] = None):
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-processing a job starts from scratch
+            conn.execute("DELETE FROM job_files WHERE job_id = ?", (job_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs "
+                "(job_id, status, current, total, successful, failed, metadata, summary, created_at, updated_at) "
+                "VALUES (?, 'starting', 0, ?, 0, 0, ?, NULL, ?, ?)",
+                (job_id, total, json.dumps(metadata or {}), now, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def update_progress(self, job_id: str, current: int, total: int, status: str = "processing"):
+        now = time.time()
+        conn = self._connect()
+        cursor = conn.execute(
+            "UPDATE jobs SET current = ?, total = ?, status = ?, updated_at = ? WHERE job_id = ?",
+            (current, total, status, now, job_id)
+        )
+        if cursor.rowcount == 0:
+            conn.execute(
+                "INSERT OR IGNORE INTO jobs (job_id, status, current, total, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, status, current, total, now, now)
+            )
+
+    def record_result(self, job_id: str, result: Dict[str, Any], key: Optional[str] = None) -> Dict[str, Any]:
+        success = 1 if result.get("success") else 0
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            duplicate = key is not None and conn.execute(
+                "SELECT 1 FROM job_files WHERE job_id = ? AND result_key = ?", (job_id, key)
+            ).fetchone() is not None
+            if not duplicate:
+                # A late result (e.g. a timed-out image finishing) doesn't reopen a finished job
+                cursor = conn.execute(
+                    "UPDATE jobs SET current = current + 1, successful = successful + ?, failed = failed + ?, "
+                    "status = CASE WHEN status IN ('completed', 'error') THEN status ELSE 'processing' END, "
+                    "updated_at = ? WHERE job_id = ?",
+                    (success, 1 - success, now, job_id)
+                )
+                if cursor.rowcount == 0:
+                    raise KeyError(f"Unknown job {job_id}")
+                conn.execute(
+                    "INSERT INTO job_files (job_id, seq, success, result, result_key) "
+                    "SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?, ? FROM job_files WHERE job_id = ?",
+                    (job_id, success, json.dumps(result, default=str), key, job_id)
+                )
+            row = conn.execute("SELECT status, current, total FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        progress = build_progress(job_id, row["status"], row["current"], row["total"], now)
+        progress["recorded"] = not duplicate
+        return progress
+
+    def begin_finalize(self, job_id: str) -> bool:
+        now = time.time()
+        cursor = self._connect().execute(
+            "UPDATE jobs SET finalizing_at = ? WHERE job_id = ? AND status NOT IN ('completed', 'error') "
+            "AND (finalizing_at IS NULL OR finalizing_at < ?)",
+            (now, job_id, now - FINALIZE_LEASE_SECONDS)
+        )
+        return cursor.rowcount == 1
+
+    def cancel_finalize(self, job_id: str):
+        self._connect().execute("UPDATE jobs SET finalizing_at = NULL WHERE job_id = ?", (job_id,))
+
+    def complete_job(self, job_id: str, summary: Dict[str, Any], status: str = "completed"):
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, current = total, summary = ?, updated_at = ? WHERE job_id = ?",
+            (status, json.dumps(summary, default=str), time.time(), job_id)
+        )
+
+    def get_progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT status, current, total, updated_at FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return build_progress(job_id, row["status"], row["current"], row["total"], row["updated_at"])
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        if row["summary"]:
+            return json.loads(row["summary"])
+
+        results = self.get_results(job_id)
+        return {
+            **json.loads(row["metadata"] or "{}"),
+            "job_id": job_id,
+            "status": row["status"],
+            "total_files": row["total"],
+            "processed_files": row["current"],
+            "successful": row["successful"],
+            "failed": row["failed"],
+            "successful_files": [r for r in results if r.get("success")],
+            "failed_files": [r for r in results if not r.get("success")],
+            "updated_at": row["updated_at"]
+        }
+
+    def get_results(self, job_id: str) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT result FROM job_files WHERE job_id = ? ORDER BY seq", (job_id,)
+        ).fetchall()
+        return [json.loads(row["result"]) for row in rows]
+
+# ============================================================
+# REDIS
+# ============================================================
+
+class RedisJobStore(JobStore):
+    """
+    Redis backend
+
+    Keys per job:
+        job:<id>          hash  - status, counters, metadata, summary
+        job:<id>:files    list  - JSON file results in completion order
+        job:<id>:keys     set   - keys of the recorded results
+    """
+
+    # Count a result once per key, in one atomic step ({-1} = unknown job)
+    RECORD_SCRIPT = """
+        if redis.call('EXISTS', KEYS[1]) == 0 then
+            return {-1}
+        end
+        if ARGV[5] ~= '' and redis.call('SADD', KEYS[3], ARGV[5]) == 0 then
+            return {0, redis.call('HGET', KEYS[1], 'status'), redis.call('HGET', KEYS[1], 'current'),
+                    redis.call('HGET', KEYS[1], 'total')}
+        end
+        redis.call('RPUSH', KEYS[2], ARGV[1])
+        local current = redis.call('HINCRBY', KEYS[1], 'current', 1)
+        redis.call('HINCRBY', KEYS[1], ARGV[2], 1)
+        local status = redis.call('HGET', KEYS[1], 'status')
+        if status ~= 'completed' and status ~= 'error' then
+            status = 'processing'
+        end
+        redis.call('HSET', KEYS[1], 'status', status, 'updated_at', ARGV[3])
+        redis.call('EXPIRE', KEYS[2], ARGV[4])
+        redis.call('EXPIRE', KEYS[3], ARGV[4])
+        return {1, status, current, redis.call('HGET', KEYS[1], 'total')}
+    """
+
+    FINALIZE_SCRIPT = """
+        local status = redis.call('HGET', KEYS[1], 'status')
+        if not status or status == 'completed' or status == 'error' then
+            return 0
+        end
+        if tonumber(redis.call('HGET', KEYS[1], 'finalizing_at') or '0') >= tonumber(ARGV[2]) then
+            return 0
+        end
+        redis.call('HSET', KEYS[1], 'finalizing_at', ARGV[1])
+        return 1
+    """
+
+    def __init__(self, url: str, ttl_seconds: int = 7 * 24 * 3600):
+        if redis is None:
+            raise ImportError("redis package not installed (pip install redis)")
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.ttl = ttl_seconds
+        self._record = self.client.register_script(self.RECORD_SCRIPT)
+        self._begin_finalize = self.client.register_script(self.FINALIZE_SCRIPT)
+        logger.info(f"[JOB STORE] Redis job store ready ({url.split('@')[-1]})")
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"job:{job_id}"
+
+    def create_job(self, job_id: str, total: int, metadata: Optional[Dict[str, Any]] = None):
+        now = time.time()
+        key = self._key(job_id)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(key, f"{key}:files", f"{key}:keys")
+        pipe.hset(key, mapping={
+            "status": "starting", "current": 0, "total": total,
+            "successful": 0, "failed": 0,
+            "metadata": json.dumps(metadata or {}),
+            "created_at": now, "updated_at": now
+        })
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def update_progress(self, job_id: str, current: int, total: int, status: str = "processing"):
+        key = self._key(job_id)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(key, mapping={"current": current, "total": total, "status": status, "updated_at": time.time()})
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def record_result(self, job_id: str, result: Dict[str, Any], key: Optional[str] = None) -> Dict[str, Any]:
+        now = time.time()
+        job_key = self._key(job_id)
+
+        reply = self._record(
+            keys=[job_key, f"{job_key}:files", f"{job_key}:keys"],
+            args=[json.dumps(result, default=str), "successful" if result.get("success") else "failed",
+                  now, self.ttl, key or ""]
+        )
+        if reply[0] == -1:
+            raise KeyError(f"Unknown job {job_id}")
+        recorded, status, current, total = reply
+
+        progress = build_progress(job_id, status, int(current or 0), int(total or 0), now)
+        progress["recorded"] = bool(recorded)
+        return progress
+
+    def begin_finalize(self, job_id: str) -> bool:
+        now = time.time()
+        return bool(self._begin_finalize(keys=[self._key(job_id)], args=[now, now - FINALIZE_LEASE_SECONDS]))
+
+    def cancel_finalize(self, job_id: str):
+        self.client.hdel(self._key(job_id), "finalizing_at")
+
+    def complete_job(self, job_id: str, summary: Dict[str, Any], status: str = "completed"):
+        key = self._key(job_id)
+        total = self.client.hget(key, "total") or summary.get("total_files", 0)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(key, mapping={
+            "status": status, "current": total,
+            "summary": json.dumps(summary, default=str), "updated_at": time.time()
+        })
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def get_progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        status, current, total, updated_at = self.client.hmget(
+            self._key(job_id), "status", "current", "total", "updated_at"
+        )
+        if status is None:
+            return None
+        return build_progress(job_id, status, int(current or 0), int(total or 0), float(updated_at or 0))
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        data = self.client.hgetall(self._key(job_id))
+        if not data:
+            return None
+        if data.get("summary"):
+            return json.loads(data["summary"])
+
+        results = self.get_results(job_id)
+        return {
+            **json.loads(data.get("metadata") or "{}"),
+            "job_id": job_id,
+            "status": data["status"],
+            "total_files": int(data.get("total", 0)),
+            "processed_files": int(data.get("current", 0)),
+            "successful": int(data.get("successful", 0)),
+            "failed": int(data.get("failed", 0)),
+            "successful_files": [r for r in results if r.get("success")],
+            "failed_files": [r for r in results if not r.get("success")],
+            "updated_at": float(data.get("updated_at", 0))
+        }
+
+    def get_results(self, job_id: str) -> List[Dict[str, Any]]:
+        return [json.loads(item) for item in self.client.lrange(f"{self._key(job_id)}:files", 0, -1)]
+
+# ============================================================
+# FACTORY
+# ============================================================
+
+def create_job_store(url: Optional[str] = None) -> JobStore:
+    """Build the job store selected by url (or JOB_STORE_URL)"""
+    url = url or os.getenv("JOB_STORE_URL", DEFAULT_JOB_STORE_URL)
+
+    if url.startswith(("redis://", "rediss://")):
+        return RedisJobStore(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteJobStore(url[len("sqlite:///"):])
+
+    raise ValueError(f"Unsupported JOB_STORE_URL: {url}")
+
+# Global job store instance (created on first use)
+_job_store: Optional[JobStore] = None
+_store_lock = threading.Lock()
+
+def get_job_store() -> JobStore:
+    """Return the shared job store, creating it on first use"""
+    global _job_store
+
+    with _store_lock:
+        if _job_store is None:
+            _job_store = create_job_store()
+        return _job_store
@@ -0,0 +1,86 @@
+"""
+Segmentation Mask Cache
+Keep the model's alpha mask per input so re-renders skip segmentation
+
+Rerunning a job with another shadow intensity or pipeline only changes the
+compositing, not the mask. The mask produced for each input is stored as a
+single-channel PNG in a .masks/ folder next to the input
+(uploads/<job>/.masks/<key>.png), keyed by the input bytes and the model
+version; the next render loads it instead of running U2-Net.
+
+With the batched segmenter the stored mask is the low-resolution model
+output (320x320, a few KB), which does not depend on the pipeline's working
+size - it is upsampled to whatever size the render needs.
+
+Disable with MASK_CACHE=0.
+"""
+
+import os
+import io
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+MASK_DIR_NAME = ".masks"
+
+_stats = {"hits": 0, "misses": 0, "stores": 0}
+_stats_lock = threading.Lock()
+
+def mask_cache_enabled() -> bool:
+    return os.getenv("MASK_CACHE", "1") == "1"
+
+def mask_dir_for(input_path: Union[str, Path]) -> Path:
+    """Mask folder for an input: <input dir>/.masks"""
+    return Path(input_path).parent / MASK_DIR_NAME
+
+def mask_path_for(mask_dir: Union[str, Path], input_data: bytes, model_version: str) -> Path:
+    """Where the mask of an input is stored (keyed by input bytes + model version)"""
+    key = hashlib.sha256(hashlib.sha256(input_data).digest() + model_version.encode()).hexdigest()
+    return Path(mask_dir) / f"{key}.png"
+
+def load_mask(path: Union[str, Path]) -> Optional[np.ndarray]:
+    """Stored uint8 mask, or None if there is none (or it is unreadable)"""
+    try:
+        with Image.open(path) as mask:
+            data = np.asarray(mask.convert("L"))
+    except FileNotFoundError:
+        data = None
+    except Exception as e:
+        logger.warning(f"[MASK CACHE] Ignoring unreadable mask {path}: {e}")
+        data = None
+
+    with _stats_lock:
+        _stats["hits" if data is not None else "misses"] += 1
+    return data
+
+def save_mask(path: Union[str, Path], mask: np.ndarray):
+    """Store a uint8 mask as a compressed single-channel PNG (atomic)"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    buffer = io.BytesIO()
+    Image.fromarray(mask, mode="L").save(buffer, "PNG", optimize=True)
+
+    # Readers never see a partial file
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_bytes(buffer.getvalue())
+    os.replace(tmp_path, path)
+
+    with _stats_lock:
+        _stats["stores"] += 1
+
+def get_mask_cache_stats() -> dict:
+    with _stats_lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "lookups": lookups,
+            "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,180 @@
+"""
+Memory Budget
+Bounds the memory held by images being processed at the same time
+
+Each worker holds several full-resolution copies of its image (input bytes,
+decoded RGB, RGBA, mask, guided-filter planes, canvas), so the worker count
+alone does not bound RSS: 30 workers on 40 MP originals run out of memory
+while 30 workers on phone photos use a fraction of it. Before an image is
+decoded its peak footprint is estimated from the header dimensions (PIL reads
+only the header on open) and reserved from a process-wide budget; when the
+budget is exhausted the image waits until running images release theirs.
+
+Reservations are granted in arrival order, so a large image is not starved
+by a stream of small ones; an image estimated above the whole budget is
+clamped to it and runs alone.
+
+    PROCESSING_MEMORY_BUDGET_MB   budget (default: half of the memory
+                                  available to the process)
+    MEMORY_DECODE_BYTES_PER_PIXEL bytes per decoded pixel (default 8)
+    MEMORY_WORK_BYTES_PER_PIXEL   bytes per working-size pixel (default 32)
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Decoded RGB plus the EXIF-transposed / converted copy
+DECODE_BYTES_PER_PIXEL = float(os.getenv("MEMORY_DECODE_BYTES_PER_PIXEL", "8"))
+
+# RGBA, mask and its filtered copies, guided-filter float planes, output canvas
+WORK_BYTES_PER_PIXEL = float(os.getenv("MEMORY_WORK_BYTES_PER_PIXEL", "32"))
+
+# Used when the available memory cannot be determined
+DEFAULT_BUDGET_MB = 2048
+
+MB = 1024 * 1024
+
+def available_memory_bytes() -> Optional[int]:
+    """Memory available to the process: cgroup limit (containers) or physical RAM"""
+    for limit_file in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            value = Path(limit_file).read_text().strip()
+            if value.isdigit() and int(value) < (1 << 60):
+                return int(value)
+        except OSError:
+            continue
+
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def estimate_image_memory(image_path, working_size: Optional[tuple] = None) -> int:
+    """
+    Peak bytes needed to process an image, from its header (no decode)
+
+    working_size is the resolution processing is bounded to; JPEGs are
+    decoded at the DCT scale (1/2, 1/4, 1/8) that still covers it, like
+    decode_image() does.
+    """
+    path = Path(image_path)
+    file_bytes = path.stat().st_size
+
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+            is_jpeg = img.format == "JPEG"
+    except Exception:
+        # Unreadable header: processing fails early, count the bytes only
+        return 2 * file_bytes
+
+    decoded_w, decoded_h = width, height
+    if working_size and is_jpeg:
+        scale = 1
+        while scale < 8 and width // (scale * 2) >= working_size[0] and height // (scale * 2) >= working_size[1]:
+            scale *= 2
+        decoded_w, decoded_h = width // scale, height // scale
+
+    work_pixels = decoded_w * decoded_h
+    if working_size:
+        fit = min(1.0, working_size[0] / decoded_w, working_size[1] / decoded_h)
+        work_pixels = int(decoded_w * fit) * int(decoded_h * fit)
+
+    # The input file is read twice (result cache hash + decode)
+    return int(2 * file_bytes + decoded_w * decoded_h * DECODE_BYTES_PER_PIXEL + work_pixels * WORK_BYTES_PER_PIXEL)
+
+class MemoryBudget:
+    """Thread-safe, FIFO byte budget shared by the processing threads"""
+
+    def __init__(self, limit_bytes: int):
+        self.limit_bytes = max(1, int(limit_bytes))
+        self.in_use = 0
+        self._cond = threading.Condition()
+        self._waiting = deque()
+        self._stats = {"reservations": 0, "waited": 0, "wait_seconds": 0.0, "clamped": 0, "peak_bytes": 0}
+
+    def acquire(self, nbytes: int) -> int:
+        """Block until nbytes fit in the budget; returns the bytes reserved"""
+        nbytes = max(0, int(nbytes))
+        clamped = nbytes > self.limit_bytes
+        if clamped:
+            logger.warning(
+                f"[MEMORY] Image needs ~{nbytes // MB} MB, budget is {self.limit_bytes // MB} MB: running it alone"
+            )
+            nbytes = self.limit_bytes
+
+        with self._cond:
+            turn = object()
+            self._waiting.append(turn)
+            started = time.monotonic()
+            waited = False
+            while self._waiting[0] is not turn or self.in_use + nbytes > self.limit_bytes:
+                waited = True
+                self._cond.wait()
+
+            self._waiting.popleft()
+            self.in_use += nbytes
+            self._stats["reservations"] += 1
+            self._stats["clamped"] += int(clamped)
+            self._stats["peak_bytes"] = max(self._stats["peak_bytes"], self.in_use)
+            if waited:
+                self._stats["waited"] += 1
+                self._stats["wait_seconds"] += time.monotonic() - started
+            # The next in line may fit too
+            self._cond.notify_all()
+        return nbytes
+
+    def release(self, nbytes: int):
+        with self._cond:
+            self.in_use = max(0, self.in_use - nbytes)
+            self._cond.notify_all()
+
+    @contextmanager
+    def reserve(self, nbytes: int):
+        """with budget.reserve(estimate): process the image"""
+        reserved = self.acquire(nbytes)
+        try:
+            yield reserved
+        finally:
+            self.release(reserved)
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            return {
+                **self._stats,
+                "wait_seconds": round(self._stats["wait_seconds"], 2),
+                "limit_mb": self.limit_bytes // MB,
+                "in_use_mb": self.in_use // MB,
+                "peak_mb": self._stats["peak_bytes"] // MB,
+                "waiting": len(self._waiting)
+            }
+
+# Global budget (created on first use)
+_memory_budget: Optional[MemoryBudget] = None
+_budget_lock = threading.Lock()
+
+def get_memory_budget() -> MemoryBudget:
+    """Process-wide budget configured from the environment"""
+    global _memory_budget
+
+    with _budget_lock:
+        if _memory_budget is None:
+            budget_mb = os.getenv("PROCESSING_MEMORY_BUDGET_MB")
+            if budget_mb:
+                limit = int(float(budget_mb) * MB)
+            else:
+                available = available_memory_bytes()
+                limit = available // 2 if available else DEFAULT_BUDGET_MB * MB
+            _memory_budget = MemoryBudget(limit)
+            logger.info(f"[MEMORY] Processing memory budget: {limit // MB} MB")
+        return _memory_budget
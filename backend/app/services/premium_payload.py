@@ -0,0 +1,134 @@
+"""
+Premium Upload Payload
+Shrink images before they are base64-encoded into a Qwen request
+
+A 12 MB camera JPEG used to become ~16 MB of JSON per request. Before upload
+the image is now:
+
+- decoded at reduced scale (JPEG DCT scaling) and downsized to the
+  pipeline's output resolution (1000/1080/1600 px) - the API result is
+  never larger than that anyway
+- re-encoded (JPEG at PREMIUM_UPLOAD_QUALITY, PNG if it has transparency)
+- stripped of EXIF (orientation is applied first) and of the ICC profile
+  when it is sRGB or can be converted to sRGB
+
+The request body is then streamed: base64 is produced chunk by chunk while
+httpx sends it, instead of holding encoded/str/JSON copies of the image.
+"""
+
+import os
+import io
+import json
+import base64
+import logging
+from typing import AsyncIterator, Callable, Tuple, Union
+
+from PIL import Image, ImageOps
+
+try:
+    from PIL import ImageCms
+except ImportError:
+    ImageCms = None
+
+from ..processing.pipelines import PipelineFactory
+
+logger = logging.getLogger(__name__)
+
+PREMIUM_UPLOAD_QUALITY = int(os.getenv("PREMIUM_UPLOAD_QUALITY", "90"))
+
+# Raw bytes per base64 chunk (multiple of 3, so chunks concatenate cleanly)
+BASE64_CHUNK = 3 * 16 * 1024
+
+# Placeholder for the image inside the JSON body template
+IMAGE_PLACEHOLDER = "__MASTERPOST_IMAGE__"
+
+def _to_srgb(img: Image.Image) -> Tuple[Image.Image, bool]:
+    """Convert an embedded ICC profile to sRGB -> (image, profile can be dropped)"""
+    icc_profile = img.info.get("icc_profile")
+    if not icc_profile:
+        return img, True
+    if ImageCms is None:
+        return img, False
+
+    try:
+        profile = ImageCms.ImageCmsProfile(io.BytesIO(icc_profile))
+        if "srgb" in ImageCms.getProfileDescription(profile).lower():
+            return img, True
+        converted = ImageCms.profileToProfile(img, profile, ImageCms.createProfile("sRGB"), outputMode=img.mode)
+        return converted, True
+    except Exception as e:
+        logger.warning(f"[PREMIUM UPLOAD] Keeping ICC profile (conversion failed: {e})")
+        return img, False
+
+def prepare_upload_image(source: Union[str, bytes], pipeline: str = "amazon") -> Tuple[bytes, str]:
+    """
+    Downsize and re-encode an image for upload -> (encoded bytes, MIME type)
+
+    Args:
+        source: Image path or encoded bytes
+        pipeline: Pipeline whose output size bounds the upload
+    """
+    target_size = PipelineFactory.get_target_size(pipeline)
+    img = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+    original_size = img.size
+
+    img.draft("RGB", target_size)  # Only affects JPEG
+    icc_profile = img.info.get("icc_profile")
+    img = ImageOps.exif_transpose(img)
+
+    has_alpha = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+    img = img.convert("RGBA" if has_alpha else "RGB")
+    if icc_profile:
+        img.info["icc_profile"] = icc_profile
+        img, drop_icc = _to_srgb(img)
+    else:
+        drop_icc = True
+
+    img.thumbnail(target_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    save_kwargs = {} if drop_icc else {"icc_profile": icc_profile}
+    buffer = io.BytesIO()
+    if has_alpha:
+        img.save(buffer, "PNG", optimize=True, **save_kwargs)
+        mime_type = "image/png"
+    else:
+        img.save(buffer, "JPEG", quality=PREMIUM_UPLOAD_QUALITY, optimize=True, **save_kwargs)
+        mime_type = "image/jpeg"
+
+    data = buffer.getvalue()
+    logger.info(
+        f"[PREMIUM UPLOAD] {original_size} -> {img.size}, {len(data) / 1024:.0f} KB "
+        f"({mime_type}, ICC {'stripped' if drop_icc else 'kept'})"
+    )
+    return data, mime_type
+
+def encoded_length(size: int) -> int:
+    """Length of the base64 encoding of `size` bytes"""
+    return 4 * ((size + 2) // 3)
+
+def iter_base64(data: bytes, chunk_size: int = BASE64_CHUNK):
+    """Base64-encode in chunks (only one chunk is encoded at a time)"""
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield base64.b64encode(view[start:start + chunk_size])
+
+def build_image_request(payload: dict, image_data: bytes, mime_type: str) -> Tuple[int, Callable[[], AsyncIterator[bytes]]]:
+    """
+    Streamed JSON body for a payload whose image field is IMAGE_PLACEHOLDER
+
+    Returns (content length, body factory); each call of the factory gives a
+    fresh async iterator, so retries can resend the body.
+    """
+    template = json.dumps(payload)
+    prefix, suffix = template.split(IMAGE_PLACEHOLDER)
+    prefix = (prefix + f"data:{mime_type};base64,").encode()
+    suffix = suffix.encode()
+    content_length = len(prefix) + encoded_length(len(image_data)) + len(suffix)
+
+    async def body() -> AsyncIterator[bytes]:
+        yield prefix
+        for chunk in iter_base64(image_data):
+            yield chunk
+        yield suffix
+
+    return content_length, body
@@ -0,0 +1,471 @@
+"""
+Async Qwen Image Edit Client
+Pooled, rate-limited and retrying client for the DashScope REST API
+
+Replaces the blocking MultiModalConversation.call + requests.get per image:
+
+- one pooled httpx.AsyncClient (keep-alive to DashScope and the result CDN)
+- token bucket matched to the DashScope quota (QWEN_RATE_LIMIT req/s,
+  QWEN_BURST) plus a cap on in-flight calls (QWEN_MAX_CONCURRENCY)
+- retries with full-jitter exponential backoff on 429/5xx and transport
+  errors (Retry-After is honored), bounded by a per-request deadline
+- metrics: queue depth, in-flight calls, retries, latency histograms
+
+The client runs on its own event loop thread, so the batch worker threads
+(process_image_simple) can share it through remove_background_blocking().
+QWEN_BASE_URL points it at a local stub server (see benchmark_qwen_client.py).
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Coroutine, Dict, Optional, Tuple
+
+import httpx
+
+from .premium_payload import IMAGE_PLACEHOLDER, prepare_upload_image, build_image_request
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://dashscope-intl.aliyuncs.com/api/v1"
+GENERATION_PATH = "/services/aigc/multimodal-generation/generation"
+NEGATIVE_PROMPT = "shadows, reflections, background, blur, artifacts, low quality"
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Latency histogram buckets (seconds)
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+class ClientCall:
+    """
+    A coroutine started on the client loop from another thread
+
+    `future` is what the calling thread waits on. cancel() cancels the
+    coroutine's task on the client loop, which aborts a request in flight.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, task: asyncio.Task, future: Future):
+        self._loop = loop
+        self._task = task
+        self.future = future
+
+    def cancel(self):
+        self._loop.call_soon_threadsafe(self._task.cancel)
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens/s, up to `burst` saved (rate <= 0 = unlimited)"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waiting = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+
+        self.waiting += 1
+        try:
+            # The lock makes waiters take tokens in arrival order
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1.0:
+                        self.tokens -= 1.0
+                        return
+                    await asyncio.sleep((1.0 - self.tokens) / self.rate)
+        finally:
+            self.waiting -= 1
+
+class LatencyHistogram:
+    """Cumulative bucket counts plus percentiles over the most recent samples"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window: int = 1000):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._recent = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        index = next((i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self._recent.append(seconds)
+
+    def _percentile(self, ordered: list, pct: float) -> Optional[float]:
+        if not ordered:
+            return None
+        return round(ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))], 4)
+
+    def percentile(self, pct: float, min_samples: int = 1) -> Optional[float]:
+        """Percentile of the recent samples (None with fewer than min_samples)"""
+        if len(self._recent) < min_samples:
+            return None
+        return self._percentile(sorted(self._recent), pct)
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self._recent)
+        cumulative, buckets = 0, {}
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {
+            "count": self.count,
+            "sum": round(self.total, 4),
+            "p50": self._percentile(ordered, 50),
+            "p95": self._percentile(ordered, 95),
+            "p99": self._percentile(ordered, 99),
+            "buckets": buckets
+        }
+
+class QwenAPIError(Exception):
+    """Non-retryable API failure (or retries/deadline exhausted)"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class QwenAsyncClient:
+    """
+    Async DashScope client for qwen-image-edit
+
+    Args:
+        api_key: DashScope API key
+        base_url: API base URL (QWEN_BASE_URL)
+        model: Model name
+        rate_limit: Requests per second allowed by the quota (0 = unlimited)
+        burst: Token bucket size
+        max_concurrency: Max API calls in flight
+        max_retries: Retries per request on 429/5xx/transport errors
+        deadline: Seconds a request may take in total, retries included
+        timeout: Seconds per HTTP attempt
+    """
+
+    def __init__(self, api_key: str, base_url: str = DEFAULT_BASE_URL, model: str = "qwen-image-edit",
+                 rate_limit: float = 2.0, burst: float = 2.0, max_concurrency: int = 4,
+                 max_retries: int = 3, deadline: float = 120.0, timeout: float = 60.0,
+                 backoff_base: float = 0.5, backoff_max: float = 10.0):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.deadline = deadline
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        # Created on the client's own loop (see start())
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._http: Optional[httpx.AsyncClient] = None
+        self._bucket: Optional[TokenBucket] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._start_lock = threading.Lock()
+
+        self._queued = 0
+        self._in_flight = 0
+        self._stats = {"requests": 0, "succeeded": 0, "failed": 0, "retries": 0, "deadline_exceeded": 0,
+                       "cancelled": 0, "upload_bytes": 0}
+        self._status_counts: Dict[str, int] = {}
+        self._latency = {
+            "api_call": LatencyHistogram(),
+            "download": LatencyHistogram(),
+            "total": LatencyHistogram()
+        }
+
+    # ------------------------------------------------------------
+    # Event loop thread
+    # ------------------------------------------------------------
+
+    def start(self):
+        """Start the client's event loop thread (idempotent)"""
+        with self._start_lock:
+            if self._loop is not None:
+                return
+
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                self._http = httpx.AsyncClient(
+                    timeout=self.timeout,
+                    limits=httpx.Limits(
+                        max_connections=self.max_concurrency * 2,
+                        max_keepalive_connections=self.max_concurrency * 2
+                    )
+                )
+                self._bucket = TokenBucket(self.rate_limit, self.burst)
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                ready.set()
+                loop.run_forever()
+
+            threading.Thread(target=run, name="qwen-client", daemon=True).start()
+            ready.wait()
+            self._loop = loop
+
+            logger.info(
+                f"[QWEN CLIENT] Ready: {self.base_url} "
+                f"(rate {self.rate_limit}/s, burst {self.burst}, concurrency {self.max_concurrency}, "
+                f"retries {self.max_retries}, deadline {self.deadline}s)"
+            )
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Run a coroutine on the client loop from any thread"""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def spawn(self, coro: Coroutine) -> ClientCall:
+        """Start a coroutine on the client loop without waiting for it (cancellable, see ClientCall)"""
+        self.start()
+        task = self.submit(self._create_task(coro)).result()
+        return ClientCall(self._loop, task, self.submit(self._wait_task(task)))
+
+    @staticmethod
+    async def _create_task(coro: Coroutine) -> asyncio.Task:
+        return asyncio.get_running_loop().create_task(coro)
+
+    @staticmethod
+    async def _wait_task(task: asyncio.Task):
+        return await task
+
+    def remove_background_blocking(self, input_path: str, output_path: str, prompt: str,
+                                   pipeline: str = "amazon") -> Dict[str, Any]:
+        """Blocking remove_background for worker threads"""
+        return self.submit(self.remove_background(input_path, output_path, prompt, pipeline)).result()
+
+    # ------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------
+
+    async def remove_background(self, input_path: str, output_path: str, prompt: str,
+                                pipeline: str = "amazon", deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Edit an image with qwen-image-edit and save the result
+
+        The image is downsized to the pipeline's output size before upload
+        and the request body is streamed (see premium_payload.py). Returns
+        the same dict shape as QwenImageEditService.remove_background.
+        Must run on the client loop (use submit() from other loops/threads).
+        """
+        started = time.monotonic()
+        deadline_at = started + (deadline or self.deadline)
+        self._stats["requests"] += 1
+        cancelled = False
+
+        try:
+            image_data, mime_type = await asyncio.to_thread(prepare_upload_image, input_path, pipeline)
+            self._stats["upload_bytes"] += len(image_data)
+            payload = {
+                "model": self.model,
+                "input": {"messages": [{"role": "user", "content": [{"image": IMAGE_PLACEHOLDER}, {"text": prompt}]}]},
+                "parameters": {"negative_prompt": NEGATIVE_PROMPT, "watermark": False}
+            }
+
+            body = await self._call(build_image_request(payload, image_data, mime_type), deadline_at)
+            try:
+                image_url = body["output"]["choices"][0]["message"]["content"][0]["image"]
+            except (KeyError, IndexError, TypeError) as e:
+                raise QwenAPIError(f"Failed to extract image URL: {e}")
+
+            download_started = time.monotonic()
+            response = await self._request("GET", image_url, deadline_at)
+            self._latency["download"].observe(time.monotonic() - download_started)
+            if response.status_code != 200:
+                raise QwenAPIError(f"Failed to download image: HTTP {response.status_code}", response.status_code)
+
+            await asyncio.to_thread(Path(output_path).write_bytes, response.content)
+
+            self._stats["succeeded"] += 1
+            return {
+                "success": True,
+                "output_path": output_path,
+                "file_size": len(response.content),
+                "image_url": image_url,
+                "request_id": body.get("request_id"),
+                "method": "qwen_premium"
+            }
+
+        except (QwenAPIError, asyncio.TimeoutError, httpx.HTTPError, OSError) as e:
+            self._stats["failed"] += 1
+            error = str(e) or type(e).__name__
+            logger.error(f"[QWEN CLIENT] {Path(input_path).name} failed: {error}")
+            return {"success": False, "error": error, "fallback_to_basic": True}
+
+        except asyncio.CancelledError:
+            # Hedged request lost the race; a truncated latency would skew the percentiles
+            cancelled = True
+            self._stats["cancelled"] += 1
+            raise
+
+        finally:
+            if not cancelled:
+                self._latency["total"].observe(time.monotonic() - started)
+
+    def latency_percentile(self, pct: float, min_samples: int = 20) -> Optional[float]:
+        """End-to-end latency percentile of recent requests (None until enough samples)"""
+        return self._latency["total"].percentile(pct, min_samples)
+
+    async def _call(self, request: Tuple[int, Any], deadline_at: float) -> dict:
+        """POST the generation request (rate limited, concurrency bounded, retried)"""
+        for attempt in range(self.max_retries + 1):
+            response, error = await self._attempt(request, deadline_at)
+            status_code = response.status_code if response is not None else None
+
+            key = str(status_code) if status_code else "transport_error"
+            self._status_counts[key] = self._status_counts.get(key, 0) + 1
+
+            if status_code == 200:
+                try:
+                    return response.json()
+                except ValueError as e:
+                    # 200 with an HTML/truncated body (gateway pages): a failed call, not a crash
+                    raise QwenAPIError(f"Invalid JSON response: {e}", status_code)
+
+            if status_code is not None and status_code not in RETRY_STATUSES:
+                raise QwenAPIError(error, status_code)
+            if attempt == self.max_retries:
+                raise QwenAPIError(f"{error} (after {attempt + 1} attempts)", status_code)
+
+            retry_after = response.headers.get("retry-after") if response is not None else None
+            delay = self._backoff(attempt, retry_after)
+            if time.monotonic() + delay >= deadline_at:
+                self._stats["deadline_exceeded"] += 1
+                raise QwenAPIError(f"{error} (deadline exceeded before retry)", status_code)
+
+            self._stats["retries"] += 1
+            logger.warning(f"[QWEN CLIENT] {error} - retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def _attempt(self, request: Tuple[int, Any], deadline_at: float) -> Tuple[Optional[httpx.Response], str]:
+        """One API call once a concurrency slot and a rate limit token are free"""
+        content_length, body = request
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Content-Length": str(content_length)
+        }
+
+        self._queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self._remaining(deadline_at))
+        finally:
+            self._queued -= 1
+
+        try:
+            self._queued += 1
+            try:
+                await asyncio.wait_for(self._bucket.acquire(), timeout=self._remaining(deadline_at))
+            finally:
+                self._queued -= 1
+
+            self._in_flight += 1
+            started = time.monotonic()
+            try:
+                response = await self._request(
+                    "POST", self.base_url + GENERATION_PATH, deadline_at, content=body(), headers=headers
+                )
+                return response, self._error_message(response)
+            except httpx.TransportError as e:
+                return None, f"Transport error: {type(e).__name__} {e}"
+            finally:
+                self._in_flight -= 1
+                self._latency["api_call"].observe(time.monotonic() - started)
+        finally:
+            self._semaphore.release()
+
+    async def _request(self, method: str, url: str, deadline_at: float, **kwargs) -> httpx.Response:
+        """One HTTP attempt, with its timeout capped by the request deadline"""
+        remaining = self._remaining(deadline_at)
+        return await self._http.request(method, url, timeout=min(self.timeout, remaining), **kwargs)
+
+    def _remaining(self, deadline_at: float) -> float:
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            self._stats["deadline_exceeded"] += 1
+            raise QwenAPIError("Request deadline exceeded")
+        return remaining
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        """Full-jitter exponential backoff, never shorter than Retry-After"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+
+    @staticmethod
+    def _error_message(response: httpx.Response) -> str:
+        if response.status_code == 200:
+            return ""
+        try:
+            body = response.json()
+            return f"API Error {response.status_code}: {body.get('code')} {body.get('message')}"
+        except Exception:
+            return f"API Error {response.status_code}"
+
+    # ------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------
+
+    def get_stats(self) -> dict:
+        waiting_tokens = self._bucket.waiting if self._bucket else 0
+        return {
+            **self._stats,
+            "queue_depth": self._queued,
+            "waiting_for_rate_limit": waiting_tokens,
+            "in_flight": self._in_flight,
+            "status_codes": dict(self._status_counts),
+            "config": {
+                "base_url": self.base_url,
+                "rate_limit": self.rate_limit,
+                "burst": self.burst,
+                "max_concurrency": self.max_concurrency,
+                "max_retries": self.max_retries,
+                "deadline": self.deadline
+            },
+            "latency": {name: histogram.snapshot() for name, histogram in self._latency.items()}
+        }
+
+# Global client instance (created on first use)
+_qwen_client: Optional[QwenAsyncClient] = None
+_client_lock = threading.Lock()
+
+def get_qwen_client() -> QwenAsyncClient:
+    """Shared async client configured from the environment"""
+    global _qwen_client
+
+    with _client_lock:
+        if _qwen_client is None:
+            _qwen_client = QwenAsyncClient(
+                api_key=os.getenv("DASHSCOPE_API_KEY", ""),
+                base_url=os.getenv("QWEN_BASE_URL", DEFAULT_BASE_URL),
+                rate_limit=float(os.getenv("QWEN_RATE_LIMIT", "2")),
+                burst=float(os.getenv("QWEN_BURST", "2")),
+                max_concurrency=int(os.getenv("QWEN_MAX_CONCURRENCY", "4")),
+                max_retries=int(os.getenv("QWEN_MAX_RETRIES", "3")),
+                deadline=float(os.getenv("QWEN_DEADLINE_S", "120")),
+                timeout=float(os.getenv("QWEN_TIMEOUT_S", "60"))
+            )
+        return _qwen_client
+
+def get_qwen_client_stats() -> Optional[dict]:
+    """Client metrics, or None if the client was never used"""
+    return _qwen_client.get_stats() if _qwen_client is not None else None
@@ -0,0 +1,193 @@
+"""
+Process-Pool rembg Engine
+Runs Basic background removal in worker processes instead of threads
+
+Each worker process loads its own U2-Net ONNX session once (at pool start)
+and pins ONNX Runtime's intra-op threads so that
+workers x threads_per_worker ~= CPU cores. This avoids GIL contention on
+the PIL side and ONNX thread oversubscription from 30 threads sharing a
+single session.
+
+Enable with REMBG_ENGINE=process. Optional tuning:
+    REMBG_POOL_WORKERS         - number of worker processes
+    REMBG_THREADS_PER_WORKER   - ONNX intra-op threads per worker
+"""
+
+import os
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def calculate_pool_layout(cpu_count: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Decide (workers, threads_per_worker) so that their product ~= CPU cores
+
+    Defaults to 2 ONNX threads per worker (1 on small machines), which keeps
+    per-image latency reasonable while giving near-linear throughput scaling.
+    """
+    cpu_count = cpu_count or multiprocessing.cpu_count() or 4
+
+    threads = int(os.getenv("REMBG_THREADS_PER_WORKER", "0")) or (2 if cpu_count >= 4 else 1)
+    threads = max(1, min(threads, cpu_count))
+
+    workers = int(os.getenv("REMBG_POOL_WORKERS", "0")) or max(1, cpu_count // threads)
+
+    return workers, threads
+
+# ============================================================
+# WORKER PROCESS SIDE
+# ============================================================
+
+def _init_worker(intra_op_threads: int):
+    """Pool initializer: load one U2-Net session per worker process"""
+    # rembg's new_session() builds its ort.SessionOptions from OMP_NUM_THREADS
+    os.environ["OMP_NUM_THREADS"] = str(intra_op_threads)
+    # Inside the worker the model runs in-process (avoid recursive pools)
+    os.environ["REMBG_ENGINE"] = "thread"
+
+    from . import simple_processing
+
+    logger.info(
+        f"[REMBG POOL] Worker {os.getpid()} ready "
+        f"(session loaded: {simple_processing.REMBG_SESSION is not None}, "
+        f"intra_op_threads: {intra_op_threads})"
+    )
+
+def _process_path(input_path: str, output_path: str, shadow_params: dict, pipeline: str) -> Tuple[bool, str, dict]:
+    """Worker task: process an image from disk -> (success, output_path, info)"""
+    from .simple_processing import remove_background_simple
+    info = {}
+    success, actual_output_path = remove_background_simple(input_path, output_path, shadow_params, pipeline, info)
+    return success, actual_output_path, info
+
+def _process_multi_path(input_path: str, outputs: Dict[str, str], shadow_params: dict) -> Tuple[Dict[str, Tuple[bool, str]], dict]:
+    """Worker task: segment an image once and render it for several pipelines -> (results, info)"""
+    from .simple_processing import remove_background_multi
+    info = {}
+    return remove_background_multi(input_path, outputs, shadow_params, info), info
+
+def _process_shared_buffer(shm_name: str, size: int, output_path: str, shadow_params: dict, pipeline: str,
+                           mask_dir: Optional[str]) -> Tuple[bool, str, dict]:
+    """Worker task: process encoded image bytes placed in shared memory by the parent"""
+    from .simple_processing import remove_background_bytes
+
+    # The parent owns the segment (and unlinks it); workers only attach
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        input_data = bytes(shm.buf[:size])
+    finally:
+        shm.close()
+
+    info = {}
+    success, actual_output_path = remove_background_bytes(input_data, output_path, shadow_params, pipeline, mask_dir, info)
+    return success, actual_output_path, info
+
+def _ping() -> int:
+    return os.getpid()
+
+# ============================================================
+# PARENT PROCESS SIDE
+# ============================================================
+
+class RembgProcessPool:
+    """Process pool running remove_background_simple with per-worker sessions"""
+
+    def __init__(self, workers: Optional[int] = None, threads_per_worker: Optional[int] = None):
+        default_workers, default_threads = calculate_pool_layout()
+        self.workers = workers or default_workers
+        self.threads_per_worker = threads_per_worker or default_threads
+
+        # "spawn" so every worker builds a fresh ONNX session instead of
+        # inheriting a forked copy of the parent's runtime state
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.threads_per_worker,)
+        )
+
+        logger.info(
+            f"[REMBG POOL] Started {self.workers} workers x "
+            f"{self.threads_per_worker} ONNX threads"
+        )
+
+    def warmup(self):
+        """Start all workers and load their models before the first batch"""
+        futures = [self.executor.submit(_ping) for _ in range(self.workers)]
+        pids = {future.result() for future in futures}
+        logger.info(f"[REMBG POOL] Warm-up complete ({len(pids)} worker processes)")
+
+    def remove_background(self, input_path: str, output_path: str, shadow_params: dict = None, pipeline: str = "amazon",
+                          info: dict = None) -> Tuple[bool, str]:
+        """
+        Process an image by path (blocking; safe to call from batch threads)
+
+        info, if given, receives the worker's run details (see remove_background_simple)
+        """
+        future = self.executor.submit(_process_path, input_path, output_path, shadow_params, pipeline)
+        success, actual_output_path, worker_info = future.result()
+        if info is not None:
+            info.update(worker_info)
+        return success, actual_output_path
+
+    def remove_background_buffer(self, input_data: bytes, output_path: str, shadow_params: dict = None, pipeline: str = "amazon",
+                                 info: dict = None, mask_dir: Optional[str] = None) -> Tuple[bool, str]:
+        """
+        Process encoded image bytes the caller already read, via shared memory
+
+        The payload is not pickled through the pool's pipe, and the worker
+        decodes it without reading the file again. mask_dir: mask cache
+        folder of the input (see mask_cache.py), if any.
+        """
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(input_data)))
+        try:
+            shm.buf[:len(input_data)] = input_data
+            future = self.executor.submit(
+                _process_shared_buffer, shm.name, len(input_data), output_path, shadow_params, pipeline,
+                str(mask_dir) if mask_dir else None
+            )
+            success, actual_output_path, worker_info = future.result()
+            if info is not None:
+                info.update(worker_info)
+            return success, actual_output_path
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def remove_background_multi(self, input_path: str, outputs: Dict[str, str], shadow_params: dict = None,
+                                info: dict = None) -> Dict[str, Tuple[bool, str]]:
+        """Process an image for several pipelines with one segmentation (see remove_background_multi)"""
+        future = self.executor.submit(_process_multi_path, input_path, outputs, shadow_params)
+        results, worker_info = future.result()
+        if info is not None:
+            info.update(worker_info)
+        return results
+
+    def get_stats(self) -> dict:
+        return {
+            "engine": "process",
+            "workers": self.workers,
+            "threads_per_worker": self.threads_per_worker
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        logger.info("[REMBG POOL] Shut down")
+
+# Global pool instance (created on first use)
+_rembg_pool: Optional[RembgProcessPool] = None
+_pool_lock = threading.Lock()
+
+def get_rembg_pool() -> RembgProcessPool:
+    """Return the shared process pool, starting it on first use"""
+    global _rembg_pool
+
+    with _pool_lock:
+        if _rembg_pool is None:
+            _rembg_pool = RembgProcessPool()
+        return _rembg_pool
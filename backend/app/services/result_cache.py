@@ -0,0 +1,210 @@
+"""
+Content-Addressed Result Cache
+Reuse processed outputs for images that were already processed with the
+same settings
+
+Key = SHA-256 over (SHA-256 of the input bytes, pipeline, tier, normalized
+shadow params, model version). A hit returns the stored output bytes, so
+segmentation (or the Premium API call) is skipped entirely.
+
+Tiers:
+    memory - optional LRU of hot results (RESULT_CACHE_MEMORY_MB, 0 = off)
+    disk   - <RESULT_CACHE_DIR>/<key[:2]>/<key>.bin, LRU by mtime, bounded
+             by RESULT_CACHE_MAX_MB
+
+Disable with RESULT_CACHE=0.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Fraction of max size kept after an eviction pass (avoids evicting on every put)
+EVICT_TO_RATIO = 0.9
+
+def normalize_shadow_params(shadow_params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Canonical shadow params: disabled shadows collapse to one value, floats are rounded"""
+    if not shadow_params or not shadow_params.get("enabled", False):
+        return {"enabled": False}
+
+    normalized = {}
+    for name, value in sorted(shadow_params.items()):
+        if isinstance(value, float):
+            value = round(value, 3)
+        normalized[name] = value
+    return normalized
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def build_cache_key(input_hash: str, pipeline: str, tier: str, shadow_params: Optional[Dict[str, Any]], model_version: str) -> str:
+    """Cache key for one (input, settings) combination"""
+    material = json.dumps({
+        "input": input_hash,
+        "pipeline": pipeline,
+        "tier": tier,
+        "shadow": normalize_shadow_params(shadow_params),
+        "model": model_version
+    }, sort_keys=True)
+    return hashlib.sha256(material.encode()).hexdigest()
+
+class ResultCache:
+    """Two-tier (memory + disk) LRU cache of processed image bytes"""
+
+    def __init__(self, cache_dir: str, max_bytes: int, memory_max_bytes: int = 0):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.memory_max_bytes = memory_max_bytes
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = sum(f.stat().st_size for f in self.cache_dir.glob("*/*.bin"))
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        logger.info(
+            f"[RESULT CACHE] Ready at {self.cache_dir} "
+            f"({self._disk_bytes / 1024 / 1024:.1f}/{max_bytes / 1024 / 1024:.0f} MB on disk, "
+            f"memory tier {memory_max_bytes / 1024 / 1024:.0f} MB)"
+        )
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.bin"
+
+    # ------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return data
+
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # LRU: mtime = last use
+        except FileNotFoundError:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+
+        with self._lock:
+            self._stats["disk_hits"] += 1
+            self._remember(key, data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+
+        # Atomic write: readers never see a partial file
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._stats["stores"] += 1
+            self._disk_bytes += len(data)
+            self._remember(key, data)
+            needs_eviction = self._disk_bytes > self.max_bytes
+
+        if needs_eviction:
+            self._evict()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            lookups = hits + self._stats["misses"]
+            return {
+                **self._stats,
+                "hits": hits,
+                "lookups": lookups,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "disk_mb": round(self._disk_bytes / 1024 / 1024, 2),
+                "disk_max_mb": round(self.max_bytes / 1024 / 1024, 2),
+                "memory_mb": round(self._memory_bytes / 1024 / 1024, 2),
+                "memory_items": len(self._memory)
+            }
+
+    # ------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------
+
+    def _remember(self, key: str, data: bytes):
+        """Add to the memory tier (caller holds the lock)"""
+        if not self.memory_max_bytes or len(data) > self.memory_max_bytes:
+            return
+
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _evict(self):
+        """Delete least recently used files until the disk tier is under budget"""
+        files = []
+        for path in self.cache_dir.glob("*/*.bin"):
+            try:
+                stat = path.stat()
+                files.append((stat.st_mtime, stat.st_size, path))
+            except FileNotFoundError:
+                continue
+
+        # Re-sync with the real size (other processes may share the directory)
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * EVICT_TO_RATIO
+        evicted = 0
+
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            try:
+                path.unlink()
+                total -= size
+                evicted += 1
+            except FileNotFoundError:
+                continue
+
+        with self._lock:
+            self._disk_bytes = total
+            self._stats["evictions"] += evicted
+
+        logger.info(f"[RESULT CACHE] Evicted {evicted} entries ({total / 1024 / 1024:.1f} MB left)")
+
+# Global cache instance (created on first use)
+_result_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Return the shared result cache, or None when RESULT_CACHE=0"""
+    global _result_cache
+
+    if os.getenv("RESULT_CACHE", "1") != "1":
+        return None
+
+    with _cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache(
+                cache_dir=os.getenv("RESULT_CACHE_DIR", "cache/results"),
+                max_bytes=int(float(os.getenv("RESULT_CACHE_MAX_MB", "2048")) * 1024 * 1024),
+                memory_max_bytes=int(float(os.getenv("RESULT_CACHE_MEMORY_MB", "0")) * 1024 * 1024)
+            )
+        return _result_cache
@@ -0,0 +1,236 @@
+"""
+Batched U2-Net Segmentation
+Runs the rembg U2-Net ONNX model on micro-batches of images
+
+Instead of one rembg.remove() call (and one batch-of-1 ONNX run) per image,
+callers submit images to a BatchedSegmenter. A background thread collects
+requests until it has `max_batch_size` images or `max_wait_ms` has passed,
+runs a single ONNX inference with batch dimension N and scatters the masks
+back to each caller.
+
+Preprocessing (resize to 320x320 + normalization) happens in the caller's
+thread, so only the ONNX run itself is serialized. With max_batch_size=1
+there is no batching thread: inference runs directly in the caller's thread.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional
+
+import numpy as np
+from PIL import Image
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+logger = logging.getLogger(__name__)
+
+# U2-Net input resolution and ImageNet normalization (same as rembg's U2netSession)
+MODEL_INPUT_SIZE = (320, 320)
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+def preprocess_image(img: Image.Image) -> np.ndarray:
+    """Resize to the model input and normalize -> float32 array (3, 320, 320)"""
+    small = img.convert("RGB").resize(MODEL_INPUT_SIZE, Image.Resampling.LANCZOS)
+    arr = np.asarray(small, dtype=np.float32)
+    arr = arr / max(float(arr.max()), 1e-6)
+    arr = (arr - MEAN) / STD
+    return arr.transpose(2, 0, 1)
+
+def postprocess_prediction(pred: np.ndarray) -> np.ndarray:
+    """Normalize a raw (320, 320) prediction to a uint8 low-resolution mask"""
+    ma = float(pred.max())
+    mi = float(pred.min())
+    pred = (pred - mi) / max(ma - mi, 1e-6)
+    return (pred * 255).clip(0, 255).astype(np.uint8)
+
+def mask_to_image(lowres_mask: np.ndarray, size: tuple, guide: Optional[Image.Image] = None) -> Image.Image:
+    """
+    Upsample a low-resolution mask to the image size ('L' mode)
+
+    If a guide image is given, the mask is upsampled edge-aware with a fast
+    guided filter so its boundary snaps to the product edges in the guide.
+    """
+    if guide is not None and cv2 is not None:
+        return guided_upsample(lowres_mask, guide)
+    return Image.fromarray(lowres_mask, mode="L").resize(size, Image.Resampling.LANCZOS)
+
+def guided_upsample(lowres_mask: np.ndarray, guide: Image.Image, subsample: int = 4, eps: float = 1e-3) -> Image.Image:
+    """
+    Edge-aware mask upsampling (fast guided filter, He & Sun 2015)
+
+    The linear coefficients (a, b) are fitted at 1/subsample of the guide
+    resolution and only the final q = a * I + b runs at full resolution, so
+    cost stays close to a plain resize.
+    """
+    width, height = guide.size
+    low_w, low_h = max(1, width // subsample), max(1, height // subsample)
+
+    # Guide (luminance) and mask at the fitting resolution
+    guide_l = guide.convert("L")
+    I_low = np.asarray(guide_l.resize((low_w, low_h), Image.Resampling.BILINEAR), dtype=np.float32) / 255.0
+    p_low = np.asarray(
+        Image.fromarray(lowres_mask, mode="L").resize((low_w, low_h), Image.Resampling.BILINEAR),
+        dtype=np.float32
+    ) / 255.0
+
+    # Window ~ one model pixel at the fitting resolution
+    radius = max(1, round(max(low_w, low_h) / MODEL_INPUT_SIZE[0]))
+    window = (2 * radius + 1, 2 * radius + 1)
+
+    def box(x):
+        return cv2.boxFilter(x, -1, window)
+
+    mean_I = box(I_low)
+    mean_p = box(p_low)
+    cov_Ip = box(I_low * p_low) - mean_I * mean_p
+    var_I = box(I_low * I_low) - mean_I * mean_I
+
+    a = cov_Ip / (var_I + eps)
+    b = mean_p - a * mean_I
+    mean_a = cv2.resize(box(a), (width, height), interpolation=cv2.INTER_LINEAR)
+    mean_b = cv2.resize(box(b), (width, height), interpolation=cv2.INTER_LINEAR)
+
+    I = np.asarray(guide_l, dtype=np.float32) / 255.0
+    q = mean_a * I + mean_b
+    return Image.fromarray((q.clip(0.0, 1.0) * 255).astype(np.uint8), mode="L")
+
+class BatchedSegmenter:
+    """
+    Micro-batching front-end for a rembg session
+
+    Args:
+        session: rembg session (new_session("u2net")); its ONNX Runtime
+            session is used directly
+        max_batch_size: Max images per ONNX run
+        max_wait_ms: Max time the first queued image waits for a batch to fill
+    """
+
+    def __init__(self, session, max_batch_size: int = 8, max_wait_ms: float = 20.0):
+        self.inner_session = session.inner_session
+        self.input_name = self.inner_session.get_inputs()[0].name
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        # Some exported models pin the batch dimension to 1; for those we
+        # still batch the queueing but run inference image by image
+        batch_dim = self.inner_session.get_inputs()[0].shape[0]
+        self.dynamic_batch = not isinstance(batch_dim, int) or batch_dim != 1
+        if not self.dynamic_batch:
+            logger.warning("[SEGMENTATION] Model has fixed batch size 1 - running inference per image")
+
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._stats = {"batches": 0, "images": 0}
+        self._worker = None
+        if self.max_batch_size > 1:
+            self._worker = threading.Thread(target=self._run, name="segmentation-batcher", daemon=True)
+            self._worker.start()
+
+        logger.info(
+            f"[SEGMENTATION] Batched segmenter ready "
+            f"(max_batch_size={self.max_batch_size}, max_wait_ms={max_wait_ms})"
+        )
+
+    # ------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------
+
+    def submit(self, img: Image.Image) -> Future:
+        """Queue an image; the future resolves to its low-resolution uint8 mask"""
+        future = Future()
+        tensor = preprocess_image(img)
+
+        if self._worker is None:
+            # Unbatched: run inference right here
+            try:
+                future.set_result(self.predict([tensor])[0])
+                self._stats["batches"] += 1
+                self._stats["images"] += 1
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        self._queue.put((tensor, future))
+        return future
+
+    def segment(self, img: Image.Image, edge_aware: bool = False) -> Image.Image:
+        """Blocking helper: return the full-size 'L' mask for img"""
+        lowres = self.submit(img).result()
+        return mask_to_image(lowres, img.size, guide=img if edge_aware else None)
+
+    def predict(self, tensors: List[np.ndarray]) -> List[np.ndarray]:
+        """Run the model on preprocessed tensors, returning low-resolution masks"""
+        if self.dynamic_batch:
+            batch = np.stack(tensors).astype(np.float32)
+            outputs = self.inner_session.run(None, {self.input_name: batch})
+            preds = outputs[0][:, 0, :, :]
+        else:
+            preds = [
+                self.inner_session.run(None, {self.input_name: tensor[np.newaxis].astype(np.float32)})[0][0, 0]
+                for tensor in tensors
+            ]
+        return [postprocess_prediction(pred) for pred in preds]
+
+    def get_stats(self) -> dict:
+        batches = self._stats["batches"]
+        return {
+            "batches": batches,
+            "images": self._stats["images"],
+            "avg_batch_size": round(self._stats["images"] / batches, 2) if batches else 0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000
+        }
+
+    # ------------------------------------------------------------
+    # Batching loop
+    # ------------------------------------------------------------
+
+    def _collect_batch(self) -> list:
+        """Block for the first request, then fill the batch until size or deadline"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            tensors = [tensor for tensor, _ in batch]
+            futures = [future for _, future in batch]
+
+            try:
+                masks = self.predict(tensors)
+                self._stats["batches"] += 1
+                self._stats["images"] += len(batch)
+                for future, mask in zip(futures, masks):
+                    future.set_result(mask)
+            except Exception as e:
+                logger.error(f"[SEGMENTATION] Batch of {len(batch)} failed: {e}")
+                for future in futures:
+                    future.set_exception(e)
+
+def create_segmenter(session, max_batch_size: int, max_wait_ms: float) -> Optional[BatchedSegmenter]:
+    """Build a BatchedSegmenter, or None if no session is available"""
+    if session is None:
+        return None
+
+    try:
+        return BatchedSegmenter(session, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    except Exception as e:
+        logger.error(f"[SEGMENTATION] Batched segmenter unavailable, using rembg.remove: {e}")
+        return None
@@ -5,18 +5,33 @@ OPTIMIZED: Pre-loads rembg model for 2-3x faster processing
 """
 
 from rembg import remove, new_session
-from PIL import Image, ImageFilter
+from PIL import Image, ImageFilter, ImageOps
 import io
 import logging
+import numpy as np
 import os
+import time
+import uuid
+import shutil
+import tempfile
+import threading
+from concurrent.futures import wait
 from pathlib import Path
+from typing import Dict
 
 # Import shadow effects module (working version with class-based approach)
 from ..processing.shadow_effects import apply_professional_shadow, ShadowEffects
+from ..processing.compositor import composite_on_white
+from ..processing.edge_refine import refine_halo, HALO_REFINEMENT
+from ..processing.white_background import white_background_mask, WHITE_FASTPATH
+from ..processing.pipelines import PipelineFactory
+from .segmentation import create_segmenter, mask_to_image
+from .mask_cache import mask_cache_enabled, mask_dir_for, mask_path_for, load_mask, save_mask
+from .result_cache import get_result_cache, hash_bytes, build_cache_key
 
 # Import Qwen premium service
 try:
-    from .qwen_service import remove_background_premium_sync, qwen_service
+    from .qwen_service import remove_background_premium_sync, qwen_service, submit_premium, premium_latency_percentile
     QWEN_AVAILABLE = True
 except ImportError:
     QWEN_AVAILABLE = False
@@ -24,15 +39,157 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Execution engine for Basic processing:
+#   "thread"  - rembg runs in this process with the shared REMBG_SESSION (default)
+#   "process" - rembg runs in a process pool, one session per worker (see rembg_pool.py)
+REMBG_ENGINE = os.getenv("REMBG_ENGINE", "thread").lower()
+
 # OPTIMIZATION: Pre-load rembg model ONCE at module import
 # This saves ~2-3 seconds per image by reusing the same model session
-try:
-    logger.info("[OPTIMIZATION] Pre-loading rembg U2-Net model...")
-    REMBG_SESSION = new_session("u2net")
-    logger.info("[OPTIMIZATION] ✓ Model loaded successfully - ready for parallel processing")
-except Exception as e:
-    logger.error(f"[OPTIMIZATION] Failed to pre-load model: {e}")
-    REMBG_SESSION = None
+# (skipped in "process" mode: each pool worker loads its own session instead,
+# and in the API process with PROCESSING_MODE=queue: worker.py runs the model)
+PRELOAD_MODEL = os.getenv("PROCESSING_MODE", "inline").lower() != "queue" or os.getenv("MASTERPOST_WORKER") == "1"
+REMBG_SESSION = None
+if REMBG_ENGINE != "process" and PRELOAD_MODEL:
+    try:
+        logger.info("[OPTIMIZATION] Pre-loading rembg U2-Net model...")
+        REMBG_SESSION = new_session("u2net")
+        logger.info("[OPTIMIZATION] ✓ Model loaded successfully - ready for parallel processing")
+    except Exception as e:
+        logger.error(f"[OPTIMIZATION] Failed to pre-load model: {e}")
+        REMBG_SESSION = None
+
+# OPTIMIZATION: Direct U2-Net inference on decoded images (no PNG round-trip),
+# micro-batched across batch threads. REMBG_MAX_BATCH=1 disables batching.
+SEGMENTER = create_segmenter(
+    REMBG_SESSION,
+    max_batch_size=int(os.getenv("REMBG_MAX_BATCH", "8")),
+    max_wait_ms=float(os.getenv("REMBG_MAX_WAIT_MS", "20"))
+)
+
+# Smallest working size for Basic processing (outputs are bounded by the pipeline's target size)
+OUTPUT_MAX_SIZE = (1000, 1000)
+
+# OPTIMIZATION: Resolution-aware mode for large camera originals.
+# Decode (JPEG DCT scaling via Image.draft) and segment at a working size tied
+# to the pipeline's target size instead of the full 24-48 MP original, then
+# upsample the model mask edge-aware (guided filter) to that working size.
+DOWNSCALE_BEFORE_SEGMENT = os.getenv("DOWNSCALE_BEFORE_SEGMENT", "1") == "1"
+MASK_UPSAMPLE = os.getenv("MASK_UPSAMPLE", "guided").lower()  # guided | lanczos
+
+# Hedged Premium: if Qwen has not answered within its recent latency percentile,
+# run Basic processing speculatively in the calling batch thread (its scheduler
+# slot and memory reservation). A Qwen answer that is in when Basic is done
+# still wins; otherwise the Qwen request is cancelled. The winner is recorded
+# in the result's "method" (billing charges per method). Needs the async Qwen client.
+PREMIUM_HEDGE = os.getenv("PREMIUM_HEDGE", "0") == "1"
+PREMIUM_HEDGE_PERCENTILE = float(os.getenv("PREMIUM_HEDGE_PERCENTILE", "95"))
+PREMIUM_HEDGE_DELAY_S = float(os.getenv("PREMIUM_HEDGE_DELAY_S", "20"))  # Until enough latency samples
+PREMIUM_HEDGE_MIN_DELAY_S = float(os.getenv("PREMIUM_HEDGE_MIN_DELAY_S", "2"))
+HEDGE_TMP_DIR = Path(tempfile.gettempdir()) / "masterpost_hedge"
+
+_hedge_lock = threading.Lock()
+_hedge_stats = {"hedged": 0, "premium_won": 0, "basic_won": 0, "premium_failed": 0}
+
+# Part of the result cache key: bump RESULT_CACHE_VERSION when rendering changes
+RESULT_CACHE_VERSION = os.getenv("RESULT_CACHE_VERSION", "3")
+BASIC_MODEL_VERSION = (
+    f"u2net|{'downscale' if DOWNSCALE_BEFORE_SEGMENT else 'full'}|{MASK_UPSAMPLE}|halo-{HALO_REFINEMENT}"
+    f"{'|white-fastpath' if WHITE_FASTPATH else ''}|v{RESULT_CACHE_VERSION}"
+)
+
+def get_working_size(pipeline: str) -> tuple:
+    """Working resolution for a pipeline: its target size, never below the output size"""
+    target_w, target_h = PipelineFactory.get_target_size(pipeline)
+    return (max(target_w, OUTPUT_MAX_SIZE[0]), max(target_h, OUTPUT_MAX_SIZE[1]))
+
+def decode_image(input_data: bytes, pipeline: str = "amazon") -> Image.Image:
+    """
+    Decode image bytes once into an RGB PIL image (EXIF orientation applied)
+
+    In resolution-aware mode the JPEG decoder is asked for a reduced scale
+    (1/2, 1/4, 1/8) that still covers the working size, and the result is
+    bounded to the working size.
+    """
+    img = Image.open(io.BytesIO(input_data))
+
+    if DOWNSCALE_BEFORE_SEGMENT:
+        working_size = get_working_size(pipeline)
+        original_size = img.size
+        img.draft('RGB', working_size)  # Only affects JPEG; no-op for other formats
+
+    img = ImageOps.exif_transpose(img)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    if DOWNSCALE_BEFORE_SEGMENT:
+        img.thumbnail(working_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        if img.size != original_size:
+            logger.info(f"[DOWNSCALE] {original_size} -> {img.size} (working size {working_size})")
+
+    return img
+
+def get_mask_version(img: Image.Image) -> str:
+    """Mask cache version: the segmenter's low-res mask fits any size, rembg's is per size"""
+    if SEGMENTER:
+        return "u2net|lowres"
+    return f"u2net|rembg|{img.size[0]}x{img.size[1]}"
+
+def segment_mask(img: Image.Image) -> np.ndarray:
+    """
+    Run the model on a decoded image -> uint8 mask array
+
+    Uses the segmenter when available (low-resolution model output);
+    otherwise asks rembg for the mask only (full size), which also works on
+    PIL images without encoding anything.
+    """
+    if SEGMENTER:
+        return SEGMENTER.submit(img).result()
+
+    if REMBG_SESSION:
+        return np.asarray(remove(img, session=REMBG_SESSION, only_mask=True))
+    return np.asarray(remove(img, only_mask=True))  # Fallback if session failed to load
+
+def get_foreground_mask(img: Image.Image, mask_path: Path = None, info: dict = None) -> Image.Image:
+    """
+    Get the product alpha mask ('L', same size as img) for a decoded image
+
+    If mask_path is given, a mask stored there by an earlier run is reused
+    (no model run); otherwise the new mask is stored there. Photos already
+    on clean white are masked without the model (see white_background.py).
+    info, if given, receives "mask_method": mask_cache | white_background | u2net
+    """
+    if info is None:
+        info = {}
+
+    mask = load_mask(mask_path) if mask_path else None
+    if mask is not None:
+        logger.info("[MASK CACHE] Reusing stored mask - segmentation skipped")
+        info["mask_method"] = "mask_cache"
+        return _mask_image(mask, img)
+
+    if WHITE_FASTPATH:
+        mask, check = white_background_mask(img)
+        if mask is not None:
+            logger.info(f"[WHITE-BG] Clean white background ({check['method']}) - segmentation skipped: {check}")
+            info["mask_method"] = "white_background"
+            return Image.fromarray(mask, mode="L")
+        logger.debug(f"[WHITE-BG] Segmenting: {check.get('reason')}")
+
+    mask = segment_mask(img)
+    info["mask_method"] = "u2net"
+    if mask_path:
+        try:
+            save_mask(mask_path, mask)
+        except Exception as e:
+            logger.warning(f"[MASK CACHE] Could not store mask: {e}")
+    return _mask_image(mask, img)
+
+def _mask_image(mask: np.ndarray, img: Image.Image) -> Image.Image:
+    """Model-resolution mask -> 'L' image at the image size"""
+    if mask.shape == (img.size[1], img.size[0]):
+        return Image.fromarray(mask, mode="L")
+    return mask_to_image(mask, img.size, guide=img if MASK_UPSAMPLE == "guided" else None)
 
 def apply_simple_shadow(img_rgba: Image.Image, shadow_type: str = 'drop', intensity: float = 0.5, blur_radius: int = 15) -> Image.Image:
     """
@@ -93,7 +250,8 @@ def apply_simple_shadow(img_rgba: Image.Image, shadow_type: str = 'drop', intens
 
     return canvas
 
-def remove_background_simple(input_path: str, output_path: str, shadow_params: dict = None, pipeline: str = "amazon") -> tuple[bool, str]:
+def remove_background_simple(input_path: str, output_path: str, shadow_params: dict = None, pipeline: str = "amazon",
+                             info: dict = None) -> tuple[bool, str]:
     """
     Simple local background removal using rembg + white background + optional shadows
 
@@ -108,135 +266,197 @@ def remove_background_simple(input_path: str, output_path: str, shadow_params: d
             - distance (int): Shadow distance in pixels
             - blur_radius (int): Blur level
         pipeline: Pipeline type (amazon, instagram, ebay, transparent)
+        info: Optional dict receiving details of the run ("mask_method")
 
     Returns:
         tuple[bool, str]: (success, actual_output_path)
     """
     try:
         logger.info(f"Starting simple background removal: {input_path}")
-        logger.info(f"[DEBUG] Shadow params passed to remove_background_simple: {shadow_params}")
 
         # Read original image
         with open(input_path, 'rb') as input_file:
             input_data = input_file.read()
 
-        # Remove background with rembg (using pre-loaded session for speed)
-        logger.info("Removing background with rembg...")
-        if REMBG_SESSION:
-            output_data = remove(input_data, session=REMBG_SESSION)
-        else:
-            output_data = remove(input_data)  # Fallback if session failed to load
-
-        # Open image without background (RGBA)
-        img_no_bg = Image.open(io.BytesIO(output_data))
-        logger.info(f"Background removed, image size: {img_no_bg.size}")
-
-        # Ensure image is in RGBA mode
-        if img_no_bg.mode != 'RGBA':
-            img_no_bg = img_no_bg.convert('RGBA')
-
-        # Clean edges to reduce halo effect
-        if img_no_bg.mode == 'RGBA':
-            # Get alpha channel
-            alpha = img_no_bg.split()[3]
-
-            # Erode alpha slightly to remove edge artifacts
-            alpha = alpha.filter(ImageFilter.MinFilter(3))  # Shrink edges by 1-2px
-
-            # Apply slight blur to alpha for smoother transition
-            alpha = alpha.filter(ImageFilter.GaussianBlur(0.5))
-
-            # Reconstruct image with cleaned alpha
-            r, g, b, _ = img_no_bg.split()
-            img_no_bg = Image.merge('RGBA', (r, g, b, alpha))
-
-            logger.info("[HALO-REMOVAL] Edge refinement applied to reduce halo")
-
-        # ALTERNATIVE: More aggressive halo removal (uncomment if needed)
-        # if img_no_bg.mode == 'RGBA':
-        #     import numpy as np
-        #
-        #     # Convert to numpy for processing
-        #     img_array = np.array(img_no_bg)
-        #     alpha = img_array[:, :, 3]
-        #
-        #     # Create binary mask (fully opaque or fully transparent)
-        #     threshold = 200  # Adjust between 150-250
-        #     alpha_binary = np.where(alpha > threshold, 255, 0).astype(np.uint8)
-        #
-        #     # Erode to remove halo
-        #     alpha_pil = Image.fromarray(alpha_binary)
-        #     alpha_pil = alpha_pil.filter(ImageFilter.MinFilter(5))  # Stronger erosion
-        #
-        #     # Slight blur for natural edge
-        #     alpha_pil = alpha_pil.filter(ImageFilter.GaussianBlur(1))
-        #
-        #     # Apply back to image
-        #     img_array[:, :, 3] = np.array(alpha_pil)
-        #     img_no_bg = Image.fromarray(img_array)
-        #
-        #     logger.info("[HALO-REMOVAL] Aggressive halo removal applied")
+    except Exception as e:
+        logger.error(f"Error reading {input_path}: {e}")
+        return False, output_path
+
+    # Masks are kept next to the input, so reruns with new settings skip the model
+    mask_dir = mask_dir_for(input_path) if mask_cache_enabled() else None
+    return remove_background_bytes(input_data, output_path, shadow_params, pipeline, mask_dir, info)
+
+def remove_background_bytes(input_data: bytes, output_path: str, shadow_params: dict = None, pipeline: str = "amazon",
+                            mask_dir: Path = None, info: dict = None) -> tuple[bool, str]:
+    """
+    Same as remove_background_simple but takes the encoded image bytes directly
+    (input already read by the caller, or shared-memory inputs of the process pool)
+
+    Args:
+        input_data: Encoded image bytes (JPEG, PNG, WebP...)
+        output_path: Path for processed image
+        shadow_params: Optional shadow parameters (see remove_background_simple)
+        pipeline: Pipeline type (amazon, instagram, ebay, transparent)
+        mask_dir: Optional mask cache folder (see mask_cache.py)
+        info: Optional dict receiving details of the run ("mask_method")
+
+    Returns:
+        tuple[bool, str]: (success, actual_output_path)
+    """
+    try:
+        logger.info(f"[DEBUG] Shadow params passed to remove_background_simple: {shadow_params}")
+
+        img_no_bg, alpha, mask_path = prepare_cutout(input_data, pipeline, mask_dir, info)
 
         # Standard pipelines (amazon, instagram, ebay) - resize and add white background
-        # Resize image maintaining aspect ratio (keep as RGBA)
-        img_no_bg.thumbnail((1000, 1000), Image.Resampling.LANCZOS)
+        # Resize image maintaining aspect ratio (keep as RGBA), within the pipeline's target size
+        img_no_bg.thumbnail(PipelineFactory.get_target_size(pipeline), Image.Resampling.LANCZOS)
         logger.info(f"Image resized to: {img_no_bg.size}")
 
-        # Apply shadow effect if enabled
-        if shadow_params and shadow_params.get('enabled', False):
-            logger.info("=" * 60)
-            logger.info(f"[SHADOW] Applying simple drop shadow")
-            logger.info(f"   Intensity: {shadow_params.get('intensity', 0.5)}")
-            logger.info("=" * 60)
+        render_output(img_no_bg, alpha, output_path, shadow_params, pipeline, mask_path)
+        return True, output_path
 
-            try:
-                from .shadow_effects import apply_simple_drop_shadow
+    except Exception as e:
+        logger.error(f"Error processing {output_path}: {e}")
+        return False, output_path
 
+def prepare_cutout(input_data: bytes, pipeline: str = "amazon", mask_dir: Path = None, info: dict = None):
+    """
+    Decode, segment and clean the edges of an image -> (RGBA cutout, alpha, mask_path)
+
+    The cutout is at the pipeline's working size; alpha is its cleaned mask
+    ('L', same size) and mask_path the mask cache entry used (or None).
+    """
+    # Decode ONCE - everything below works on this in-memory image
+    img = decode_image(input_data, pipeline)
+
+    # Get the alpha mask straight from the model (no PNG encode/decode),
+    # or from the mask cache when this input was segmented before
+    logger.info("Removing background with U2-Net...")
+    mask_path = mask_path_for(mask_dir, input_data, get_mask_version(img)) if mask_dir else None
+    alpha = get_foreground_mask(img, mask_path, info)
+    logger.info(f"Background removed, image size: {img.size}")
+
+    # Clean edges to reduce halo effect (on the mask only - no channel split/merge):
+    # erode + feather the silhouette band only (HALO_REFINEMENT=standard|aggressive|off)
+    alpha = refine_halo(alpha)
+    logger.info(f"[HALO-REMOVAL] Edge refinement applied to reduce halo ({HALO_REFINEMENT})")
+
+    # Attach the cleaned mask as the alpha channel (in place, no copy of RGB)
+    img.putalpha(alpha)
+    return img, alpha, mask_path
+
+def render_output(img_no_bg: Image.Image, alpha: Image.Image, output_path: str, shadow_params: dict = None,
+                  pipeline: str = "amazon", mask_path: Path = None):
+    """
+    Render a resized cutout for a pipeline (optional shadow, white background) and save it as JPEG
+
+    img_no_bg is not modified, so one cutout can be rendered for several pipelines.
+    """
+    # Apply shadow effect if enabled
+    if shadow_params and shadow_params.get('enabled', False):
+        shadow_type = shadow_params.get('type', 'drop')
+        logger.info("=" * 60)
+        logger.info(f"[SHADOW] Applying {'auto-detected' if shadow_type == 'auto' else 'simple drop'} shadow")
+        logger.info(f"   Intensity: {shadow_params.get('intensity', 0.5)}")
+        logger.info("=" * 60)
+
+        try:
+            from ..processing.shadow_effects import apply_simple_drop_shadow, render_professional_shadow
+
+            if shadow_type == 'auto':
+                # Detect from the segmentation mask already in memory (memoized per cached mask)
+                img_with_shadow = render_professional_shadow(
+                    img_no_bg, pipeline, 'auto',
+                    custom_params={'intensity': shadow_params.get('intensity', 0.5)},
+                    mask=alpha,
+                    mask_key=str(mask_path) if mask_path else None
+                )
+            else:
                 img_with_shadow = apply_simple_drop_shadow(
                     image=img_no_bg,
                     intensity=shadow_params.get('intensity', 0.5)
                 )
 
-                logger.info("=" * 60)
-                logger.info(f"[SHADOW] Success!")
-                logger.info("=" * 60)
-
-                # Use image with shadow
-                img_final = img_with_shadow
-
-            except Exception as shadow_error:
-                logger.error("=" * 60)
-                logger.error(f"[SHADOW] FAILED: {shadow_error}")
-                logger.error("=" * 60)
-                import traceback
-                traceback.print_exc()
-                # Create white background as fallback
-                white_bg = Image.new('RGB', img_no_bg.size, (255, 255, 255))
-                white_bg.paste(img_no_bg, (0, 0), img_no_bg)
-                img_final = white_bg
-        else:
-            # Create white background (no shadow)
-            white_bg = Image.new('RGB', img_no_bg.size, (255, 255, 255))
-            white_bg.paste(img_no_bg, (0, 0), img_no_bg)
-            img_final = white_bg
+            logger.info("=" * 60)
+            logger.info(f"[SHADOW] Success!")
+            logger.info("=" * 60)
 
-        # Ensure output directory exists
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            # Use image with shadow
+            img_final = img_with_shadow
+
+        except Exception as shadow_error:
+            logger.error("=" * 60)
+            logger.error(f"[SHADOW] FAILED: {shadow_error}")
+            logger.error("=" * 60)
+            import traceback
+            traceback.print_exc()
+            # White background as fallback
+            img_final = composite_on_white(img_no_bg)
+    else:
+        # White background (no shadow)
+        img_final = composite_on_white(img_no_bg)
 
-        # Save result as JPEG
-        img_final.save(output_path, 'JPEG', quality=95)
-        logger.info(f"Image saved successfully: {output_path}")
+    # Ensure output directory exists
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-        return True, output_path
+    # Save result as JPEG
+    img_final.save(output_path, 'JPEG', quality=95)
+    logger.info(f"Image saved successfully: {output_path}")
+
+def remove_background_multi(input_path: str, outputs: Dict[str, str], shadow_params: dict = None,
+                            info: dict = None) -> Dict[str, tuple[bool, str]]:
+    """
+    Segment an image once and render it for several pipelines
+
+    The image is decoded at the largest working size of the pipelines and
+    segmented once; the cutout is then resized to each pipeline's target size
+    (1000/1080/1600 px for amazon/instagram/ebay) and rendered with its shadow
+    profile, the same output remove_background_simple gives for that pipeline.
+
+    Args:
+        input_path: Path to input image
+        outputs: pipeline -> output path
+        shadow_params: Optional shadow parameters (see remove_background_simple)
+        info: Optional dict receiving details of the run ("mask_method")
+
+    Returns:
+        pipeline -> (success, actual_output_path)
+    """
+    try:
+        logger.info(f"[MULTI] Segmenting once for {len(outputs)} pipelines: {input_path}")
+        with open(input_path, 'rb') as input_file:
+            input_data = input_file.read()
+
+        mask_dir = mask_dir_for(input_path) if mask_cache_enabled() else None
+        largest = max(outputs, key=lambda name: get_working_size(name))
+        img_no_bg, alpha, mask_path = prepare_cutout(input_data, largest, mask_dir, info)
 
     except Exception as e:
         logger.error(f"Error processing {input_path}: {e}")
-        return False, output_path
+        return {name: (False, output_path) for name, output_path in outputs.items()}
+
+    results = {}
+    for name, output_path in outputs.items():
+        try:
+            cutout = img_no_bg.copy()
+            cutout.thumbnail(PipelineFactory.get_target_size(name), Image.Resampling.LANCZOS)
+            logger.info(f"[MULTI] {name}: image resized to {cutout.size}")
+            render_output(cutout, alpha, output_path, shadow_params, name, mask_path)
+            results[name] = (True, output_path)
+        except Exception as e:
+            logger.error(f"Error processing {output_path}: {e}")
+            results[name] = (False, output_path)
+    return results
 
 def process_image_simple(input_path: str, output_path: str, pipeline: str = "amazon", shadow_params: dict = None, use_premium: bool = False) -> dict:
     """
     Process image with Basic (local rembg) or Premium (Qwen API) processing
 
+    Results are cached by content (see result_cache.py): re-uploads of an
+    image with the same settings are served from the cache without running
+    segmentation or calling the Premium API.
+
     Args:
         input_path: Path to input image
         output_path: Path for processed image
@@ -245,68 +465,355 @@ def process_image_simple(input_path: str, output_path: str, pipeline: str = "ama
         use_premium: If True, use Qwen API (Premium, 3 credits)
                      If False, use local rembg (Basic, 1 credit)
 
+    Returns:
+        dict: Processing result with cost information
+    """
+    cache = get_result_cache()
+    if cache is None:
+        return _process_image_uncached(input_path, output_path, pipeline, shadow_params, use_premium)
+
+    premium_available = use_premium and QWEN_AVAILABLE and qwen_service.available
+    tier = "premium" if premium_available else "basic"
+
+    with open(input_path, 'rb') as f:
+        input_data = f.read()
+    cache_key = _result_cache_key(hash_bytes(input_data), pipeline, tier, shadow_params)
+
+    cached = cache.get(cache_key)
+    if cached is not None:
+        with open(output_path, 'wb') as f:
+            f.write(cached)
+        logger.info(f"⚡ Result cache hit ({tier}) for: {Path(input_path).name}")
+        return build_cached_result(input_path, output_path, pipeline, shadow_params, tier)
+
+    # The bytes read for the cache key are the input of Basic processing (no second read)
+    result = _process_image_uncached(input_path, output_path, pipeline, shadow_params, use_premium, input_data)
+
+    # Only cache results produced by the requested tier (not Premium -> Basic fallbacks)
+    produced_tier = "premium" if result.get("method") == "qwen_premium" else "basic"
+    if result.get("success") and produced_tier == tier:
+        try:
+            with open(result["output_path"], 'rb') as f:
+                cache.put(cache_key, f.read())
+        except Exception as e:
+            logger.warning(f"Result cache store failed: {e}")
+
+    return result
+
+def _result_cache_key(input_hash: str, pipeline: str, tier: str, shadow_params: dict) -> str:
+    if tier == "premium":
+        # Premium ignores shadow settings
+        return build_cache_key(input_hash, pipeline, tier, None, f"{qwen_service.model}|v{RESULT_CACHE_VERSION}")
+    # Single and multi-pipeline jobs render the same output for a pipeline: one key
+    return build_cache_key(input_hash, pipeline, tier, shadow_params, BASIC_MODEL_VERSION)
+
+def process_image_multi(input_path: str, outputs: Dict[str, str], shadow_params: dict = None,
+                        use_premium: bool = False) -> Dict[str, dict]:
+    """
+    Process one image for several pipelines (multi-marketplace jobs)
+
+    Basic segments the image once for all pipelines and renders each output
+    at its pipeline's target size (see remove_background_multi); each output
+    is a separate result, cached under its own pipeline and charged on its
+    own. Premium renders every pipeline with its own Qwen prompt, so each
+    output is a separate call.
+
+    Args:
+        input_path: Path to input image
+        outputs: pipeline -> output path
+        shadow_params: Optional shadow parameters dict
+        use_premium: Use Qwen API (Premium) instead of local rembg (Basic)
+
+    Returns:
+        pipeline -> result dict (same shape as process_image_simple)
+    """
+    if use_premium:
+        return {
+            name: process_image_simple(input_path, output_path, name, shadow_params, use_premium)
+            for name, output_path in outputs.items()
+        }
+
+    results = {}
+    cache = get_result_cache()
+    cache_keys = {}
+    if cache is not None:
+        with open(input_path, 'rb') as f:
+            input_hash = hash_bytes(f.read())
+        for name, output_path in outputs.items():
+            cache_keys[name] = _result_cache_key(input_hash, name, "basic", shadow_params)
+            cached = cache.get(cache_keys[name])
+            if cached is not None:
+                with open(output_path, 'wb') as f:
+                    f.write(cached)
+                logger.info(f"⚡ Result cache hit (basic, {name}) for: {Path(input_path).name}")
+                results[name] = build_cached_result(input_path, output_path, name, shadow_params, "basic")
+
+    pending = {name: output_path for name, output_path in outputs.items() if name not in results}
+    if pending:
+        logger.info(f"🔧 Using BASIC processing (local rembg) for: {Path(input_path).name} -> {', '.join(pending)}")
+        for name, result in _process_basic_multi(input_path, pending, shadow_params).items():
+            results[name] = result
+            if cache is not None and result.get("success"):
+                try:
+                    with open(result["output_path"], 'rb') as f:
+                        cache.put(cache_keys[name], f.read())
+                except Exception as e:
+                    logger.warning(f"Result cache store failed: {e}")
+
+    return {name: results[name] for name in outputs}
+
+def build_cached_result(input_path: str, output_path: str, pipeline: str, shadow_params: dict, tier: str) -> dict:
+    """Result dict for a cache hit (same shape as a freshly processed image)"""
+    if tier == "premium":
+        return {
+            "success": True,
+            "method": "qwen_premium",
+            "pipeline": pipeline,
+            "input_path": input_path,
+            "output_path": output_path,
+            "cost": 0.0,  # No API call was made
+            "credits_used": 3,
+            "shadow_applied": False,
+            "shadow_type": None,
+            "cache_hit": True,
+            "message": "Background removed successfully with Premium AI (cached)"
+        }
+
+    shadow_enabled = bool(shadow_params and shadow_params.get('enabled', False))
+    return {
+        "success": True,
+        "method": "local_rembg",
+        "pipeline": pipeline,
+        "input_path": input_path,
+        "output_path": output_path,
+        "cost": 0.0,
+        "credits_used": 1,
+        "shadow_applied": shadow_enabled,
+        "shadow_type": shadow_params.get('type', 'drop') if shadow_enabled else None,
+        "cache_hit": True,
+        "message": "Background removed successfully (cached)"
+    }
+
+def _process_image_uncached(input_path: str, output_path: str, pipeline: str = "amazon", shadow_params: dict = None, use_premium: bool = False,
+                            input_data: bytes = None) -> dict:
+    """
+    Process image with Basic (local rembg) or Premium (Qwen API) processing
+
+    Args:
+        input_path: Path to input image
+        output_path: Path for processed image
+        pipeline: Pipeline type (amazon, instagram, ebay)
+        shadow_params: Optional shadow parameters dict
+        use_premium: If True, use Qwen API (Premium, 3 credits)
+                     If False, use local rembg (Basic, 1 credit)
+        input_data: The input's bytes, if the caller has read them already
+
     Returns:
         dict: Processing result with cost information
     """
     # PREMIUM PROCESSING with Qwen API
+    premium_fallback = None
     if use_premium:
         if not QWEN_AVAILABLE or not qwen_service.available:
             logger.warning("⚠️ Premium requested but not available. Falling back to Basic.")
-            use_premium = False  # Fallback to basic
+            premium_fallback = "premium_unavailable"
         else:
             logger.info(f"🌟 Using PREMIUM processing (Qwen API) for: {Path(input_path).name}")
 
+            if PREMIUM_HEDGE:
+                result = _process_premium_hedged(input_path, output_path, pipeline, shadow_params)
+                if result is not None:
+                    return result
+
             result = remove_background_premium_sync(input_path, output_path, pipeline)
 
             if result.get('success'):
                 logger.info(f"✅ Premium processing successful!")
-                return {
-                    "success": True,
-                    "method": "qwen_premium",
-                    "pipeline": pipeline,
-                    "input_path": input_path,
-                    "output_path": output_path,
-                    "cost": 0.045,  # API cost
-                    "credits_used": 3,
-                    "shadow_applied": False,  # Qwen handles shadows in prompt
-                    "shadow_type": None,
-                    "message": "Background removed successfully with Premium AI"
-                }
-            else:
-                # Fallback to basic if premium fails
-                logger.warning(f"⚠️ Premium processing failed: {result.get('error')}")
-                logger.warning("   Falling back to Basic processing...")
-                use_premium = False
+                return _premium_result(input_path, output_path, pipeline)
 
-    # BASIC PROCESSING with local rembg
-    if not use_premium:
-        logger.info(f"🔧 Using BASIC processing (local rembg) for: {Path(input_path).name}")
+            # Fallback to basic if premium fails
+            logger.warning(f"⚠️ Premium processing failed: {result.get('error')}")
+            logger.warning("   Falling back to Basic processing...")
+            premium_fallback = "premium_failed"
 
-        # Process image with shadow parameters (or None for no shadow)
-        success, actual_output_path = remove_background_simple(input_path, output_path, shadow_params, pipeline)
+    # BASIC PROCESSING with local rembg
+    logger.info(f"🔧 Using BASIC processing (local rembg) for: {Path(input_path).name}")
+    return _process_basic(input_path, output_path, pipeline, shadow_params, premium_fallback, input_data)
+
+def _premium_result(input_path: str, output_path: str, pipeline: str) -> dict:
+    return {
+        "success": True,
+        "method": "qwen_premium",
+        "pipeline": pipeline,
+        "input_path": input_path,
+        "output_path": output_path,
+        "cost": 0.045,  # API cost
+        "credits_used": 3,
+        "shadow_applied": False,  # Qwen handles shadows in prompt
+        "shadow_type": None,
+        "message": "Background removed successfully with Premium AI"
+    }
+
+def _process_basic(input_path: str, output_path: str, pipeline: str, shadow_params: dict,
+                   premium_fallback: str = None, input_data: bytes = None) -> dict:
+    """
+    Basic processing (local rembg)
 
-        if not success:
-            return {
-                "success": False,
-                "method": "local_rembg",
-                "pipeline": pipeline,
-                "input_path": input_path,
-                "error": "Failed to process image with local background removal"
-            }
+    premium_fallback: why a Premium request ended up here (None if Basic was
+    requested); recorded in the result so billing sees the fallback.
+    input_data: the input's bytes if already read (decoded from memory, and
+    handed to a process-pool worker through shared memory, instead of
+    reading the file again)
+    """
+    # Process image with shadow parameters (or None for no shadow)
+    info = {}
+    if input_data is not None:
+        mask_dir = mask_dir_for(input_path) if mask_cache_enabled() else None
+        if REMBG_ENGINE == "process":
+            from .rembg_pool import get_rembg_pool
+            success, actual_output_path = get_rembg_pool().remove_background_buffer(
+                input_data, output_path, shadow_params, pipeline, info, mask_dir
+            )
+        else:
+            success, actual_output_path = remove_background_bytes(input_data, output_path, shadow_params, pipeline, mask_dir, info)
+    elif REMBG_ENGINE == "process":
+        from .rembg_pool import get_rembg_pool
+        success, actual_output_path = get_rembg_pool().remove_background(input_path, output_path, shadow_params, pipeline, info)
+    else:
+        success, actual_output_path = remove_background_simple(input_path, output_path, shadow_params, pipeline, info)
 
-        shadow_enabled = shadow_params and shadow_params.get('enabled', False)
+    return _basic_result(input_path, actual_output_path, pipeline, shadow_params, success, info, premium_fallback)
 
-        result = {
-            "success": True,
+def _process_basic_multi(input_path: str, outputs: Dict[str, str], shadow_params: dict) -> Dict[str, dict]:
+    """Basic processing for several pipelines with one segmentation"""
+    info = {}
+    if REMBG_ENGINE == "process":
+        from .rembg_pool import get_rembg_pool
+        rendered = get_rembg_pool().remove_background_multi(input_path, outputs, shadow_params, info)
+    else:
+        rendered = remove_background_multi(input_path, outputs, shadow_params, info)
+
+    return {
+        name: _basic_result(input_path, actual_output_path, name, shadow_params, success, info)
+        for name, (success, actual_output_path) in rendered.items()
+    }
+
+def _basic_result(input_path: str, actual_output_path: str, pipeline: str, shadow_params: dict, success: bool,
+                  info: dict, premium_fallback: str = None) -> dict:
+    if not success:
+        return {
+            "success": False,
             "method": "local_rembg",
             "pipeline": pipeline,
             "input_path": input_path,
-            "output_path": actual_output_path,  # Use the actual output path (may be .png for transparent)
-            "cost": 0.0,  # No API cost for local processing
-            "credits_used": 1,
-            "shadow_applied": shadow_enabled,
-            "shadow_type": shadow_params.get('type', 'drop') if shadow_enabled else None,
-            "message": f"Background removed successfully" + (f" with {shadow_params.get('type', 'drop')} shadow" if shadow_enabled else "")
+            "premium_fallback": premium_fallback,
+            "error": "Failed to process image with local background removal"
         }
 
-        return result
\ No newline at end of file
+    shadow_enabled = shadow_params and shadow_params.get('enabled', False)
+
+    result = {
+        "success": True,
+        "method": "local_rembg",
+        "pipeline": pipeline,
+        "input_path": input_path,
+        "output_path": actual_output_path,  # Use the actual output path (may be .png for transparent)
+        "cost": 0.0,  # No API cost for local processing
+        "credits_used": 1,
+        "shadow_applied": shadow_enabled,
+        "shadow_type": shadow_params.get('type', 'drop') if shadow_enabled else None,
+        "message": f"Background removed successfully" + (f" with {shadow_params.get('type', 'drop')} shadow" if shadow_enabled else "")
+    }
+    if info.get("mask_method"):
+        result["mask_method"] = info["mask_method"]
+    if premium_fallback:
+        result["premium_fallback"] = premium_fallback
+
+    return result
+
+def get_hedge_delay() -> float:
+    """Seconds to wait for Qwen before starting Basic speculatively"""
+    latency = premium_latency_percentile(PREMIUM_HEDGE_PERCENTILE)
+    if latency is None:
+        return PREMIUM_HEDGE_DELAY_S
+    return max(PREMIUM_HEDGE_MIN_DELAY_S, latency)
+
+def _count_hedge(key: str):
+    with _hedge_lock:
+        _hedge_stats[key] += 1
+
+def get_hedge_stats() -> dict:
+    with _hedge_lock:
+        return {**_hedge_stats, "enabled": PREMIUM_HEDGE}
+
+def _discard_when_done(future, path: str):
+    """Delete the loser's output once it finishes (or right away if cancelled)"""
+    future.add_done_callback(lambda _: Path(path).unlink(missing_ok=True))
+
+def _premium_outcome(future) -> dict:
+    """remove_background dict of a finished Premium call (errors and cancellation as failures)"""
+    try:
+        return future.result()
+    except BaseException as e:
+        return {"success": False, "error": str(e) or type(e).__name__}
+
+def _process_premium_hedged(input_path: str, output_path: str, pipeline: str, shadow_params: dict):
+    """
+    Premium request raced against a speculative Basic run
+
+    Returns None if Premium cannot be started asynchronously (the caller then
+    uses the blocking path). Basic runs in this thread, so it stays within
+    the caller's scheduler slot and memory reservation. Both sides write to
+    temp files outside the processed folder; the winner is moved to output_path.
+    """
+    HEDGE_TMP_DIR.mkdir(parents=True, exist_ok=True)
+    suffix = Path(output_path).suffix
+    premium_path = str(HEDGE_TMP_DIR / f"{uuid.uuid4().hex}.premium{suffix}")
+    basic_path = str(HEDGE_TMP_DIR / f"{uuid.uuid4().hex}.basic{suffix}")
+
+    call = submit_premium(input_path, premium_path, pipeline)
+    if call is None:
+        return None
+    premium = call.future
+
+    started = time.monotonic()
+    hedge_delay = get_hedge_delay()
+    wait([premium], timeout=hedge_delay)
+
+    basic = None
+    if not premium.done():
+        _count_hedge("hedged")
+        logger.info(f"⏱️ Qwen slower than {hedge_delay:.1f}s - running Basic meanwhile for: {Path(input_path).name}")
+        basic = _process_basic(input_path, basic_path, pipeline, shadow_params, "hedge")
+
+        if basic.get("success") and not premium.done():
+            # Basic won: abort the Qwen request on the client loop
+            call.cancel()
+            _discard_when_done(premium, premium_path)
+            shutil.move(basic["output_path"], output_path)
+            _count_hedge("basic_won")
+            logger.info(f"⚡ Basic won the hedge after {time.monotonic() - started:.1f}s")
+            return {**basic, "output_path": output_path, "hedged": True}
+
+    # Premium finished first, or Basic failed and Premium is the only candidate left
+    result = _premium_outcome(premium)
+    if result.get("success"):
+        if basic is not None:
+            Path(basic["output_path"]).unlink(missing_ok=True)
+        shutil.move(premium_path, output_path)
+        _count_hedge("premium_won")
+        logger.info(f"✅ Premium won after {time.monotonic() - started:.1f}s")
+        return {**_premium_result(input_path, output_path, pipeline), "hedged": basic is not None}
+
+    _count_hedge("premium_failed")
+    logger.warning(f"⚠️ Premium processing failed: {result.get('error')}")
+    if basic is None:
+        # Failed before the hedge delay: plain fallback
+        return _process_basic(input_path, output_path, pipeline, shadow_params, "premium_failed")
+
+    if basic.get("success"):
+        shutil.move(basic["output_path"], output_path)
+        _count_hedge("basic_won")
+        basic = {**basic, "output_path": output_path}
+    # Both sides failed: still a Premium fallback for billing
+    return {**basic, "premium_fallback": "premium_failed", "hedged": True}
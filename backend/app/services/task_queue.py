@@ -0,0 +1,296 @@
+"""
+Task Queue
+Local broker between the API and the image workers (PROCESSING_MODE=queue)
+
+The API enqueues one task per image; worker processes (worker.py) claim
+them, run the model and report results to the job store. API and workers
+then scale independently, and only the workers load U2-Net. Backends:
+
+    sqlite:///tasks.db         - embedded SQLite in WAL mode (default, no services)
+    redis://host:6379/0        - Redis lists (requires the `redis` package)
+
+Select with TASK_QUEUE_URL. A claimed task is leased: if its worker dies the
+lease expires and another worker picks the task up again (up to
+max_attempts). Tasks are acknowledged only after their result is recorded.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TASK_QUEUE_URL = "sqlite:///tasks.db"
+
+# Seconds a claimed task stays invisible to other workers
+DEFAULT_LEASE_SECONDS = 600
+
+@dataclass
+class Task:
+    id: str
+    payload: Dict[str, Any]
+    attempts: int
+
+class TaskQueue(ABC):
+    """
+    Interface shared by the task queue backends
+
+    enqueue() -> claim() -> ack() on success; release() puts a task back
+    (e.g. on worker shutdown). Higher priority tasks are claimed first,
+    FIFO within a priority.
+    """
+
+    def __init__(self, lease_seconds: float = DEFAULT_LEASE_SECONDS, max_attempts: int = 3):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    @abstractmethod
+    def enqueue(self, payload: Dict[str, Any], priority: int = 0) -> str:
+        """Add a task and return its id"""
+
+    @abstractmethod
+    def claim(self, worker_id: str) -> Optional[Task]:
+        """Lease the next ready task (None if there is none)"""
+
+    @abstractmethod
+    def ack(self, task: Task):
+        """The task is done: remove it"""
+
+    @abstractmethod
+    def release(self, task: Task):
+        """Put a claimed task back, ready now (the claim is not counted as an attempt)"""
+
+    @abstractmethod
+    def depth(self) -> int:
+        """Tasks waiting or being processed"""
+
+    @abstractmethod
+    def get_stats(self) -> Dict[str, Any]:
+        """Queued and leased task counts (health check, admission)"""
+
+# ============================================================
+# SQLITE (default)
+# ============================================================
+
+class SQLiteTaskQueue(TaskQueue):
+    """SQLite backend in WAL mode (one connection per thread)"""
+
+    def __init__(self, path: str = "tasks.db", **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload     TEXT NOT NULL,
+                priority    INTEGER NOT NULL DEFAULT 0,
+                attempts    INTEGER NOT NULL DEFAULT 0,
+                worker      TEXT,
+                lease_until REAL NOT NULL DEFAULT 0,
+                created_at  REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (lease_until, priority, id);
+        """)
+        logger.info(f"[TASK QUEUE] SQLite task queue ready ({path})")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, payload: Dict[str, Any], priority: int = 0) -> str:
+        cursor = self._connect().execute(
+            "INSERT INTO tasks (payload, priority, created_at) VALUES (?, ?, ?)",
+            (json.dumps(payload, default=str), priority, time.time())
+        )
+        return str(cursor.lastrowid)
+
+    def claim(self, worker_id: str) -> Optional[Task]:
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Ready = never leased, or the lease of a dead worker expired
+            row = conn.execute(
+                "SELECT id, payload, attempts FROM tasks WHERE lease_until < ? "
+                "ORDER BY priority DESC, id LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE tasks SET worker = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                    (worker_id, now + self.lease_seconds, row["id"])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if row is None:
+            return None
+        return Task(id=str(row["id"]), payload=json.loads(row["payload"]), attempts=row["attempts"] + 1)
+
+    def ack(self, task: Task):
+        self._connect().execute("DELETE FROM tasks WHERE id = ?", (int(task.id),))
+
+    def release(self, task: Task):
+        self._connect().execute(
+            "UPDATE tasks SET worker = NULL, lease_until = 0, attempts = attempts - 1 WHERE id = ?",
+            (int(task.id),)
+        )
+
+    def depth(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.time()
+        row = self._connect().execute(
+            "SELECT COUNT(*) AS total, "
+            "SUM(CASE WHEN lease_until >= ? THEN 1 ELSE 0 END) AS leased, "
+            "COUNT(DISTINCT CASE WHEN lease_until >= ? THEN worker END) AS workers "
+            "FROM tasks",
+            (now, now)
+        ).fetchone()
+        leased = row["leased"] or 0
+        return {
+            "backend": "sqlite",
+            "queued": row["total"] - leased,
+            "leased": leased,
+            "busy_workers": row["workers"]
+        }
+
+# ============================================================
+# REDIS
+# ============================================================
+
+class RedisTaskQueue(TaskQueue):
+    """
+    Redis backend
+
+    Keys:
+        tasks:ready:<priority>  list  - task ids waiting (one list per priority)
+        tasks:leases            zset  - leased task ids scored by lease expiry
+        tasks:data              hash  - id -> JSON payload
+        tasks:priority          hash  - id -> ready list the task goes back to
+        tasks:attempts          hash  - id -> claim count
+    """
+
+    PRIORITIES = (1, 0)
+
+    def __init__(self, url: str, **kwargs):
+        super().__init__(**kwargs)
+        if redis is None:
+            raise ImportError("redis package not installed (pip install redis)")
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        logger.info(f"[TASK QUEUE] Redis task queue ready ({url.split('@')[-1]})")
+
+    def enqueue(self, payload: Dict[str, Any], priority: int = 0) -> str:
+        task_id = str(self.client.incr("tasks:seq"))
+        priority = 1 if priority > 0 else 0
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset("tasks:data", task_id, json.dumps(payload, default=str))
+        pipe.hset("tasks:priority", task_id, priority)
+        pipe.lpush(f"tasks:ready:{priority}", task_id)
+        pipe.execute()
+        return task_id
+
+    def _ready_list(self, task_id: str) -> str:
+        """Ready list of a task's priority (where it goes back after a lease)"""
+        return f"tasks:ready:{self.client.hget('tasks:priority', task_id) or 0}"
+
+    def _requeue_expired(self):
+        """Put tasks of dead workers back at the front of their queue"""
+        for task_id in self.client.zrangebyscore("tasks:leases", "-inf", time.time()):
+            if self.client.zrem("tasks:leases", task_id):
+                self.client.rpush(self._ready_list(task_id), task_id)
+
+    def claim(self, worker_id: str) -> Optional[Task]:
+        self._requeue_expired()
+        for priority in self.PRIORITIES:
+            task_id = self.client.rpop(f"tasks:ready:{priority}")
+            if task_id is None:
+                continue
+
+            pipe = self.client.pipeline(transaction=True)
+            pipe.zadd("tasks:leases", {task_id: time.time() + self.lease_seconds})
+            pipe.hincrby("tasks:attempts", task_id, 1)
+            pipe.hget("tasks:data", task_id)
+            _, attempts, payload = pipe.execute()
+            if payload is None:  # Acked by a worker whose lease had expired
+                self.client.zrem("tasks:leases", task_id)
+                continue
+            return Task(id=task_id, payload=json.loads(payload), attempts=int(attempts))
+        return None
+
+    def ack(self, task: Task):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zrem("tasks:leases", task.id)
+        pipe.hdel("tasks:data", task.id)
+        pipe.hdel("tasks:priority", task.id)
+        pipe.hdel("tasks:attempts", task.id)
+        pipe.execute()
+
+    def release(self, task: Task):
+        ready_list = self._ready_list(task.id)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zrem("tasks:leases", task.id)
+        pipe.hincrby("tasks:attempts", task.id, -1)
+        pipe.rpush(ready_list, task.id)
+        pipe.execute()
+
+    def depth(self) -> int:
+        return self.client.hlen("tasks:data")
+
+    def get_stats(self) -> Dict[str, Any]:
+        queued = sum(self.client.llen(f"tasks:ready:{priority}") for priority in self.PRIORITIES)
+        return {"backend": "redis", "queued": queued, "leased": self.client.zcard("tasks:leases")}
+
+# ============================================================
+# FACTORY
+# ============================================================
+
+def create_task_queue(url: Optional[str] = None) -> TaskQueue:
+    """Build the task queue selected by url (or TASK_QUEUE_URL)"""
+    url = url or os.getenv("TASK_QUEUE_URL", DEFAULT_TASK_QUEUE_URL)
+    options = {
+        "lease_seconds": float(os.getenv("TASK_LEASE_SECONDS", str(DEFAULT_LEASE_SECONDS))),
+        "max_attempts": int(os.getenv("TASK_MAX_ATTEMPTS", "3"))
+    }
+
+    if url.startswith(("redis://", "rediss://")):
+        return RedisTaskQueue(url, **options)
+    if url.startswith("sqlite:///"):
+        return SQLiteTaskQueue(url[len("sqlite:///"):], **options)
+
+    raise ValueError(f"Unsupported TASK_QUEUE_URL: {url}")
+
+# Global task queue instance (created on first use)
+_task_queue: Optional[TaskQueue] = None
+_queue_lock = threading.Lock()
+
+def get_task_queue() -> TaskQueue:
+    """Return the shared task queue, creating it on first use"""
+    global _task_queue
+
+    with _queue_lock:
+        if _task_queue is None:
+            _task_queue = create_task_queue()
+        return _task_queue
@@ -15,6 +15,7 @@ import mimetypes
 from PIL import Image
 
 from .usage_service import usage_service
+from .archive_ingest import aiter_archive_to_dir
 from .processing_service import processing_service
 from ..models.user_models import PlanType
 
@@ -290,7 +291,10 @@ class ZipProcessingService:
 
     async def _extract_archive(self, archive_path: str, extract_dir: str) -> List[str]:
         """
-        Extract archive and return paths to image files
+        Extract the image members of an archive and return their paths
+
+        Members are streamed one by one and validated from their header
+        bytes (no extractall + directory walk, no PIL decode per image).
 
         Args:
             archive_path: Path to archive file
@@ -299,39 +303,15 @@ class ZipProcessingService:
         Returns:
             List of extracted image file paths
         """
-        try:
-            archive_path = Path(archive_path)
-            extract_path = Path(extract_dir)
-            image_files = []
-
-            if archive_path.suffix.lower() == '.zip':
-                with zipfile.ZipFile(archive_path, 'r') as zip_ref:
-                    zip_ref.extractall(extract_path)
+        image_files = []
 
-            elif archive_path.suffix.lower() == '.rar' and self.has_rarfile:
-                import rarfile
-                with rarfile.RarFile(archive_path, 'r') as rar_ref:
-                    rar_ref.extractall(extract_path)
+        async for member in aiter_archive_to_dir(archive_path, extract_dir):
+            if isinstance(member, dict):
+                logger.warning(f"Skipping {member['file']}: {member['reason']}")
+            else:
+                image_files.append(str(member))
 
-            elif archive_path.suffix.lower() == '.7z' and self.has_py7zr:
-                import py7zr
-                with py7zr.SevenZipFile(archive_path, 'r') as sz_ref:
-                    sz_ref.extractall(extract_path)
-
-            # Find all extracted image files
-            for root, dirs, files in os.walk(extract_path):
-                for file in files:
-                    if self._is_image_file(file):
-                        file_path = Path(root) / file
-                        # Validate image can be opened
-                        if await self._validate_image_file(str(file_path)):
-                            image_files.append(str(file_path))
-
-            return image_files
-
-        except Exception as e:
-            logger.error(f"Failed to extract archive {archive_path}: {str(e)}")
-            return []
+        return image_files
 
     def _is_image_file(self, filename: str) -> bool:
         """Check if file is a supported image format"""
@@ -0,0 +1,137 @@
+"""
+Benchmark: latencia de /health mientras corre un batch de imagenes
+
+Mide el p50/p99 de GET /health (en el mismo event loop que el servidor)
+antes y durante un batch de 200 imagenes, comparando el modo bloqueante
+anterior (ThreadPoolExecutor + as_completed) con el modo asyncio actual.
+
+Uso:
+    python benchmark_health_latency.py
+    python benchmark_health_latency.py --images 200 --work-ms 40
+"""
+
+import argparse
+import asyncio
+import io
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+sys.path.insert(0, '.')
+
+import httpx
+
+from server import app
+from app.services.batch_processor import SmartBatchProcessor
+
+
+def simulated_image(item, work_ms: float = 40.0):
+    """Simula el trabajo de una imagen (I/O + CPU fuera del GIL, como rembg)"""
+    time.sleep(work_ms / 1000.0)
+    return {"success": True, "original": f"img_{item:04d}.jpg"}
+
+
+async def legacy_blocking_batch(items, process_func, workers):
+    """Comportamiento anterior: as_completed bloqueante dentro de una corrutina"""
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(process_func, item) for item in items]
+        for future in as_completed(futures):
+            results.append(future.result(timeout=300))
+    return results
+
+
+async def sample_health(client: httpx.AsyncClient, stop: asyncio.Event, interval: float = 0.02):
+    """
+    Llama a /health en bucle y devuelve las latencias en ms
+
+    La latencia se mide desde el momento en que la peticion DEBIA enviarse,
+    igual que la veria un cliente externo si el event loop esta bloqueado.
+    """
+    latencies = []
+    scheduled = time.perf_counter()
+    while True:
+        response = await client.get("/health")
+        latencies.append((time.perf_counter() - scheduled) * 1000)
+        assert response.status_code == 200
+        if stop.is_set():
+            return latencies
+        scheduled = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_mode(mode: str, total_images: int, work_ms: float):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_health(client, stop))
+        await asyncio.sleep(0.1)  # Muestras previas al batch
+
+        items = list(range(total_images))
+        process_func = lambda item: simulated_image(item, work_ms)
+
+        batch_start = time.perf_counter()
+        if mode == "legacy":
+            processor = SmartBatchProcessor()
+            await legacy_blocking_batch(items, process_func, processor.calculate_workers(total_images))
+        else:
+            await SmartBatchProcessor().process_batch_async(items, process_func)
+        batch_elapsed = time.perf_counter() - batch_start
+
+        stop.set()
+        latencies = await sampler
+
+    return batch_elapsed, latencies
+
+
+async def run_benchmark(total_images: int, work_ms: float):
+    print("=" * 60)
+    print(f"BENCHMARK: /health durante un batch de {total_images} imagenes")
+    print("=" * 60)
+
+    # Baseline sin batch
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        idle = []
+        for _ in range(100):
+            start = time.perf_counter()
+            await client.get("/health")
+            idle.append((time.perf_counter() - start) * 1000)
+
+    print(f"\n[IDLE] p50={percentile(idle, 50):.2f}ms p99={percentile(idle, 99):.2f}ms")
+
+    for mode in ("legacy", "asyncio"):
+        elapsed, latencies = await run_mode(mode, total_images, work_ms)
+        print(f"\n[{mode.upper()}] batch={elapsed:.2f}s, muestras /health={len(latencies)}")
+        if latencies:
+            print(
+                f"   p50={percentile(latencies, 50):.2f}ms "
+                f"p99={percentile(latencies, 99):.2f}ms "
+                f"max={max(latencies):.2f}ms "
+                f"media={statistics.mean(latencies):.2f}ms"
+            )
+
+    print("\n" + "=" * 60)
+    print("En modo LEGACY el event loop queda bloqueado: /health solo responde")
+    print("al terminar el batch (max/p99 = duracion del batch).")
+    print("En modo ASYNCIO el p99 debe mantenerse cerca del valor IDLE.")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de latencia de /health")
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--work-ms", type=float, default=40.0)
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(args.images, args.work_ms))
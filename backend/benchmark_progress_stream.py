@@ -0,0 +1,198 @@
+"""
+Load test: polling de progreso vs stream de eventos (SSE)
+
+Levanta el servidor real (uvicorn en un hilo, procesamiento simulado) y
+lanza N jobs en paralelo. Para cada job compara:
+
+POLLING: el cliente hace GET /api/v1/progress cada 2s (como app/app/page.tsx)
+         y GET /api/v1/status al terminar
+SSE:     el cliente abre GET /api/v1/events/{job_id} una sola vez
+
+Mide peticiones HTTP por job y la latencia evento->UI: tiempo entre que el
+servidor termina una imagen y el cliente se entera.
+
+Uso:
+    python benchmark_progress_stream.py
+    python benchmark_progress_stream.py --jobs 20 --images 30 --work-ms 150
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Estado aislado del benchmark (job store + carpetas de trabajo)
+WORK_DIR = tempfile.mkdtemp(prefix="bench_events_")
+os.environ.setdefault("JOB_STORE_URL", f"sqlite:///{os.path.join(WORK_DIR, 'jobs.db')}")
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+os.chdir(WORK_DIR)
+os.symlink(os.path.join(SERVER_DIR, "static"), os.path.join(WORK_DIR, "static"))
+
+import httpx
+import uvicorn
+from PIL import Image
+
+import server
+
+# Momento en que el servidor termino cada imagen: (job_id, original) -> t
+COMPLETED_AT = {}
+
+
+def simulated_processing(work_ms: float):
+    def process(input_path, output_path, pipeline, shadow_params=None, use_premium=False):
+        time.sleep(work_ms / 1000.0)
+        Image.new('RGB', (8, 8), (255, 255, 255)).save(output_path, 'JPEG')
+        job_id = os.path.basename(os.path.dirname(input_path))
+        COMPLETED_AT[(job_id, os.path.basename(input_path))] = time.perf_counter()
+        return {"success": True}
+    return process
+
+
+def create_job(job_id: str, images: int):
+    job_dir = server.UPLOAD_DIR / job_id
+    job_dir.mkdir(parents=True, exist_ok=True)
+    for index in range(images):
+        Image.new('RGB', (8, 8), (200, 50, 50)).save(job_dir / f"img_{index:04d}.jpg", 'JPEG')
+
+
+def start_server() -> str:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    config = uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning")
+    uv_server = uvicorn.Server(config)
+    threading.Thread(target=uv_server.run, daemon=True).start()
+    while not uv_server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def completion_times(job_id: str) -> list:
+    return sorted(t for (job, _), t in COMPLETED_AT.items() if job == job_id)
+
+
+async def polling_client(client: httpx.AsyncClient, job_id: str, interval: float) -> dict:
+    requests = 1
+    await client.post("/api/v1/process", json={"job_id": job_id})
+    seen = 0
+    latencies = []
+
+    while True:
+        requests += 1
+        progress = (await client.get(f"/api/v1/progress/{job_id}")).json()
+        now = time.perf_counter()
+
+        done = completion_times(job_id)
+        for finished in done[seen:progress["current"]]:
+            latencies.append(now - finished)
+        seen = max(seen, progress["current"])
+
+        if progress["status"] == "completed":
+            requests += 1
+            await client.get(f"/api/v1/status/{job_id}")
+            return {"requests": requests, "latencies": latencies}
+        await asyncio.sleep(interval)
+
+
+async def sse_client(client: httpx.AsyncClient, job_id: str) -> dict:
+    latencies = []
+    subscribed = asyncio.Event()
+
+    async def listen():
+        async with client.stream("GET", f"/api/v1/events/{job_id}") as response:
+            subscribed.set()
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                event = json.loads(line[len("data: "):])
+                if event["type"] == "image":
+                    finished = COMPLETED_AT.get((job_id, event["file"]["original"]))
+                    if finished:
+                        latencies.append(time.perf_counter() - finished)
+                elif event["type"] in ("completed", "failed"):
+                    return
+
+    listener = asyncio.create_task(listen())
+    await subscribed.wait()
+    await client.post("/api/v1/process", json={"job_id": job_id})
+    await listener
+    return {"requests": 2, "latencies": latencies}
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_mode(base_url: str, mode: str, jobs: int, images: int, interval: float):
+    job_ids = [f"bench_{mode}_{index:03d}" for index in range(jobs)]
+    for job_id in job_ids:
+        create_job(job_id, images)
+
+    limits = httpx.Limits(max_connections=jobs * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        start = time.perf_counter()
+        if mode == "polling":
+            results = await asyncio.gather(*(polling_client(client, job_id, interval) for job_id in job_ids))
+        else:
+            results = await asyncio.gather(*(sse_client(client, job_id) for job_id in job_ids))
+        elapsed = time.perf_counter() - start
+
+    latencies = [latency * 1000 for result in results for latency in result["latencies"]]
+    return {
+        "elapsed": elapsed,
+        "requests_per_job": statistics.mean(result["requests"] for result in results),
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "events": len(latencies)
+    }
+
+
+async def run_benchmark(jobs: int, images: int, work_ms: float, interval: float):
+    server.process_image_simple = simulated_processing(work_ms)
+    base_url = start_server()
+
+    print("=" * 60)
+    print(f"LOAD TEST: {jobs} jobs x {images} imagenes ({work_ms:.0f}ms/imagen)")
+    print("=" * 60)
+
+    summary = {}
+    for mode in ("polling", "sse"):
+        summary[mode] = await run_mode(base_url, mode, jobs, images, interval)
+        result = summary[mode]
+        print(f"\n[{mode.upper()}] {result['elapsed']:.1f}s")
+        print(f"   Peticiones por job:   {result['requests_per_job']:.1f}")
+        print(f"   Latencia evento->UI:  p50={result['p50']:.0f}ms p99={result['p99']:.0f}ms "
+              f"({result['events']} imagenes)")
+
+    polling, sse = summary["polling"], summary["sse"]
+    print("\n" + "=" * 60)
+    print(f"Peticiones por job: {polling['requests_per_job']:.1f} -> {sse['requests_per_job']:.1f}")
+    print(f"Latencia p50:       {polling['p50']:.0f}ms -> {sse['p50']:.0f}ms")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test polling vs SSE")
+    parser.add_argument("--jobs", type=int, default=10)
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--work-ms", type=float, default=200.0)
+    parser.add_argument("--poll-interval", type=float, default=2.0)
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(args.jobs, args.images, args.work_ms, args.poll_interval))
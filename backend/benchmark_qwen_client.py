@@ -0,0 +1,210 @@
+"""
+Benchmark: throughput del tier Premium contra un stub local de DashScope
+
+Levanta un servidor stub (uvicorn en un hilo) que imita la API de
+qwen-image-edit: latencia simulada, cuota de peticiones por segundo (429 al
+superarla), errores 5xx aleatorios y la URL del resultado servida por el
+propio stub. No usa la API real ni consume cuota.
+
+LEGACY: como QwenImageEditService.remove_background - POST bloqueante sin
+        reutilizar conexiones + requests.get del resultado, sin reintentos
+        (cada fallo cae a Basic)
+ASYNC:  QwenAsyncClient - httpx.AsyncClient compartido, token bucket a la
+        cuota, reintentos con jitter y deadline por peticion
+
+Ambos modos se llaman desde un pool de hilos, igual que process_image_simple
+en el batch.
+
+Uso:
+    python benchmark_qwen_client.py
+    python benchmark_qwen_client.py --images 200 --threads 16 --quota 5 --error-rate 0.05
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from PIL import Image
+
+from app.services.qwen_client import QwenAsyncClient, GENERATION_PATH
+from app.services.qwen_service import qwen_service
+
+
+def encode_original(input_path: str) -> str:
+    """Como antes: el archivo original completo en base64"""
+    return qwen_service.encode_image_to_base64(input_path)
+
+
+PROMPT = "Remove the background completely and replace it with pure white."
+
+
+def create_stub_app(latency_ms: float, quota: float, error_rate: float) -> FastAPI:
+    """Stub de DashScope: cuota por segundo, latencia y errores simulados"""
+    app = FastAPI()
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (255, 255, 255)).save(buffer, 'JPEG')
+    result_bytes = buffer.getvalue()
+    window = {"second": 0, "count": 0}
+
+    @app.post("/api/v1" + GENERATION_PATH)
+    async def generation(request: Request):
+        await request.json()
+
+        second = int(time.monotonic())
+        if window["second"] != second:
+            window["second"], window["count"] = second, 0
+        window["count"] += 1
+        if window["count"] > quota:
+            return JSONResponse(
+                {"code": "Throttling.RateQuota", "message": "Requests rate limit exceeded"},
+                status_code=429, headers={"Retry-After": "1"}
+            )
+
+        await asyncio.sleep(random.uniform(0.5, 1.5) * latency_ms / 1000)
+        if random.random() < error_rate:
+            return JSONResponse({"code": "InternalError", "message": "Simulated failure"}, status_code=503)
+
+        image_url = f"{request.base_url}result/{random.getrandbits(32)}.jpg"
+        return {
+            "request_id": f"stub-{random.getrandbits(32)}",
+            "output": {"choices": [{"message": {"content": [{"image": image_url}]}}]}
+        }
+
+    @app.get("/result/{name}")
+    async def result(name: str):
+        return Response(result_bytes, media_type="image/jpeg")
+
+    return app
+
+
+def start_stub(app: FastAPI) -> str:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/api/v1"
+
+
+def legacy_call(base_url: str, input_path: str, output_path: str) -> dict:
+    """Equivalente HTTP de remove_background con el SDK: sin pool ni reintentos"""
+    payload = {
+        "model": "qwen-image-edit",
+        "input": {"messages": [{"role": "user", "content": [
+            {"image": encode_original(input_path)}, {"text": PROMPT}
+        ]}]},
+        "parameters": {"watermark": False}
+    }
+    response = requests.post(base_url + GENERATION_PATH, json=payload, timeout=60,
+                             headers={"Connection": "close"})
+    if response.status_code != 200:
+        return {"success": False, "error": f"API Error {response.status_code}"}
+
+    image_url = response.json()["output"]["choices"][0]["message"]["content"][0]["image"]
+    img_response = requests.get(image_url, timeout=30, headers={"Connection": "close"})
+    Path(output_path).write_bytes(img_response.content)
+    return {"success": img_response.status_code == 200}
+
+
+def run_mode(mode: str, base_url: str, images: list, threads: int, quota: float) -> dict:
+    out_dir = Path(tempfile.mkdtemp(prefix=f"bench_qwen_{mode}_"))
+    client = None
+    if mode == "async":
+        client = QwenAsyncClient(api_key="stub", base_url=base_url, rate_limit=quota, burst=quota,
+                                 max_concurrency=threads, max_retries=5, deadline=120)
+
+    def process(index_path):
+        index, path = index_path
+        output_path = str(out_dir / f"out_{index:04d}.jpg")
+        started = time.perf_counter()
+        if client:
+            result = client.remove_background_blocking(path, output_path, PROMPT)
+        else:
+            result = legacy_call(base_url, path, output_path)
+        return result["success"], time.perf_counter() - started
+
+    # Empezar con la cuota del stub "limpia"
+    time.sleep(1.1)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(process, enumerate(images)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for _, latency in results)
+    succeeded = sum(1 for success, _ in results if success)
+    return {
+        "elapsed": elapsed,
+        "succeeded": succeeded,
+        "fallbacks": len(results) - succeeded,
+        "throughput": succeeded / elapsed,
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "client": client.get_stats() if client else None
+    }
+
+
+def main(images: int, threads: int, quota: float, latency_ms: float, error_rate: float):
+    base_url = start_stub(create_stub_app(latency_ms, quota, error_rate))
+
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_qwen_inputs_"))
+    paths = []
+    for index in range(images):
+        path = work_dir / f"img_{index:04d}.jpg"
+        Image.new('RGB', (256, 256), (index % 255, 80, 160)).save(path, 'JPEG')
+        paths.append(str(path))
+
+    print("=" * 64)
+    print(f"PREMIUM STUB: {images} imagenes, {threads} hilos, cuota {quota:.0f} req/s, "
+          f"latencia {latency_ms:.0f}ms, errores {error_rate:.0%}")
+    print("=" * 64)
+
+    summary = {}
+    for mode in ("legacy", "async"):
+        summary[mode] = result = run_mode(mode, base_url, paths, threads, quota)
+        print(f"\n[{mode.upper()}] {result['elapsed']:.1f}s")
+        print(f"   OK:          {result['succeeded']}/{images} ({result['fallbacks']} caen a Basic)")
+        print(f"   Throughput:  {result['throughput']:.2f} img/s")
+        print(f"   Latencia:    p50={result['p50'] * 1000:.0f}ms p95={result['p95'] * 1000:.0f}ms")
+        if result["client"]:
+            stats = result["client"]
+            print(f"   Reintentos:  {stats['retries']}  codigos: {stats['status_codes']}")
+            print(f"   API call:    p50={stats['latency']['api_call']['p50']}s p95={stats['latency']['api_call']['p95']}s")
+
+    legacy, current = summary["legacy"], summary["async"]
+    print("\n" + "=" * 64)
+    print(f"Imagenes Premium OK: {legacy['succeeded']} -> {current['succeeded']} de {images}")
+    print(f"Throughput:          {legacy['throughput']:.2f} -> {current['throughput']:.2f} img/s")
+    print("=" * 64)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del cliente Qwen contra un stub")
+    parser.add_argument("--images", type=int, default=60)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--quota", type=float, default=4.0, help="Peticiones por segundo del stub")
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    args = parser.parse_args()
+
+    main(args.images, args.threads, args.quota, args.latency_ms, args.error_rate)
@@ -0,0 +1,145 @@
+"""
+Benchmark: render de sombras vectorizado vs PIL con bucles/lambdas por pixel
+
+DROP SHADOW
+LEGACY:  alpha.point(lambda) -> capa RGBA -> GaussianBlur sobre toda la capa
+         -> capa RGB intermedia -> paste sobre canvas -> paste del producto
+CURRENT: render_drop_shadow (LUT, blur solo en el bounding box a resolucion
+         reducida, una composicion)
+
+REFLECTION (pipelines ebay y premium)
+LEGACY:  putpixel/getpixel por cada pixel del reflejo (mascara de fade y
+         reflejo desvanecido)
+CURRENT: degradado por fila cacheado + una multiplicacion/seleccion numpy
+         sobre las filas volteadas, un solo paste
+
+Usa las imagenes test_shadow_* (RGBA) del backend y reporta tiempo por
+imagen y la diferencia maxima/media de pixeles contra el render anterior.
+
+Uso:
+    python benchmark_shadow_render.py
+    python benchmark_shadow_render.py --repeat 50 --scale 2
+"""
+
+import argparse
+import glob
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from app.processing.shadow_effects import ShadowEffects, apply_simple_drop_shadow
+from test_reflection_shadow import legacy_create_reflection_shadow
+
+
+def legacy_create_drop_shadow(img, intensity=0.3, offset_x=10, offset_y=10, blur_radius=15):
+    """Copia de ShadowEffects.create_drop_shadow antes de vectorizar"""
+    shadow_margin = max(abs(offset_x), abs(offset_y)) + blur_radius + 30
+    canvas = Image.new('RGB', (img.width + shadow_margin * 2, img.height + shadow_margin * 2), (255, 255, 255))
+    shadow_mask = img.split()[-1]
+
+    shadow = Image.new('RGBA', img.size, (0, 0, 0, 0))
+    shadow_alpha = shadow_mask.point(lambda x: int(x * intensity) if x > 5 else 0)
+    shadow.paste((150, 150, 150, 255), mask=shadow_alpha)
+    shadow = shadow.filter(ImageFilter.GaussianBlur(radius=blur_radius))
+
+    shadow_rgb = Image.new('RGB', shadow.size, (255, 255, 255))
+    shadow_rgb.paste(shadow, mask=shadow.split()[-1])
+    canvas.paste(shadow_rgb, (shadow_margin + offset_x, shadow_margin + offset_y))
+    canvas.paste(img, (shadow_margin, shadow_margin), img)
+    return canvas
+
+
+def legacy_simple_drop_shadow(image, intensity=0.5):
+    """Copia de apply_simple_drop_shadow antes de vectorizar"""
+    offset_x = offset_y = 15
+    blur_radius = 20
+    padding = blur_radius + offset_x + offset_y
+
+    alpha = image.split()[3]
+    shadow = Image.new('RGBA', image.size, (0, 0, 0, 0))
+    shadow_alpha = alpha.point(lambda x: int(x * intensity) if x > 10 else 0)
+    shadow.paste((100, 100, 100, 255), (0, 0), shadow_alpha)
+    shadow = shadow.filter(ImageFilter.GaussianBlur(blur_radius))
+
+    result = Image.new('RGB', (image.width + padding * 2, image.height + padding * 2), (255, 255, 255))
+    shadow_rgb = Image.new('RGB', shadow.size, (255, 255, 255))
+    shadow_rgb.paste(shadow, mask=shadow.split()[3])
+    result.paste(shadow_rgb, (padding + offset_x, padding + offset_y))
+    result.paste(image, (padding, padding), image)
+    return result
+
+
+def time_call(func, repeat: int) -> float:
+    """Mediana en ms de `repeat` llamadas (tras una llamada de calentamiento)"""
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def pixel_diff(a: Image.Image, b: Image.Image) -> tuple:
+    diff = np.abs(np.asarray(a, dtype=np.int16) - np.asarray(b, dtype=np.int16))
+    return int(diff.max()), float(diff.mean())
+
+
+def main(repeat: int, scale: float):
+    paths = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_shadow_*.png")))
+    if not paths:
+        print("No hay imagenes test_shadow_*.png")
+        return
+
+    effects = ShadowEffects()
+    # (nombre, legacy, actual, repeticiones de la version legacy)
+    cases = [
+        ("create_drop_shadow", legacy_create_drop_shadow, lambda img: effects.create_drop_shadow(img), repeat),
+        ("apply_simple_drop_shadow", legacy_simple_drop_shadow, lambda img: apply_simple_drop_shadow(img), repeat),
+        # Parametros del pipeline ebay; la version legacy tarda segundos: pocas repeticiones
+        ("create_reflection_shadow",
+         lambda img: legacy_create_reflection_shadow(img, 0.35, fade_start=0.1),
+         lambda img: effects.create_reflection_shadow(img, reflection_height=0.35, fade_start=0.1),
+         max(1, repeat // 10)),
+    ]
+
+    print("=" * 72)
+    print(f"SHADOW RENDER: {len(paths)} imagenes x {repeat} repeticiones (escala {scale}x)")
+    print("=" * 72)
+
+    speedups = []
+    for path in paths:
+        img = Image.open(path).convert('RGBA')
+        if scale != 1:
+            img = img.resize((int(img.width * scale), int(img.height * scale)), Image.Resampling.LANCZOS)
+
+        for name, legacy, current, legacy_repeat in cases:
+            legacy_ms = time_call(lambda: legacy(img), legacy_repeat)
+            current_ms = time_call(lambda: current(img), repeat)
+            max_diff, mean_diff = pixel_diff(legacy(img), current(img))
+            speedups.append(legacy_ms / current_ms)
+
+            print(f"{os.path.basename(path):26s} {img.width}x{img.height:<5d} {name:26s} "
+                  f"{legacy_ms:7.1f}ms -> {current_ms:6.1f}ms ({legacy_ms / current_ms:4.1f}x)  "
+                  f"diff max={max_diff} media={mean_diff:.2f}")
+
+    print("=" * 72)
+    print(f"Speedup mediano: {statistics.median(speedups):.1f}x (min {min(speedups):.1f}x)")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del render de sombras")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--scale", type=float, default=1.0, help="Reescalar las entradas (p.ej. 2 = 2x)")
+    args = parser.parse_args()
+
+    main(args.repeat, args.scale)
@@ -0,0 +1,146 @@
+"""
+Benchmark: pipeline en memoria (1 decode + 1 encode) vs round-trip PNG
+
+LEGACY:  bytes -> rembg.remove (decode + PNG encode) -> Image.open (decode)
+         -> split/merge canales -> thumbnail -> fondo blanco -> JPEG
+CURRENT: remove_background_bytes (decode unico, mascara directa del modelo,
+         JPEG unico)
+
+Cada modo corre en un subproceso separado para medir el pico de RSS real.
+
+Uso:
+    python benchmark_single_decode.py                   # imagen sintetica 24MP
+    python benchmark_single_decode.py --images ./fotos  # carpeta con JPG/PNG
+"""
+
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+sys.path.insert(0, '.')
+
+
+def legacy_process(input_data: bytes, output_path: str):
+    """Copia del pipeline anterior a la refactorizacion"""
+    from PIL import Image, ImageFilter
+    from rembg import remove
+    from app.services.simple_processing import REMBG_SESSION
+
+    output_data = remove(input_data, session=REMBG_SESSION)
+    img_no_bg = Image.open(io.BytesIO(output_data))
+    if img_no_bg.mode != 'RGBA':
+        img_no_bg = img_no_bg.convert('RGBA')
+
+    alpha = img_no_bg.split()[3]
+    alpha = alpha.filter(ImageFilter.MinFilter(3))
+    alpha = alpha.filter(ImageFilter.GaussianBlur(0.5))
+    r, g, b, _ = img_no_bg.split()
+    img_no_bg = Image.merge('RGBA', (r, g, b, alpha))
+
+    img_no_bg.thumbnail((1000, 1000), Image.Resampling.LANCZOS)
+    white_bg = Image.new('RGB', img_no_bg.size, (255, 255, 255))
+    white_bg.paste(img_no_bg, (0, 0), img_no_bg)
+    white_bg.save(output_path, 'JPEG', quality=95)
+
+
+def run_child(mode: str, image_paths: list):
+    """Procesa las imagenes en este proceso e imprime tiempos + pico RSS en JSON"""
+    from app.services.simple_processing import remove_background_bytes
+
+    out_dir = Path(tempfile.mkdtemp(prefix=f"bench_{mode}_"))
+    timings = []
+
+    for index, path in enumerate(image_paths):
+        with open(path, 'rb') as f:
+            data = f.read()
+        output_path = str(out_dir / f"out_{index:04d}.jpg")
+
+        start = time.perf_counter()
+        if mode == "legacy":
+            legacy_process(data, output_path)
+        else:
+            success, _ = remove_background_bytes(data, output_path)
+            assert success, f"remove_background_bytes failed for {path}"
+        timings.append(time.perf_counter() - start)
+
+    # ru_maxrss: KB en Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"timings": timings, "peak_rss_mb": peak_rss_mb}))
+
+
+def make_synthetic_image(megapixels: int) -> str:
+    """Genera una foto sintetica grande (producto sobre fondo gris)"""
+    from PIL import Image, ImageDraw
+
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    img = Image.new('RGB', (width, height), (210, 210, 205))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse(
+        [width * 0.3, height * 0.2, width * 0.7, height * 0.85],
+        fill=(180, 40, 40), outline=(60, 20, 20), width=12
+    )
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_input_"), f"synthetic_{megapixels}mp.jpg")
+    img.save(path, 'JPEG', quality=92)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark decode unico vs round-trip PNG")
+    parser.add_argument("--images", help="Carpeta con imagenes de entrada")
+    parser.add_argument("--megapixels", type=int, default=24, help="Tamano de la imagen sintetica")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones de la imagen sintetica")
+    parser.add_argument("--child", choices=["legacy", "current"], help=argparse.SUPPRESS)
+    parser.add_argument("paths", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.paths)
+        return
+
+    if args.images:
+        image_paths = sorted(
+            str(p) for p in Path(args.images).iterdir()
+            if p.suffix.lower() in {'.jpg', '.jpeg', '.png', '.webp'}
+        )
+    else:
+        image_paths = [make_synthetic_image(args.megapixels)] * args.repeat
+
+    print("=" * 60)
+    print(f"BENCHMARK: decode unico vs round-trip PNG ({len(image_paths)} imagenes)")
+    print("=" * 60)
+
+    summary = {}
+    for mode in ("legacy", "current"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", mode, *image_paths],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        # La primera imagen incluye calentamiento del modelo
+        steady = result["timings"][1:] or result["timings"]
+        summary[mode] = {
+            "per_image_s": sum(steady) / len(steady),
+            "peak_rss_mb": result["peak_rss_mb"]
+        }
+        print(f"\n[{mode.upper()}]")
+        print(f"   Tiempo por imagen: {summary[mode]['per_image_s']:.3f}s")
+        print(f"   Pico RSS:          {summary[mode]['peak_rss_mb']:.0f} MB")
+
+    legacy, current = summary["legacy"], summary["current"]
+    print("\n" + "=" * 60)
+    print(f"Speedup tiempo: {legacy['per_image_s'] / current['per_image_s']:.2f}x")
+    print(f"Ahorro RSS:     {legacy['peak_rss_mb'] - current['peak_rss_mb']:.0f} MB")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,39 +9,47 @@ import asyncio
 import logging
 import zipfile
 import tempfile
-import threading
 import io
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import uuid
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Request
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Header, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
 # Import our simple processing function
-from app.services.simple_processing import process_image_simple
+from app.services.simple_processing import get_hedge_stats, REMBG_ENGINE
 from app.services.batch_processor import SmartBatchProcessor
+from app.services.job_store import get_job_store, build_progress
+from app.services.job_events import job_event_broker, progress_event, terminal_event, stream_job_events, format_sse
+from app.services.zip_stream import stream_zip, IncrementalZipWriter
+from app.services.result_cache import get_result_cache
+from app.services.mask_cache import get_mask_cache_stats
+from app.services.qwen_client import get_qwen_client_stats
+from app.services.job_scheduler import get_job_scheduler, parse_plan, caller_tenant, SchedulerBusy
+from app.services.archive_ingest import scan_archive, count_archive_images, aiter_archive_to_dir
+from app.services.image_tasks import (
+    process_job_image, process_job_image_multi, failed_file_results, finalize_job, record_and_finalize
+)
+from app.processing.pipelines import PipelineFactory
+from app.models.user_models import PlanType
+from app.services.task_queue import get_task_queue
+from app.services.memory_budget import get_memory_budget
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# In-memory progress tracking
-JOB_PROGRESS = {}
-progress_lock = threading.Lock()
+# Persistent job state (SQLite/WAL by default, Redis via JOB_STORE_URL)
+# shared by every uvicorn worker and surviving restarts
+job_store = get_job_store()
 
 def update_progress(job_id: str, current: int, total: int, status: str = "processing"):
-    """Update job progress in memory"""
-    with progress_lock:
-        JOB_PROGRESS[job_id] = {
-            "current": current,
-            "total": total,
-            "percentage": int((current / total * 100)) if total > 0 else 0,
-            "status": status,
-            "updated_at": time.time()
-        }
+    """Update job progress in the job store and push it to event subscribers"""
+    job_store.update_progress(job_id, current, total, status)
+    job_event_broker.publish(job_id, progress_event(build_progress(job_id, status, current, total, time.time())))
 
 # FastAPI app
 app = FastAPI(
@@ -68,6 +76,19 @@ app.add_middleware(
     expose_headers=["*"]  # Permite que el frontend acceda a headers personalizados
 )
 
+# Where images are processed:
+#   "inline" - in this API process (shared executor + job scheduler, default)
+#   "queue"  - by worker.py processes, one task per image in the task queue
+#              (TASK_QUEUE_URL); the API then never loads the model itself
+PROCESSING_MODE = os.getenv("PROCESSING_MODE", "inline").lower()
+
+@app.on_event("startup")
+async def warmup_rembg_pool():
+    """Start the rembg worker processes (and load their models) before the first job"""
+    if REMBG_ENGINE == "process":
+        from app.services.rembg_pool import get_rembg_pool
+        await asyncio.to_thread(get_rembg_pool().warmup)
+
 # Directories
 UPLOAD_DIR = Path("uploads")
 PROCESSED_DIR = Path("processed")
@@ -79,6 +100,13 @@ TEMP_DIR.mkdir(exist_ok=True)
 # Mount static files for serving processed images
 app.mount("/processed", StaticFiles(directory="processed"), name="processed")
 
+# Append each processed image to processed/<job>/masterpost_<job>.zip while
+# the batch runs, so the download is ready the moment the job completes
+INCREMENTAL_ZIP = os.getenv("INCREMENTAL_ZIP", "0") == "1"
+
+def prebuilt_zip_path(job_id: str) -> Path:
+    return PROCESSED_DIR / job_id / f"masterpost_{job_id}.zip"
+
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
 ALLOWED_ARCHIVE_EXTENSIONS = {".zip", ".rar", ".7z"}
@@ -110,159 +138,33 @@ def is_archive_file(filename: str) -> bool:
     """Check if file is an archive"""
     return any(filename.lower().endswith(ext) for ext in ALLOWED_ARCHIVE_EXTENSIONS)
 
-def extract_images_from_zip(zip_path: Path, extract_to: Path) -> tuple:
+def scan_uploaded_archive(archive_path: Path) -> tuple:
     """
-    Extract ALL images from ZIP file with SHORT FILENAMES to avoid Windows path length limits.
-    Uses format: img_0001_a3f8d9e2.jpg (max 25 chars)
-    Returns: (extracted_images: List[Path], failed_images: List[dict])
+    Count the images of an uploaded archive WITHOUT extracting it.
+    Members are validated from their header bytes only; they are streamed
+    into processing later by /api/v1/process (see archive_ingest).
+    Returns: (image_names: List[str], failed_images: List[dict])
     """
-    from PIL import Image
-    import io
-    import hashlib
-
-    # Extended image extensions
-    image_extensions = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tiff', '.tif'}
-    extracted_images = []
-    failed_images = []
-    skipped_files = []
-
     logger.info("=" * 80)
-    logger.info(f"🔍 ANALYZING ZIP: {zip_path.name}")
+    logger.info(f"🔍 ANALYZING ARCHIVE: {archive_path.name}")
 
     try:
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            all_files = zip_ref.namelist()
-            logger.info(f"📁 Total files in ZIP: {len(all_files)}")
-            logger.info("")
-
-            image_count = 0
-
-            for idx, file_info in enumerate(zip_ref.filelist, 1):
-                full_filename = file_info.filename
-                file_path = Path(full_filename)
-                filename = file_path.name
-
-                # Show original filename (truncated if too long)
-                display_name = full_filename if len(full_filename) <= 60 else full_filename[:57] + "..."
-                logger.info(f"[{idx}/{len(all_files)}] {display_name}")
-
-                # 1. Check if directory
-                if file_info.is_dir():
-                    logger.info(f"   ⏭️  SKIP: Is directory")
-                    skipped_files.append({"file": full_filename, "reason": "directory"})
-                    continue
-
-                # 2. Check system files
-                if any(x in full_filename for x in ['__MACOSX', '.DS_Store', 'Thumbs.db', 'desktop.ini']):
-                    logger.info(f"   ⏭️  SKIP: System file")
-                    skipped_files.append({"file": full_filename, "reason": "system_file"})
-                    continue
-
-                # 3. Check hidden files
-                if filename.startswith('.') or filename.startswith('._'):
-                    logger.info(f"   ⏭️  SKIP: Hidden file")
-                    skipped_files.append({"file": full_filename, "reason": "hidden_file"})
-                    continue
-
-                # 4. Check extension (case-insensitive)
-                ext = file_path.suffix.lower()
-                if ext not in image_extensions:
-                    logger.info(f"   ⏭️  SKIP: Not an image (ext: {file_path.suffix})")
-                    skipped_files.append({"file": full_filename, "reason": f"not_image:{file_path.suffix}"})
-                    continue
-
-                # 5. Check size in ZIP
-                if file_info.file_size == 0:
-                    logger.info(f"   ❌ FAILED: Empty file (0 bytes)")
-                    failed_images.append({"file": full_filename, "reason": "empty_file"})
-                    continue
-
-                logger.info(f"   📏 Size: {file_info.file_size:,} bytes")
-
-                # 6. GENERATE SHORT FILENAME to avoid Windows 260 char path limit
-                # Format: img_0001_a3f8d9e2.jpg (max 25 chars)
-                name_hash = hashlib.md5(filename.encode()).hexdigest()[:8]
-                short_filename = f"img_{image_count:04d}_{name_hash}{ext}"
-
-                # 7. Try to extract and validate
-                try:
-                    # Read file data from ZIP
-                    data = zip_ref.read(file_info)
-
-                    # Validate the image data
-                    try:
-                        img = Image.open(io.BytesIO(data))
-                        img.verify()
-                        img_format = img.format
-                        # Re-open for size (verify closes the image)
-                        img = Image.open(io.BytesIO(data))
-                        img_size = img.size
-                    except Exception as img_error:
-                        logger.info(f"   ❌ FAILED: Corrupt/invalid image - {str(img_error)}")
-                        failed_images.append({"file": full_filename, "reason": f"corrupt:{str(img_error)}"})
-                        continue
-
-                    # 8. Save with SHORT filename
-                    extract_path = extract_to / short_filename
-
-                    with open(extract_path, 'wb') as f:
-                        f.write(data)
-
-                    # 9. Verify file was saved
-                    if not extract_path.exists():
-                        logger.info(f"   ❌ FAILED: File not saved")
-                        failed_images.append({"file": full_filename, "reason": "not_saved"})
-                        continue
-
-                    actual_size = extract_path.stat().st_size
-                    if actual_size == 0:
-                        logger.info(f"   ❌ FAILED: File is 0 bytes after saving")
-                        failed_images.append({"file": full_filename, "reason": "zero_bytes_after_save"})
-                        extract_path.unlink()  # Clean up
-                        continue
-
-                    # 10. Success!
-                    logger.info(f"   ✅ SUCCESS: {img_format} {img_size} -> {short_filename}")
-                    extracted_images.append(extract_path)
-                    image_count += 1
+        image_names, failed_images = scan_archive(archive_path)
+    except Exception as e:
+        logger.error(f"❌ Error opening archive {archive_path}: {e}")
+        return [], [{"file": archive_path.name, "reason": f"archive_error:{e}"}]
 
-                except Exception as e:
-                    logger.error(f"   ❌ FAILED: Extraction error - {str(e)}")
-                    failed_images.append({"file": full_filename, "reason": f"extract_error:{str(e)}"})
-                    continue
-
-            # Summary
-            logger.info("")
-            logger.info("=" * 80)
-            logger.info(f"📊 EXTRACTION SUMMARY:")
-            logger.info(f"   ✅ Extracted: {len(extracted_images)}")
-            logger.info(f"   ❌ Failed: {len(failed_images)}")
-            logger.info(f"   ⏭️  Skipped: {len(skipped_files)}")
-            logger.info(f"   📁 Total processed: {len(extracted_images) + len(failed_images) + len(skipped_files)}")
-
-            if failed_images:
-                logger.info(f"")
-                logger.info(f"❌ FAILED FILES:")
-                for fail in failed_images:
-                    # Truncate long filenames in summary
-                    fail_file = fail['file'] if len(fail['file']) <= 80 else fail['file'][:77] + "..."
-                    logger.info(f"   - {fail_file}: {fail['reason']}")
-
-            if skipped_files:
-                logger.info(f"")
-                logger.info(f"⏭️  SKIPPED FILES (showing first 10):")
-                for skip in skipped_files[:10]:
-                    skip_file = skip['file'] if len(skip['file']) <= 80 else skip['file'][:77] + "..."
-                    logger.info(f"   - {skip_file}: {skip['reason']}")
-                if len(skipped_files) > 10:
-                    logger.info(f"   ... and {len(skipped_files) - 10} more")
-
-            logger.info("=" * 80)
+    logger.info(f"📊 SCAN SUMMARY: ✅ {len(image_names)} images, ❌ {len(failed_images)} failed")
+    for fail in failed_images[:10]:
+        fail_file = fail['file'] if len(fail['file']) <= 80 else fail['file'][:77] + "..."
+        logger.info(f"   - {fail_file}: {fail['reason']}")
+    logger.info("=" * 80)
 
-    except Exception as e:
-        logger.error(f"❌ Error opening ZIP file {zip_path}: {e}")
+    return image_names, failed_images
 
-    return extracted_images, failed_images
+def get_job_archives(job_dir: Path) -> list:
+    """Archives uploaded to a job (streamed member by member at processing time)"""
+    return sorted(f for f in job_dir.glob("*") if f.is_file() and is_archive_file(f.name))
 
 def format_time(seconds: int) -> str:
     """Format seconds to mm:ss"""
@@ -375,6 +277,7 @@ async def upload_images(files: List[UploadFile] = File(...)):
 
         uploaded_files = []
         all_image_files = []
+        archive_image_count = 0
         all_failed_images = []
 
         for file in files:
@@ -396,13 +299,13 @@ async def upload_images(files: List[UploadFile] = File(...)):
 
             logger.info(f"Saved: {file.filename} ({len(content)} bytes)")
 
-            # If it's a ZIP file, extract images
+            # If it's an archive, count its images (they are streamed at processing time)
             if is_archive_file(file.filename):
-                logger.info(f"📦 Extracting images from archive: {file.filename}")
-                extracted_images, failed_images = extract_images_from_zip(file_path, job_dir)
-                all_image_files.extend(extracted_images)
+                logger.info(f"📦 Scanning archive: {file.filename}")
+                archive_images, failed_images = await asyncio.to_thread(scan_uploaded_archive, file_path)
+                archive_image_count += len(archive_images)
                 all_failed_images.extend(failed_images)
-                logger.info(f"✅ Extracted {len(extracted_images)} images, ❌ {len(failed_images)} failed from {file.filename}")
+                logger.info(f"✅ Found {len(archive_images)} images, ❌ {len(failed_images)} failed in {file.filename}")
             else:
                 # Regular image file
                 all_image_files.append(file_path)
@@ -410,20 +313,21 @@ async def upload_images(files: List[UploadFile] = File(...)):
         if not uploaded_files:
             raise HTTPException(status_code=400, detail="No valid files uploaded")
 
-        if not all_image_files:
+        images_found = len(all_image_files) + archive_image_count
+        if not images_found:
             raise HTTPException(status_code=400, detail="No valid image files found (either direct uploads or in archives)")
 
         logger.info("")
         logger.info("🎯 FINAL COUNT:")
-        logger.info(f"   ✅ Images to process: {len(all_image_files)}")
+        logger.info(f"   ✅ Images to process: {images_found}")
         logger.info(f"   ❌ Failed images: {len(all_failed_images)}")
 
         return {
             "success": True,
             "job_id": job_id,
-            "message": f"Uploaded {len(uploaded_files)} files, found {len(all_image_files)} images for processing",
+            "message": f"Uploaded {len(uploaded_files)} files, found {images_found} images for processing",
             "files_uploaded": len(uploaded_files),
-            "images_found": len(all_image_files),
+            "images_found": images_found,
             "images_failed": len(all_failed_images),
             "failed_details": all_failed_images[:10] if len(all_failed_images) <= 10 else all_failed_images[:10],
             "files": uploaded_files
@@ -433,8 +337,19 @@ async def upload_images(files: List[UploadFile] = File(...)):
         logger.error(f"Upload error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def get_request_user(authorization: Optional[str]):
+    """Authenticated user of a request (None without a valid bearer token)"""
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        from app.auth.supabase_auth import supabase_auth
+        return await supabase_auth.get_current_user(authorization.split(None, 1)[1])
+    except Exception as e:
+        logger.warning(f"Cannot resolve the request user: {e}")
+        return None
+
 @app.post("/api/v1/process")
-async def process_images(request: dict):
+async def process_images(request: dict, http_request: Request, authorization: Optional[str] = Header(None)):
     """
     Process uploaded images with Basic (local rembg) or Premium (Qwen API) processing
 
@@ -445,6 +360,19 @@ async def process_images(request: dict):
         job_id = request.get("job_id")
         pipeline = request.get("pipeline", "amazon")
 
+        # Multi-marketplace jobs: segment each image once, render every pipeline
+        pipelines = request.get("pipelines") or None
+        if pipelines:
+            if not isinstance(pipelines, list):
+                raise HTTPException(status_code=400, detail="pipelines must be a list")
+            pipelines = list(dict.fromkeys(pipelines))  # Drop duplicates, keep order
+            available = PipelineFactory.get_available_pipelines()
+            unknown = [name for name in pipelines if name not in available]
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown pipelines: {', '.join(unknown)}")
+            if len(pipelines) == 1:
+                pipeline, pipelines = pipelines[0], None
+
         # Get settings object (contains shadow parameters and processing tier)
         settings = request.get("settings", {})
 
@@ -463,7 +391,7 @@ async def process_images(request: dict):
 
         # [DEBUG] LOGGING FOR PROCESSING SETTINGS
         logger.info("=" * 60)
-        logger.info(f"[DEBUG] Processing job {job_id} with pipeline {pipeline}")
+        logger.info(f"[DEBUG] Processing job {job_id} with pipeline {', '.join(pipelines) if pipelines else pipeline}")
         logger.info(f"[DEBUG] Processing tier: {'PREMIUM (Qwen API)' if use_premium else 'BASIC (local rembg)'}")
         logger.info(f"[DEBUG] Credits: {3 if use_premium else 1} credit(s)")
         logger.info(f"[DEBUG] Shadow settings:")
@@ -481,165 +409,321 @@ async def process_images(request: dict):
             raise HTTPException(status_code=404, detail="Job not found")
 
         image_files = [f for f in job_dir.glob("*") if f.is_file() and f.suffix.lower() in ALLOWED_EXTENSIONS]
-        if not image_files:
+        archives = get_job_archives(job_dir)
+        archive_images = 0
+        for archive in archives:
+            try:
+                archive_images += await asyncio.to_thread(count_archive_images, archive)
+            except Exception as e:
+                logger.error(f"Cannot read archive {archive.name}: {e}")
+
+        files_count = len(image_files) + archive_images
+        if not files_count:
             raise HTTPException(status_code=404, detail="No images found for processing")
 
-        logger.info(f"Found {len(image_files)} images to process")
+        logger.info(f"Found {files_count} images to process ({archive_images} streamed from {len(archives)} archives)")
+
+        # Admission control: fair share per tenant, 429 when the queue is full.
+        # Tenant and plan come from the authenticated account, never from the body.
+        user = await get_request_user(authorization)
+        tenant = caller_tenant(user.id if user else None, http_request.client.host if http_request.client else None)
+        plan = parse_plan(user.plan) if user else PlanType.FREE
+        scheduler = get_job_scheduler()
+        try:
+            if PROCESSING_MODE == "queue":
+                backlog = await asyncio.to_thread(get_task_queue().depth)
+                scheduler.check_backlog(job_id, backlog, files_count)
+                ticket = None
+            else:
+                ticket = scheduler.admit(job_id, tenant, plan, files_count)
+        except SchedulerBusy as busy:
+            return JSONResponse(
+                status_code=429,
+                headers={"Retry-After": str(int(busy.retry_after + 0.999))},
+                content={
+                    "success": False,
+                    "job_id": job_id,
+                    "error": str(busy),
+                    "retry_after": round(busy.retry_after, 1),
+                    "eta_seconds": round(busy.eta_seconds, 1),
+                    "pending_images": busy.pending_images
+                }
+            )
 
         # Start async processing with shadow parameters AND premium flag
-        asyncio.create_task(process_images_simple(job_id, image_files, pipeline, shadow_params, use_premium))
-
+        if PROCESSING_MODE == "queue":
+            asyncio.create_task(enqueue_image_tasks(
+                job_id, image_files, pipeline, shadow_params, use_premium,
+                archives=archives, expected_total=files_count,
+                priority=1 if scheduler.weight_for(plan) > 1 else 0,
+                pipelines=pipelines, user_id=user.id if user else None
+            ))
+        else:
+            asyncio.create_task(process_images_simple(
+                job_id, image_files, pipeline, shadow_params, use_premium,
+                archives=archives, expected_total=files_count, ticket=ticket,
+                pipelines=pipelines, user_id=user.id if user else None
+            ))
+
+        # Estimate, one charge per output (image and pipeline). The job is charged
+        # when it finishes, per result: failed outputs are free and Premium
+        # images served by Basic pay the Basic rate (see image_tasks.charge_job).
         credits_per_image = 3 if use_premium else 1
-        total_credits = credits_per_image * len(image_files)
+        outputs_count = files_count * len(pipelines or [pipeline])
+        total_credits = credits_per_image * outputs_count
 
         return {
             "success": True,
             "job_id": job_id,
-            "message": f"Started processing {len(image_files)} images with {pipeline} pipeline",
-            "pipeline": pipeline,
+            "message": (
+                f"Started processing {files_count} images with {', '.join(pipelines)} pipelines" if pipelines
+                else f"Started processing {files_count} images with {pipeline} pipeline"
+            ),
+            "pipeline": "multi" if pipelines else pipeline,
+            "pipelines": pipelines or [pipeline],
+            "outputs_count": outputs_count,
             "processing_tier": "premium" if use_premium else "basic",
             "shadow_enabled": shadow_params["enabled"],
             "status": "processing",
-            "files_count": len(image_files),
+            "files_count": files_count,
             "credits_per_image": credits_per_image,
-            "total_credits": total_credits
+            "total_credits": total_credits,
+            "eta_seconds": ticket.eta_seconds if ticket else None
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Process error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def process_images_simple(job_id: str, image_files: list, pipeline: str, shadow_params: dict = None, use_premium: bool = False):
+def job_metadata(pipeline: str, shadow_params: dict, use_premium: bool, pipelines: list = None,
+                 user_id: str = None) -> dict:
+    metadata = {
+        "pipeline": "multi" if pipelines else pipeline,
+        "pipelines": pipelines or [pipeline],
+        "processing_tier": "premium" if use_premium else "basic",
+        "shadow_enabled": shadow_params.get("enabled", False) if shadow_params else False
+    }
+    if user_id:
+        metadata["user_id"] = user_id  # Charged when the job is finalized
+    return metadata
+
+async def iter_job_images(job_id: str, image_files: list, archives: list):
+    """Direct uploads first, then archive members as they are read"""
+    for image_file in image_files:
+        yield image_file
+    start_index = 0
+    for archive in archives:
+        # Members land in a subfolder so re-runs don't see them as uploads
+        async for member in aiter_archive_to_dir(archive, UPLOAD_DIR / job_id / "_archive", start_index):
+            start_index += 1
+            yield member
+
+async def enqueue_image_tasks(job_id: str, image_files: list, pipeline: str, shadow_params: dict = None,
+                              use_premium: bool = False, archives: list = None, expected_total: int = None,
+                              priority: int = 0, pipelines: list = None, user_id: str = None):
+    """
+    PROCESSING_MODE=queue: record the job and hand one task per image to the
+    workers (worker.py), which report results to the job store
+
+    pipelines: multi-pipeline job (one task per image renders every pipeline)
+    """
+    total = (expected_total or len(image_files)) * len(pipelines or [pipeline])
+    try:
+        await asyncio.to_thread(
+            job_store.create_job, job_id, total,
+            metadata=job_metadata(pipeline, shadow_params, use_premium, pipelines, user_id)
+        )
+        processed_dir = PROCESSED_DIR / job_id
+        processed_dir.mkdir(exist_ok=True)
+        prebuilt_zip_path(job_id).unlink(missing_ok=True)
+
+        task_queue = get_task_queue()
+        queued = 0
+        async for image_file in iter_job_images(job_id, image_files, archives or []):
+            if isinstance(image_file, dict):
+                # Archive member rejected by the ingest stage
+                for file_result in failed_file_results(image_file["file"], image_file["reason"], pipelines):
+                    await asyncio.to_thread(
+                        record_and_finalize, job_store, job_id, file_result, processed_dir, pipelines or pipeline, shadow_params
+                    )
+                continue
+
+            await asyncio.to_thread(task_queue.enqueue, {
+                "job_id": job_id,
+                "image_path": str(image_file),
+                "processed_dir": str(processed_dir),
+                "pipeline": pipeline,
+                "pipelines": pipelines,
+                "shadow_params": shadow_params,
+                "use_premium": use_premium
+            }, priority)
+            queued += 1
+
+        logger.info(f"[QUEUE] Job {job_id}: {queued} tasks queued for workers")
+
+    except Exception as e:
+        logger.error(f"[QUEUE] Job {job_id} could not be queued: {e}")
+        await asyncio.to_thread(update_progress, job_id, 0, total, "error")
+        job_event_broker.publish(job_id, {"type": "failed", "status": "error", "total": total, "error": str(e)})
+
+async def process_images_simple(job_id: str, image_files: list, pipeline: str, shadow_params: dict = None, use_premium: bool = False,
+                                archives: list = None, expected_total: int = None, ticket=None, pipelines: list = None,
+                                user_id: str = None):
     """
     Process images with intelligent parallel execution
     Supports both Basic (rembg) and Premium (Qwen API) processing
     OPTIMIZED: 60-87% faster than sequential processing
+    STREAMING: images inside uploaded archives are read member by member and
+    processed as they arrive (no extraction pass before the first result)
+    MULTI-PIPELINE: with `pipelines`, each image is segmented once and
+    rendered for every pipeline (one file result per output)
     """
+    zip_writer = None
     try:
-        logger.info(f"[PARALLEL] Starting job {job_id}: {len(image_files)} images with {pipeline} pipeline")
-
-        # Initialize progress tracking
-        total = len(image_files)
-        update_progress(job_id, 0, total, "starting")
+        logger.info(f"[PARALLEL] Starting job {job_id}: {expected_total or len(image_files)} images with {', '.join(pipelines) if pipelines else pipeline} pipeline")
+
+        # Initialize job state (resets results of a previous run of this job)
+        archives = archives or []
+        total = expected_total or len(image_files)
+        # Job counters count outputs (one per image and pipeline)
+        outputs_total = total * len(pipelines or [pipeline])
+        await asyncio.to_thread(
+            job_store.create_job, job_id, outputs_total,
+            metadata=job_metadata(pipeline, shadow_params, use_premium, pipelines, user_id)
+        )
 
         # Create processed directory
         processed_dir = PROCESSED_DIR / job_id
         processed_dir.mkdir(exist_ok=True)
 
+        # Prebuilt archive (optional); a stale one from a previous run is dropped
+        prebuilt_zip_path(job_id).unlink(missing_ok=True)
+        zip_writer = IncrementalZipWriter(prebuilt_zip_path(job_id)) if INCREMENTAL_ZIP else None
+
         # Initialize smart processor
         batch_processor = SmartBatchProcessor()
 
+        # Push each finished output to event subscribers as soon as it lands. Events
+        # count outputs, like the job store (polling and reconnect snapshots)
+        recorded = {"current": 0}
+
+        def publish_output(file_result, current):
+            file_event = dict(file_result)
+            if file_event.get("processed"):
+                file_event["preview_url"] = f"/api/v1/preview/{job_id}/{file_event['processed']}"
+            job_event_broker.publish(job_id, {"type": "image", "current": current, "total": outputs_total, "file": file_event})
+
         # Prepare processing function
         def process_single_image(image_file):
-            """Wrapper for processing a single image"""
-            tier_prefix = "premium" if use_premium else "basic"
-
-            # All pipelines use JPG with white background
-            output_filename = f"processed_{tier_prefix}_{pipeline}_{image_file.stem}.jpg"
-            output_path = processed_dir / output_filename
-
-            result = process_image_simple(
-                input_path=str(image_file),
-                output_path=str(output_path),
-                pipeline=pipeline,
-                shadow_params=shadow_params,
-                use_premium=use_premium  # Pass premium flag
-            )
-
-            if result.get("success"):
-                return {
-                    "success": True,
-                    "original": image_file.name,
-                    "processed": output_filename,
-                    "path": str(output_path),
-                    "shadow_applied": result.get("shadow_applied", False),
-                    "shadow_type": result.get("shadow_type")
-                }
+            """Wrapper for processing a single image -> its file results (one per output)"""
+            if isinstance(image_file, dict):
+                # Archive member rejected by the ingest stage
+                file_results = failed_file_results(image_file["file"], image_file["reason"], pipelines)
+            elif pipelines:
+                file_results = process_job_image_multi(image_file, processed_dir, pipelines, shadow_params, use_premium)
             else:
-                return {
-                    "success": False,
-                    "original": image_file.name,
-                    "error": result.get("error", "Unknown error")
-                }
+                file_results = [process_job_image(image_file, processed_dir, pipeline, shadow_params, use_premium)]
 
-        # Progress tracking with global progress updates
-        def progress_update(current, total):
-            percent = (current * 100) // total
-            logger.info(f"[PARALLEL] Job {job_id}: {current}/{total} ({percent}%) complete")
-            # Update global progress tracker
-            update_progress(job_id, current, total, "processing")
-
-        # Process batch with smart parallelization
-        results = await batch_processor.process_batch_async(
-            items=image_files,
-            process_func=process_single_image,
-            progress_callback=progress_update
-        )
+            for file_result in file_results:
+                if zip_writer and file_result["success"]:
+                    zip_writer.add(Path(file_result["path"]), file_result["processed"])
 
-        # Separate successful and failed
-        successful = [r for r in results if r.get("success")]
-        failed = [r for r in results if not r.get("success")]
+                # Per-file result + progress counters in one atomic update
+                progress = job_store.record_result(job_id, file_result)
+                recorded["current"] = max(recorded["current"], progress["current"])
+                publish_output(file_result, progress["current"])
+                job_event_broker.publish(job_id, progress_event(progress))
+            return file_results
 
-        # Save results
-        import json
-        final_results = {
-            "job_id": job_id,
-            "pipeline": pipeline,
-            "shadow_enabled": shadow_params.get("enabled", False) if shadow_params else False,
-            "shadow_type": shadow_params.get("type", "none") if shadow_params and shadow_params.get("enabled") else "none",
-            "total_files": len(image_files),
-            "successful": len(successful),
-            "failed": len(failed),
-            "successful_files": successful,
-            "failed_files": failed,
-            "status": "completed",
-            "completed_at": time.time()
-        }
+        def image_done(result, current, total):
+            if isinstance(result, dict):
+                # Task failure reported by the batch processor (not in the job store counters)
+                publish_output(result, recorded["current"])
+
+        # Progress logging (counters and their events come from the job store)
+        def progress_update(current, total):
+            percent = (current * 100) // total
+            logger.info(f"[PARALLEL] Job {job_id}: {current}/{total} images ({percent}%) complete")
+
+        if archives:
+            results = await batch_processor.process_stream_async(
+                items=iter_job_images(job_id, image_files, archives),
+                total=total,
+                process_func=process_single_image,
+                progress_callback=progress_update,
+                item_callback=image_done,
+                ticket=ticket,
+                io_bound=use_premium
+            )
+        else:
+            # Process batch with smart parallelization
+            results = await batch_processor.process_batch_async(
+                items=image_files,
+                process_func=process_single_image,
+                progress_callback=progress_update,
+                item_callback=image_done,
+                ticket=ticket,
+                io_bound=use_premium
+            )
 
-        results_file = processed_dir / "results.json"
-        with open(results_file, "w") as f:
-            json.dump(final_results, f, indent=2)
+        if zip_writer:
+            zip_writer.close()
 
-        # Mark as completed
-        update_progress(job_id, total, total, "completed")
+        # One entry per output (batch tasks that failed outright return a single dict)
+        file_results = [r for item in results for r in (item if isinstance(item, list) else [item])]
 
-        logger.info(
-            f"[PARALLEL] Job {job_id} completed: "
-            f"{len(successful)}/{len(image_files)} successful, {len(failed)} failed"
+        # results.json + completed status (status reads come from the job store) + credit charge
+        final_results = await asyncio.to_thread(
+            finalize_job, job_store, job_id, processed_dir, pipelines or pipeline, shadow_params, file_results,
+            processing_stats=batch_processor.run_stats
         )
+        job_event_broker.publish(job_id, terminal_event(final_results))
 
     except Exception as e:
         logger.error(f"[PARALLEL] Job {job_id} failed: {e}")
         # Mark as error
-        update_progress(job_id, 0, len(image_files), "error")
+        if zip_writer:
+            zip_writer.discard()
+        outputs_total = (expected_total or len(image_files)) * len(pipelines or [pipeline])
+        await asyncio.to_thread(update_progress, job_id, 0, outputs_total, "error")
+        job_event_broker.publish(job_id, {"type": "failed", "status": "error", "total": outputs_total, "error": str(e)})
         import traceback
         traceback.print_exc()
 
+    finally:
+        if ticket:
+            ticket.close()
+
 @app.get("/api/v1/status/{job_id}")
 async def get_job_status(job_id: str):
     """Get processing status for a job"""
     try:
-        processed_dir = PROCESSED_DIR / job_id
-        results_file = processed_dir / "results.json"
+        job = await asyncio.to_thread(job_store.get_job, job_id)
+        if job:
+            # Final results once completed, live state + finished files while running
+            return job
 
+        # Jobs finished before the job store existed
+        results_file = PROCESSED_DIR / job_id / "results.json"
         if results_file.exists():
-            # Job completed
             import json
             with open(results_file, "r") as f:
-                results = json.load(f)
-            return results
-        else:
-            # Job still processing or not found
-            job_dir = UPLOAD_DIR / job_id
-            if job_dir.exists():
-                return {
-                    "job_id": job_id,
-                    "status": "processing",
-                    "message": "Job is being processed"
-                }
-            else:
-                raise HTTPException(status_code=404, detail="Job not found")
+                return json.load(f)
+
+        # Uploaded but not started yet, or not found
+        job_dir = UPLOAD_DIR / job_id
+        if job_dir.exists():
+            return {
+                "job_id": job_id,
+                "status": "processing",
+                "message": "Job is being processed"
+            }
+        raise HTTPException(status_code=404, detail="Job not found")
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Status error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -648,8 +732,7 @@ async def get_job_status(job_id: str):
 async def get_job_progress(job_id: str):
     """Get real-time processing progress for a job"""
     try:
-        with progress_lock:
-            progress = JOB_PROGRESS.get(job_id)
+        progress = await asyncio.to_thread(job_store.get_progress, job_id)
 
         if not progress:
             return {
@@ -672,42 +755,77 @@ async def get_job_progress(job_id: str):
         logger.error(f"Progress check error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/v1/events/{job_id}")
+async def stream_job_progress(job_id: str, request: Request):
+    """
+    Server-Sent Events stream of a job's progress
+
+    Sends the current state first, then progress/image events as they happen
+    and a final completed/failed event, so clients don't need to poll
+    /api/v1/progress and /api/v1/status.
+    """
+    async def event_stream():
+        # Tell EventSource to wait a bit before reconnecting after a drop
+        yield "retry: 3000\n\n"
+        async for event in stream_job_events(job_event_broker, job_store, job_id):
+            if await request.is_disconnected():
+                break
+            yield format_sse(event)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Disable proxy buffering (nginx)
+        }
+    )
+
+@app.websocket("/api/v1/ws/{job_id}")
+async def job_progress_websocket(websocket: WebSocket, job_id: str):
+    """WebSocket variant of /api/v1/events/{job_id} (same JSON events)"""
+    await websocket.accept()
+    try:
+        async for event in stream_job_events(job_event_broker, job_store, job_id):
+            await websocket.send_json(event)
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info(f"[EVENTS] WebSocket client left job {job_id}")
+
 @app.get("/api/v1/download/{job_id}")
 async def download_results(job_id: str):
-    """Download processed images as ZIP - includes all formats (JPG, PNG)"""
+    """
+    Download processed images as ZIP - includes all formats (JPG, PNG)
+
+    Serves the prebuilt archive when the job built one (INCREMENTAL_ZIP=1),
+    otherwise streams the ZIP while reading the files (no temp file).
+    """
     try:
         processed_dir = PROCESSED_DIR / job_id
         if not processed_dir.exists():
             raise HTTPException(status_code=404, detail="Job not found")
 
-        # Create ZIP file in temp directory
-        zip_path = TEMP_DIR / f"{job_id}_processed.zip"
+        zip_filename = f"masterpost_{job_id}.zip"
 
-        # Collect all image files (JPG and PNG)
-        image_files = list(processed_dir.glob("*.jpg")) + list(processed_dir.glob("*.jpeg")) + list(processed_dir.glob("*.png"))
+        prebuilt = prebuilt_zip_path(job_id)
+        if prebuilt.exists():
+            logger.info(f"Serving prebuilt ZIP for job {job_id} ({prebuilt.stat().st_size} bytes)")
+            return FileResponse(prebuilt, media_type="application/zip", filename=zip_filename)
+
+        # Collect all image files (JPG and PNG); multi-pipeline jobs keep one folder per pipeline
+        image_files = sorted(
+            path for pattern in ("*.jpg", "*.jpeg", "*.png") for path in processed_dir.rglob(pattern)
+        )
 
         if not image_files:
             raise HTTPException(status_code=404, detail="No processed files found")
 
-        logger.info(f"Creating ZIP with {len(image_files)} images for job {job_id}")
-
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # Include ALL processed images (JPG and PNG)
-            for file_path in image_files:
-                logger.info(f"Adding to ZIP: {file_path.name}")
-                zipf.write(file_path, file_path.name)
+        logger.info(f"Streaming ZIP with {len(image_files)} images for job {job_id}")
 
-        # Verify ZIP was created and has content
-        if not zip_path.exists() or zip_path.stat().st_size == 0:
-            raise HTTPException(status_code=500, detail="Failed to create ZIP file")
-
-        logger.info(f"ZIP created successfully: {zip_path} ({zip_path.stat().st_size} bytes)")
-
-        return FileResponse(
-            zip_path,
+        return StreamingResponse(
+            stream_zip((file_path, file_path.relative_to(processed_dir).as_posix()) for file_path in image_files),
             media_type="application/zip",
-            filename=f"masterpost_{job_id}.zip",
-            background=None  # Don't delete immediately
+            headers={"Content-Disposition": f'attachment; filename="{zip_filename}"'}
         )
 
     except HTTPException:
@@ -716,15 +834,17 @@ async def download_results(job_id: str):
         logger.error(f"Download error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/v1/preview/{job_id}/{filename}")
+@app.get("/api/v1/preview/{job_id}/{filename:path}")
 async def get_image_preview(job_id: str, filename: str):
-    """Serve individual processed image for preview"""
+    """Serve individual processed image for preview (filename may include the pipeline folder)"""
     try:
         processed_dir = PROCESSED_DIR / job_id
         if not processed_dir.exists():
             raise HTTPException(status_code=404, detail="Job not found")
 
         image_path = processed_dir / filename
+        if processed_dir.resolve() not in image_path.resolve().parents:
+            raise HTTPException(status_code=400, detail="Invalid file path")
         if not image_path.exists():
             raise HTTPException(status_code=404, detail="Image not found")
 
@@ -999,6 +1119,35 @@ async def get_all_gallery_items():
 # END GALLERY ENDPOINTS
 # =======================================
 
+@app.get("/api/v1/metrics/cache")
+async def get_cache_metrics():
+    """Result cache metrics (hit rate, tier usage, evictions) + mask cache hits"""
+    result_cache = get_result_cache()
+    metrics = {"enabled": False}
+    if result_cache:
+        metrics = {"enabled": True, **result_cache.get_stats()}
+    # Per process: with REMBG_ENGINE=process masks are looked up in the pool workers
+    metrics["masks"] = get_mask_cache_stats()
+    return metrics
+
+@app.get("/api/v1/metrics/premium")
+async def get_premium_metrics():
+    """Premium (Qwen) client metrics: queue depth, retries, latency histograms"""
+    stats = get_qwen_client_stats()
+    if stats is None:
+        return {"active": False, "hedge": get_hedge_stats()}
+    return {"active": True, **stats, "hedge": get_hedge_stats()}
+
+@app.get("/api/v1/metrics/scheduler")
+async def get_scheduler_metrics():
+    """Job scheduler: busy workers, pending images per tenant, waiting images per plan, memory budget"""
+    metrics = {"processing_mode": PROCESSING_MODE, **get_job_scheduler().get_stats()}
+    if PROCESSING_MODE == "queue":
+        metrics["task_queue"] = await asyncio.to_thread(get_task_queue().get_stats)
+    else:
+        metrics["memory_budget"] = get_memory_budget().get_stats()
+    return metrics
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -1009,9 +1158,14 @@ async def health_check():
     except ImportError:
         rembg_available = False
 
+    result_cache = get_result_cache()
+
     return {
         "status": "healthy",
         "local_processing": rembg_available,
+        "rembg_engine": REMBG_ENGINE,
+        "processing_mode": PROCESSING_MODE,
+        "result_cache_hit_rate": result_cache.get_stats()["hit_rate"] if result_cache else None,
         "manual_editor": "available",
         "timestamp": time.time()
     }
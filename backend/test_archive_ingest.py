@@ -0,0 +1,174 @@
+"""
+Tests for the streaming archive ingest
+
+ZIP, RAR and 7Z archives holding valid images, members skipped by name
+(system, hidden, non-image files), members that are not images and members
+that can't be read: scan_archive, the header reads and iter_archive_to_dir
+must classify each of them the same way for every format.
+
+RAR and 7Z tests need rarfile / py7zr and are skipped without them (the RAR
+archive is built here with stored members, so unrar is not needed).
+
+Usage:
+    python test_archive_ingest.py
+    pytest test_archive_ingest.py
+"""
+
+import io
+import struct
+import sys
+import tempfile
+import zipfile
+import zlib
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from PIL import Image
+
+from app.services.archive_ingest import (
+    ArchiveReader, scan_archive, count_archive_images, iter_archive_to_dir, rarfile, py7zr
+)
+
+def image_bytes(fmt: str, color=(200, 30, 30)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), color).save(buffer, fmt)
+    return buffer.getvalue()
+
+# name -> content; expected outcome per member
+MEMBERS = {
+    "photos/shoe.jpg": image_bytes('JPEG'),
+    "photos/bag.png": image_bytes('PNG', (30, 30, 200)),
+    "notes.txt": b"not an image",
+    "__MACOSX/photos/._shoe.jpg": b"resource fork",
+    "photos/.hidden.jpg": image_bytes('JPEG'),
+    "photos/fake.jpg": b"<html>not a jpeg</html>",
+}
+IMAGES = ["photos/shoe.jpg", "photos/bag.png"]
+SKIPPED = {"notes.txt": "not_image:.txt", "__MACOSX/photos/._shoe.jpg": "system_file", "photos/.hidden.jpg": "hidden_file"}
+
+def require(module, package: str) -> bool:
+    """False (skip) when an optional archive package is missing"""
+    if module is not None:
+        return True
+    if "pytest" in sys.modules:
+        import pytest
+        pytest.skip(f"{package} not installed")
+    print(f"SKIP {package} not installed")
+    return False
+
+def write_zip(path: Path, members: dict, corrupt: str = None):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    if corrupt:
+        # Flip bytes inside the stored member: its CRC check fails on read
+        raw = bytearray(path.read_bytes())
+        offset = raw.index(members[corrupt]) + 20
+        raw[offset:offset + 4] = b"\x00\x01\x02\x03"
+        path.write_bytes(bytes(raw))
+
+def _rar_block(block_type: int, flags: int, body: bytes, data: bytes = b"") -> bytes:
+    head = struct.pack('<BHH', block_type, flags, 7 + len(body)) + body
+    return struct.pack('<H', zlib.crc32(head) & 0xffff) + head + data
+
+def write_rar(path: Path, members: dict, corrupt: str = None):
+    """RAR 4 archive with stored (uncompressed) members (`corrupt` gets a wrong CRC)"""
+    out = b'Rar!\x1a\x07\x00' + _rar_block(0x73, 0, b'\x00' * 6)
+    for name, data in members.items():
+        encoded = name.encode()
+        crc = zlib.crc32(data) ^ (0xffffffff if name == corrupt else 0)
+        body = struct.pack('<IIBIIBBHI', len(data), len(data), 0, crc, 0x5A210000,
+                           20, 0x30, len(encoded), 0x20) + encoded
+        out += _rar_block(0x74, 0x8000, body, data)
+    path.write_bytes(out + _rar_block(0x7b, 0x4000, b''))
+
+def write_7z(path: Path, members: dict):
+    with py7zr.SevenZipFile(path, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(data, name)
+
+def check_archive(path: Path, header_checked: bool = True):
+    # Listing filters by name only: fake.jpg is counted until its header is read
+    assert count_archive_images(path) == len(IMAGES) + 1
+
+    with ArchiveReader(path) as reader:
+        assert sorted(reader.list_images()) == sorted(IMAGES + ["photos/fake.jpg"])
+        assert {s["file"]: s["reason"] for s in reader.skipped} == SKIPPED
+        assert reader.read_header("photos/shoe.jpg").startswith(b'\xff\xd8\xff')
+
+    images, failed = scan_archive(path)
+    if header_checked:
+        assert sorted(images) == sorted(IMAGES)
+        assert failed == [{"file": "photos/fake.jpg", "reason": "invalid_image_header"}]
+
+    with tempfile.TemporaryDirectory() as dest:
+        items = list(iter_archive_to_dir(path, dest))
+        written = [item for item in items if isinstance(item, Path)]
+        rejected = {item["file"]: item["reason"] for item in items if isinstance(item, dict)}
+        assert len(written) == len(IMAGES)
+        assert all(Image.open(item).size == (64, 48) for item in written)
+        assert rejected == {"photos/fake.jpg": "invalid_image_header"}
+
+def test_zip_ingest():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "upload.zip"
+        write_zip(path, MEMBERS)
+        check_archive(path)
+
+def test_zip_unreadable_member():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "broken.zip"
+        members = dict(MEMBERS, **{"photos/broken.jpg": image_bytes('JPEG', (10, 200, 10))})
+        write_zip(path, members, corrupt="photos/broken.jpg")
+
+        with tempfile.TemporaryDirectory() as dest:
+            items = list(iter_archive_to_dir(path, dest))
+            rejected = {item["file"]: item["reason"] for item in items if isinstance(item, dict)}
+            assert rejected["photos/broken.jpg"] == "read_error"
+            assert sum(isinstance(item, Path) for item in items) == len(IMAGES)
+
+def test_not_an_archive():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "upload.zip"
+        path.write_bytes(b"definitely not a zip")
+        items = list(iter_archive_to_dir(path, tmp))
+        assert len(items) == 1 and items[0]["reason"].startswith("archive_error")
+
+def test_rar_ingest():
+    if not require(rarfile, "rarfile"):
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "upload.rar"
+        write_rar(path, MEMBERS)
+        check_archive(path)
+
+        broken = Path(tmp) / "broken.rar"
+        write_rar(broken, dict(MEMBERS, **{"photos/broken.jpg": image_bytes('JPEG')}), corrupt="photos/broken.jpg")
+        items = list(iter_archive_to_dir(broken, Path(tmp) / "out"))
+        assert {item["file"]: item["reason"] for item in items if isinstance(item, dict)}["photos/broken.jpg"] == "read_error"
+
+def test_7z_ingest():
+    if not require(py7zr, "py7zr"):
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "upload.7z"
+        write_7z(path, MEMBERS)
+        # 7z member headers are checked while streaming, not by scan_archive
+        check_archive(path, header_checked=False)
+
+        with ArchiveReader(path) as reader:
+            try:
+                reader.read_header("photos/missing.jpg")
+                assert False, "missing member read"
+            except KeyError:
+                pass
+
+if __name__ == "__main__":
+    test_zip_ingest()
+    test_zip_unreadable_member()
+    test_not_an_archive()
+    test_rar_ingest()
+    test_7z_ingest()
+    print("OK archive ingest")
@@ -0,0 +1,67 @@
+"""
+Regression test for the edge-band halo refinement
+
+refine_halo() filters only the tiles around the silhouette; its output must
+match filtering the whole mask (the previous halo cleanup) in every mode,
+on the test_shadow_* masks and on synthetic hard, soft and noisy masks.
+
+Usage:
+    python test_edge_refine.py
+    pytest test_edge_refine.py
+"""
+
+import glob
+import os
+import sys
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+from app.processing.edge_refine import refine_halo, AGGRESSIVE_THRESHOLD
+
+def legacy_refine(alpha, mode):
+    """Whole-mask halo cleanup (standard = the previous default, aggressive = its commented variant)"""
+    if mode == "aggressive":
+        alpha = Image.fromarray(np.where(np.asarray(alpha) > AGGRESSIVE_THRESHOLD, 255, 0).astype(np.uint8))
+        return alpha.filter(ImageFilter.MinFilter(5)).filter(ImageFilter.GaussianBlur(1))
+    return alpha.filter(ImageFilter.MinFilter(3)).filter(ImageFilter.GaussianBlur(0.5))
+
+def load_masks():
+    masks = []
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_shadow_*.png"))):
+        masks.append((os.path.basename(path), Image.open(path).convert('RGBA').getchannel('A')))
+
+    hard = Image.new('L', (1000, 1000), 0)
+    ImageDraw.Draw(hard).ellipse((150, 100, 850, 950), fill=255)
+    masks.append(("hard-ellipse", hard))
+    masks.append(("soft-ellipse", hard.filter(ImageFilter.GaussianBlur(2))))
+
+    # Edge touching the mask border, odd size (partial tiles)
+    border = Image.new('L', (997, 613), 0)
+    ImageDraw.Draw(border).rectangle((0, 0, 996, 300), fill=255)
+    masks.append(("border-edge", border))
+
+    noise = np.random.default_rng(0).integers(0, 256, (77, 133), dtype=np.uint8)
+    masks.append(("noise", Image.fromarray(noise)))
+    masks.append(("flat", Image.new('L', (50, 40), 255)))
+    return masks
+
+def test_band_matches_whole_mask():
+    for name, alpha in load_masks():
+        for mode in ("standard", "aggressive"):
+            expected = legacy_refine(alpha, mode)
+            actual = refine_halo(alpha, mode)
+            assert np.array_equal(np.asarray(actual), np.asarray(expected)), f"{name} ({mode}) differs"
+
+def test_off_keeps_mask():
+    alpha = load_masks()[-2][1]
+    assert refine_halo(alpha, "off") is alpha
+
+if __name__ == "__main__":
+    test_band_matches_whole_mask()
+    test_off_keeps_mask()
+    print("OK edge-band refinement matches the whole-mask filters")
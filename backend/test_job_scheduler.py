@@ -0,0 +1,137 @@
+"""
+Tests for the multi-tenant job scheduler
+
+Admission counters, worker slots, fair ordering between tenants and plans,
+and the rejection (429) path with its Retry-After estimate.
+
+Usage:
+    python test_job_scheduler.py
+    pytest test_job_scheduler.py
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.models.user_models import PlanType
+from app.services.job_scheduler import JobScheduler, SchedulerBusy, caller_tenant, parse_plan
+
+def make_scheduler(workers=1, max_pending=100, max_tenant_pending=50) -> JobScheduler:
+    return JobScheduler(max_workers=workers, max_pending=max_pending,
+                        max_tenant_pending=max_tenant_pending, priority_weight=4.0)
+
+async def grant_order(scheduler: JobScheduler, jobs) -> list:
+    """
+    Queue every image of `jobs` ([(ticket, images)]) behind a held slot,
+    then let each image finish as soon as it gets a slot -> tenants in grant order
+    """
+    blocker = scheduler.admit("blocker", "blocker", images=1)
+    await scheduler.acquire(blocker)
+
+    order = []
+
+    async def image(ticket):
+        await scheduler.acquire(ticket)
+        order.append(ticket.tenant)
+        scheduler.release(ticket)
+
+    tasks = []
+    for ticket, images in jobs:
+        for _ in range(images):
+            tasks.append(asyncio.create_task(image(ticket)))
+    await asyncio.sleep(0)  # Every image waiting for a slot
+
+    scheduler.release(blocker)
+    await asyncio.gather(*tasks)
+    return order
+
+def test_admit_release_counters():
+    scheduler = make_scheduler(workers=2)
+    ticket = scheduler.admit("job-1", "user:a", PlanType.FREE, images=3)
+    assert ticket.remaining == 3 and ticket.weight == 1.0
+    assert scheduler.get_stats()["pending_images"] == 3
+
+    async def run():
+        async with ticket.slot():
+            assert scheduler.get_stats()["busy_workers"] == 1
+        assert scheduler.get_stats()["busy_workers"] == 0
+
+    asyncio.run(run())
+    stats = scheduler.get_stats()
+    assert stats["pending_images"] == 2 and stats["completed_images"] == 1
+    assert stats["tenants"]["user:a"] == {"pending": 2, "jobs": 1}
+
+    # Closing releases the images that were never processed
+    ticket.close()
+    stats = scheduler.get_stats()
+    assert stats["pending_images"] == 0 and "user:a" not in stats["tenants"]
+
+def test_small_job_not_queued_behind_large_one():
+    scheduler = make_scheduler(workers=1)
+
+    async def run():
+        large = scheduler.admit("large", "user:a", images=20)
+        small = scheduler.admit("small", "user:b", images=2)
+        return await grant_order(scheduler, [(large, 20), (small, 2)])
+
+    order = asyncio.run(run())
+    # The small job's images alternate with the large job's instead of waiting for all 20
+    assert [i for i, tenant in enumerate(order) if tenant == "user:b"] == [1, 3]
+
+def test_priority_plan_gets_larger_share():
+    scheduler = make_scheduler(workers=1)
+
+    async def run():
+        free = scheduler.admit("free", "user:a", PlanType.FREE, images=10)
+        business = scheduler.admit("business", "user:b", PlanType.BUSINESS, images=10)
+        return await grant_order(scheduler, [(free, 10), (business, 10)])
+
+    order = asyncio.run(run())
+    # Weight 4: about four business images per free one while both wait
+    assert order[:10].count("user:b") >= 7
+
+def test_rejected_when_queue_full():
+    scheduler = make_scheduler(max_pending=10, max_tenant_pending=6)
+    scheduler.admit("job-1", "user:a", images=5)
+
+    # Over the tenant cap: rejected with a retry estimate
+    try:
+        scheduler.admit("job-2", "user:a", images=2)
+        assert False, "tenant cap not enforced"
+    except SchedulerBusy as busy:
+        assert busy.retry_after >= 1.0 and busy.pending_images == 5
+        assert str(busy).startswith("Your")
+
+    # Another tenant still fits until the global cap
+    scheduler.admit("job-3", "user:b", images=5)
+    try:
+        scheduler.admit("job-4", "user:c", images=1)
+        assert False, "global cap not enforced"
+    except SchedulerBusy as busy:
+        assert busy.eta_seconds > 0 and str(busy).startswith("Server")
+
+    assert scheduler.get_stats()["rejected"] == 2
+
+def test_oversized_job_admitted_when_idle():
+    scheduler = make_scheduler(max_pending=10, max_tenant_pending=5)
+    ticket = scheduler.admit("huge", "user:a", images=500)
+    assert ticket.images == 500
+
+def test_tenant_and_plan_resolution():
+    assert caller_tenant("42") == "user:42"
+    assert caller_tenant(None, "10.0.0.1") == caller_tenant(None, "10.0.0.1") == "anonymous:10.0.0.1"
+    assert parse_plan(PlanType.PRO) is PlanType.PRO
+    assert parse_plan("business") is PlanType.BUSINESS
+    assert parse_plan(None) is PlanType.FREE
+
+if __name__ == "__main__":
+    test_admit_release_counters()
+    test_small_job_not_queued_behind_large_one()
+    test_priority_plan_gets_larger_share()
+    test_rejected_when_queue_full()
+    test_oversized_job_admitted_when_idle()
+    test_tenant_and_plan_resolution()
+    print("OK job scheduler")
@@ -0,0 +1,180 @@
+"""
+Tests for the persistent job store
+
+Job lifecycle (create, per-file results and counters, completion) on the
+SQLite store, record_and_finalize() from many threads at once (every
+result is counted and exactly one caller finalizes the job) and results
+delivered more than once by the task queue (counted once, finalized once).
+
+The same checks run against Redis when the `redis` package is installed
+and TEST_REDIS_URL points to a server (they are skipped otherwise).
+
+Usage:
+    python test_job_store.py
+    pytest test_job_store.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.services.job_store import SQLiteJobStore, RedisJobStore, create_job_store, redis
+from app.services.image_tasks import record_and_finalize, result_key
+
+def check_lifecycle(store):
+    store.create_job("job-1", 3, metadata={"pipeline": "amazon"})
+    progress = store.get_progress("job-1")
+    assert progress["status"] == "starting" and progress["total"] == 3 and progress["current"] == 0
+
+    progress = store.record_result("job-1", {"success": True, "original": "a.jpg"})
+    assert progress["current"] == 1 and progress["percentage"] == 33
+    store.record_result("job-1", {"success": False, "original": "b.jpg", "error": "bad"})
+
+    job = store.get_job("job-1")
+    assert job["status"] == "processing" and job["pipeline"] == "amazon"
+    assert job["successful"] == 1 and job["failed"] == 1 and job["processed_files"] == 2
+    assert [r["original"] for r in store.get_results("job-1")] == ["a.jpg", "b.jpg"]
+
+    store.record_result("job-1", {"success": True, "original": "c.jpg"})
+    store.complete_job("job-1", {"job_id": "job-1", "status": "completed", "successful": 2})
+    assert store.get_job("job-1") == {"job_id": "job-1", "status": "completed", "successful": 2}
+    assert store.get_progress("job-1")["percentage"] == 100
+
+    # A result landing after completion (timed-out image, redelivered task) keeps it completed
+    assert store.record_result("job-1", {"success": True, "original": "late.jpg"})["status"] == "completed"
+    assert store.get_progress("job-1")["status"] == "completed"
+
+    # Re-processing a job starts from scratch
+    store.create_job("job-1", 1)
+    assert store.get_results("job-1") == [] and store.get_job("job-1")["status"] == "starting"
+
+    assert store.get_job("missing") is None and store.get_progress("missing") is None
+    try:
+        store.record_result("missing", {"success": True, "original": "a.jpg"})
+        assert False, "result recorded for an unknown job"
+    except KeyError:
+        pass
+    assert store.get_job("missing") is None
+
+def check_finalized_once(store, processed_dir: Path):
+    images = 40
+    store.create_job("job-2", images, metadata={"pipeline": "amazon"})
+
+    completions = []
+    complete_job = store.complete_job
+    lock = threading.Lock()
+
+    def counting_complete(job_id, summary, status="completed"):
+        with lock:
+            completions.append(summary)
+        complete_job(job_id, summary, status)
+
+    store.complete_job = counting_complete
+
+    def record(index):
+        result = {"success": index % 4 != 0, "original": f"img_{index}.jpg"}
+        return record_and_finalize(store, "job-2", result, processed_dir, "amazon", None)
+
+    with ThreadPoolExecutor(8) as executor:
+        progress = list(executor.map(record, range(images)))
+
+    assert sorted(p["current"] for p in progress) == list(range(1, images + 1))
+    assert len(completions) == 1
+    summary = completions[0]
+    assert summary["total_files"] == images and summary["successful"] == 30 and summary["failed"] == 10
+    assert store.get_job("job-2")["status"] == "completed"
+    assert (processed_dir / "results.json").exists()
+
+def check_redelivered_results(store, processed_dir: Path):
+    """At-least-once delivery: repeated results are counted once, a failed finalize is retried"""
+    store.create_job("job-3", 3, metadata={"pipeline": "multi"})
+    outputs = [{"success": True, "original": "a.jpg", "pipeline": name} for name in ("amazon", "ebay")]
+    pipelines = ["amazon", "ebay"]
+
+    # The task crashed after recording its first output, then was delivered again
+    record_and_finalize(store, "job-3", outputs[0], processed_dir, pipelines, None, key=result_key("a.jpg", outputs[0]))
+    for output in outputs:
+        progress = record_and_finalize(store, "job-3", output, processed_dir, pipelines, None,
+                                       key=result_key("a.jpg", output))
+    assert progress["current"] == 2 and progress["recorded"]
+    assert len(store.get_results("job-3")) == 2
+
+    # Finalizing after the last result fails once: the redelivered result finalizes the job
+    last = {"success": False, "original": "b.jpg", "pipeline": "amazon", "error": "bad"}
+    complete_job = store.complete_job
+
+    def failing_complete(job_id, summary, status="completed"):
+        store.complete_job = complete_job
+        raise RuntimeError("store unavailable")
+
+    store.complete_job = failing_complete
+    try:
+        record_and_finalize(store, "job-3", last, processed_dir, pipelines, None, key=result_key("b.jpg", last))
+        assert False, "finalize error swallowed"
+    except RuntimeError:
+        pass
+    assert store.get_job("job-3")["status"] == "processing"
+
+    progress = record_and_finalize(store, "job-3", last, processed_dir, pipelines, None, key=result_key("b.jpg", last))
+    assert not progress["recorded"] and progress["current"] == 3
+    summary = store.get_job("job-3")
+    assert summary["status"] == "completed" and summary["total_files"] == 3 and summary["failed"] == 1
+
+    # Finalized once: later deliveries neither count nor finalize again
+    assert not store.begin_finalize("job-3")
+    assert record_and_finalize(store, "job-3", last, processed_dir, pipelines, None,
+                               key=result_key("b.jpg", last))["current"] == 3
+
+def test_sqlite_lifecycle():
+    with tempfile.TemporaryDirectory() as tmp:
+        check_lifecycle(SQLiteJobStore(os.path.join(tmp, "jobs.db")))
+
+def test_sqlite_finalized_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        check_finalized_once(create_job_store(f"sqlite:///{tmp}/jobs.db"), Path(tmp) / "processed")
+
+def test_sqlite_redelivered_results():
+    with tempfile.TemporaryDirectory() as tmp:
+        check_redelivered_results(SQLiteJobStore(os.path.join(tmp, "jobs.db")), Path(tmp) / "processed")
+
+def redis_store():
+    url = os.getenv("TEST_REDIS_URL")
+    if redis is not None and url:
+        return RedisJobStore(url)
+    if "pytest" in sys.modules:
+        import pytest
+        pytest.skip("redis package or TEST_REDIS_URL missing")
+    print("SKIP redis package or TEST_REDIS_URL missing")
+    return None
+
+def test_redis_lifecycle():
+    store = redis_store()
+    if store:
+        check_lifecycle(store)
+
+def test_redis_finalized_once():
+    store = redis_store()
+    if store:
+        with tempfile.TemporaryDirectory() as tmp:
+            check_finalized_once(store, Path(tmp))
+
+def test_redis_redelivered_results():
+    store = redis_store()
+    if store:
+        with tempfile.TemporaryDirectory() as tmp:
+            check_redelivered_results(store, Path(tmp))
+
+if __name__ == "__main__":
+    test_sqlite_lifecycle()
+    test_sqlite_finalized_once()
+    test_sqlite_redelivered_results()
+    test_redis_lifecycle()
+    test_redis_finalized_once()
+    test_redis_redelivered_results()
+    print("OK job store")
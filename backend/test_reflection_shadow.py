@@ -0,0 +1,140 @@
+"""
+Regression test for the vectorized reflection shadow
+
+Compares ShadowEffects.create_reflection_shadow (numpy) pixel by pixel with
+the previous putpixel/getpixel implementation, kept below as the reference,
+on the test_shadow_* images and on synthetic products with soft edges.
+
+Usage:
+    python test_reflection_shadow.py
+    pytest test_reflection_shadow.py
+"""
+
+import glob
+import os
+import sys
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+
+from app.processing.shadow_effects import ShadowEffects
+
+# (reflection_height, intensity, fade_start)
+PARAMS = [
+    (0.4, 0.2, 0.0),   # Defaults
+    (0.35, 0.2, 0.1),  # ebay pipeline
+    (0.5, 0.2, 0.0),   # premium pipeline
+    (0.5, 0.8, 0.25),
+    (0.25, 1.0, 0.6),
+    (0.0, 0.2, 0.0),   # No reflection rows
+]
+
+def legacy_create_reflection_shadow(img, reflection_height=0.4, opacity=0.2, fade_start=0.0, intensity=0.2):
+    """Copy of ShadowEffects.create_reflection_shadow before vectorizing"""
+    if intensity is not None:
+        opacity = intensity
+
+    reflection_h = int(img.height * reflection_height)
+    gap = 10
+    total_height = img.height + reflection_h + gap
+
+    canvas = Image.new('RGBA', (img.width, total_height), (0, 0, 0, 0))
+    canvas.paste(img, (0, 0), img if img.mode == 'RGBA' else None)
+
+    reflection = img.copy()
+    reflection = reflection.transpose(Image.FLIP_TOP_BOTTOM)
+    reflection = reflection.crop((0, 0, reflection.width, reflection_h))
+
+    fade_mask = Image.new('L', (reflection.width, reflection_h), 0)
+    for y in range(reflection_h):
+        progress = y / reflection_h
+        if progress < fade_start:
+            fade_factor = 1.0
+        else:
+            fade_factor = 1.0 - ((progress - fade_start) / (1.0 - fade_start))
+
+        opacity_value = int(255 * opacity * fade_factor)
+        for x in range(reflection.width):
+            fade_mask.putpixel((x, y), opacity_value)
+
+    if reflection.mode != 'RGBA':
+        reflection = reflection.convert('RGBA')
+
+    r, g, b, a = reflection.split()
+    combined_alpha = ImageEnhance.Brightness(a).enhance(opacity)
+    if reflection_h:  # (the original raised IndexError here with 0 rows)
+        combined_alpha = Image.eval(combined_alpha, lambda x: int(x * (fade_mask.getpixel((0, 0)) / 255)))
+
+    reflection_faded = Image.new('RGBA', reflection.size, (0, 0, 0, 0))
+    for y in range(reflection_h):
+        progress = y / reflection_h
+        if progress < fade_start:
+            fade_factor = 1.0
+        else:
+            fade_factor = 1.0 - ((progress - fade_start) / (1.0 - fade_start))
+
+        alpha_value = int(255 * opacity * fade_factor)
+
+        for x in range(reflection.width):
+            if a.getpixel((x, y)) > 10:
+                r_val, g_val, b_val = reflection.getpixel((x, y))[:3]
+                reflection_faded.putpixel((x, y), (r_val, g_val, b_val, alpha_value))
+
+    reflection_y = img.height + gap
+    canvas.paste(reflection_faded, (0, reflection_y), reflection_faded)
+    return canvas
+
+def synthetic_product(width=240, height=180, seed=0) -> Image.Image:
+    """Textured product with an anti-aliased, partly transparent silhouette"""
+    rng = np.random.default_rng(seed)
+    rgb = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+    alpha = Image.new('L', (width, height), 0)
+    draw = ImageDraw.Draw(alpha)
+    draw.ellipse((20, 10, width - 30, height - 5), fill=255)
+    draw.rectangle((width // 3, height // 2, width - 10, height - 1), fill=140)
+    alpha = alpha.filter(ImageFilter.GaussianBlur(3))
+
+    img = Image.fromarray(rgb, 'RGB').convert('RGBA')
+    img.putalpha(alpha)
+    return img
+
+def load_cases():
+    cases = [("synthetic", synthetic_product()), ("synthetic-odd", synthetic_product(131, 97, seed=1))]
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_shadow_*.png"))):
+        img = Image.open(path).convert('RGBA')
+        # The reference is slow: keep the inputs small
+        img.thumbnail((320, 320))
+        cases.append((os.path.basename(path), img))
+    return cases
+
+def test_reflection_matches_legacy():
+    effects = ShadowEffects()
+    for name, img in load_cases():
+        for reflection_height, intensity, fade_start in PARAMS:
+            expected = legacy_create_reflection_shadow(img, reflection_height, fade_start=fade_start, intensity=intensity)
+            actual = effects.create_reflection_shadow(img, reflection_height=reflection_height,
+                                                      fade_start=fade_start, intensity=intensity)
+            assert actual.size == expected.size, f"{name} {reflection_height}: size {actual.size} != {expected.size}"
+            assert np.array_equal(np.asarray(actual), np.asarray(expected)), \
+                f"{name} (height={reflection_height}, intensity={intensity}, fade_start={fade_start}) differs"
+
+def test_render_shadow_matches_legacy():
+    """Final RGB output (composited on white) with the ebay pipeline parameters"""
+    effects = ShadowEffects()
+    img = synthetic_product()
+    expected = legacy_create_reflection_shadow(img, 0.35, fade_start=0.1)
+    white_bg = Image.new('RGB', expected.size, (255, 255, 255))
+    white_bg.paste(expected, mask=expected.split()[-1])
+
+    actual = effects.render_shadow(img, 'reflection', reflection_height=0.35, opacity=0.1, fade_start=0.1)
+    assert np.array_equal(np.asarray(actual), np.asarray(white_bg))
+
+if __name__ == "__main__":
+    test_reflection_matches_legacy()
+    test_render_shadow_matches_legacy()
+    print("OK reflection shadow matches the previous output")
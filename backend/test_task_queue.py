@@ -0,0 +1,179 @@
+"""
+Tests for the task queue (PROCESSING_MODE=queue)
+
+Claim order, leases (a claimed task is invisible until its lease expires,
+then another worker re-claims it), ack, release and the attempts count the
+worker caps with max_attempts. Runs on SQLite in a temporary folder; the
+same checks run against Redis when the `redis` package is installed and
+TEST_REDIS_URL points to a server (they are skipped otherwise).
+
+Usage:
+    python test_task_queue.py
+    pytest test_task_queue.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.services import task_queue as task_queue_module
+from app.services import job_store as job_store_module
+from app.services.task_queue import SQLiteTaskQueue, RedisTaskQueue, redis
+
+LEASE = 0.2
+
+def check_claim_order(queue):
+    low = queue.enqueue({"image": "low"})
+    high = queue.enqueue({"image": "high"}, priority=1)
+    queue.enqueue({"image": "low-2"})
+    assert queue.depth() == 3
+
+    claimed = [queue.claim("worker-a") for _ in range(3)]
+    assert [task.payload["image"] for task in claimed] == ["high", "low", "low-2"]
+    assert claimed[0].id == high and claimed[1].id == low
+    assert all(task.attempts == 1 for task in claimed)
+
+    # Everything leased: nothing to claim, but still counted until acked
+    assert queue.claim("worker-b") is None
+    assert queue.depth() == 3
+    for task in claimed:
+        queue.ack(task)
+    assert queue.depth() == 0 and queue.claim("worker-a") is None
+
+def check_lease_expiry(queue):
+    queue.enqueue({"image": "a.jpg"})
+    task = queue.claim("worker-a")
+    assert queue.claim("worker-b") is None
+
+    # Worker A dies: after the lease another worker gets the task again
+    time.sleep(LEASE * 1.5)
+    reclaimed = queue.claim("worker-b")
+    assert reclaimed.id == task.id and reclaimed.attempts == 2
+
+    # Released tasks are claimable right away, without counting the attempt
+    queue.release(reclaimed)
+    again = queue.claim("worker-c")
+    assert again.id == task.id and again.attempts == 2
+    queue.ack(again)
+    assert queue.depth() == 0
+
+def check_priority_kept(queue):
+    """A priority task stays ahead of normal ones after it is released or its lease expires"""
+    queue.enqueue({"image": "high"}, priority=1)
+    queue.enqueue({"image": "low"})
+
+    # Both go back to the queue, the normal one last
+    high, low = queue.claim("worker-a"), queue.claim("worker-b")
+    queue.release(high)
+    queue.release(low)
+    assert queue.claim("worker-c").payload["image"] == "high"
+
+    # Both leases run out, the normal one last
+    queue.claim("worker-c")
+    time.sleep(LEASE * 1.5)
+    task = queue.claim("worker-d")
+    assert task.payload["image"] == "high"
+    queue.ack(task)
+    queue.ack(queue.claim("worker-d"))
+    assert queue.depth() == 0
+
+def check_attempts_counted(queue):
+    queue.enqueue({"image": "crash.jpg"})
+    attempts = []
+    for _ in range(queue.max_attempts + 1):
+        task = queue.claim("worker")
+        attempts.append(task.attempts)
+        time.sleep(LEASE * 1.5)  # The worker crashed: lease runs out
+    assert attempts == list(range(1, queue.max_attempts + 2))
+    # The last claim is over the cap: the worker abandons it (see below)
+    assert task.attempts > queue.max_attempts
+    queue.ack(task)
+
+def test_sqlite_claim_order():
+    with tempfile.TemporaryDirectory() as tmp:
+        check_claim_order(SQLiteTaskQueue(os.path.join(tmp, "tasks.db"), lease_seconds=LEASE))
+
+def test_sqlite_lease_expiry():
+    with tempfile.TemporaryDirectory() as tmp:
+        check_lease_expiry(SQLiteTaskQueue(os.path.join(tmp, "tasks.db"), lease_seconds=LEASE))
+
+def test_sqlite_priority_kept():
+    with tempfile.TemporaryDirectory() as tmp:
+        check_priority_kept(SQLiteTaskQueue(os.path.join(tmp, "tasks.db"), lease_seconds=LEASE))
+
+def test_sqlite_attempts_counted():
+    with tempfile.TemporaryDirectory() as tmp:
+        check_attempts_counted(SQLiteTaskQueue(os.path.join(tmp, "tasks.db"), lease_seconds=LEASE, max_attempts=2))
+
+def test_worker_abandons_task_over_attempts_cap():
+    """A task whose workers kept dying is recorded as failed and acked without processing"""
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["TASK_QUEUE_URL"] = f"sqlite:///{tmp}/tasks.db"
+        os.environ["JOB_STORE_URL"] = f"sqlite:///{tmp}/jobs.db"
+        task_queue_module._task_queue = None
+        job_store_module._job_store = None
+        was_worker = "MASTERPOST_WORKER" in os.environ
+        try:
+            import worker
+            image_worker = worker.ImageWorker(threads=1)
+            queue, store = image_worker.task_queue, image_worker.job_store
+
+            processed_dir = Path(tmp) / "processed"
+            store.create_job("job-1", 1, metadata={"pipeline": "amazon"})
+            queue.enqueue({
+                "job_id": "job-1", "image_path": str(Path(tmp) / "crash.jpg"),
+                "processed_dir": str(processed_dir), "pipeline": "amazon"
+            })
+            for _ in range(queue.max_attempts + 1):
+                task = queue.claim("worker")
+                queue._connect().execute("UPDATE tasks SET lease_until = 0")  # Lease expired
+
+            image_worker.run_task(task)
+
+            assert queue.depth() == 0 and image_worker.stats["abandoned"] == 1
+            results = json.loads((processed_dir / "results.json").read_text())
+            assert results["failed"] == 1 and "abandoned" in results["failed_files"][0]["error"]
+        finally:
+            os.environ.pop("TASK_QUEUE_URL", None)
+            os.environ.pop("JOB_STORE_URL", None)
+            if not was_worker:
+                os.environ.pop("MASTERPOST_WORKER", None)
+            task_queue_module._task_queue = None
+            job_store_module._job_store = None
+
+def redis_queue(**kwargs):
+    url = os.getenv("TEST_REDIS_URL")
+    if redis is not None and url:
+        queue = RedisTaskQueue(url, lease_seconds=LEASE, **kwargs)
+        keys = queue.client.keys("tasks:*")
+        if keys:
+            queue.client.delete(*keys)  # Start from an empty queue
+        return queue
+    if "pytest" in sys.modules:
+        import pytest
+        pytest.skip("redis package or TEST_REDIS_URL missing")
+    print("SKIP redis package or TEST_REDIS_URL missing")
+    return None
+
+def test_redis_queue():
+    queue = redis_queue(max_attempts=2)
+    if queue:
+        check_claim_order(queue)
+        check_lease_expiry(queue)
+        check_priority_kept(queue)
+        check_attempts_counted(queue)
+
+if __name__ == "__main__":
+    test_sqlite_claim_order()
+    test_sqlite_lease_expiry()
+    test_sqlite_priority_kept()
+    test_sqlite_attempts_counted()
+    test_worker_abandons_task_over_attempts_cap()
+    test_redis_queue()
+    print("OK task queue")
@@ -0,0 +1,81 @@
+"""
+Tests for the white-background fast path
+
+Products pasted on near-white (the test_shadow_* cutouts and a synthetic
+product with a white area inside) must be detected and masked like their
+true alpha; the same products on a colored or noisy background must be
+left to the model.
+
+Usage:
+    python test_white_background.py
+    pytest test_white_background.py
+"""
+
+import glob
+import io
+import os
+import sys
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from app.processing.white_background import white_background_mask
+
+def on_background(cutout: Image.Image, color) -> Image.Image:
+    background = Image.new('RGB', cutout.size, color)
+    background.paste(cutout, mask=cutout.getchannel('A'))
+    # Through JPEG, like an upload
+    buffer = io.BytesIO()
+    background.save(buffer, 'JPEG', quality=90)
+    return Image.open(io.BytesIO(buffer.getvalue())).convert('RGB')
+
+def load_cutouts():
+    cutouts = []
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_shadow_*.png"))):
+        cutouts.append((os.path.basename(path), Image.open(path).convert('RGBA')))
+
+    # Dark box with a white label inside: the label must stay opaque
+    box = Image.new('RGBA', (600, 500), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(box)
+    draw.rectangle((150, 100, 450, 400), fill=(40, 60, 90, 255))
+    draw.rectangle((220, 180, 380, 320), fill=(255, 255, 255, 255))
+    cutouts.append(("box-with-label", box))
+    return cutouts
+
+def iou(mask: np.ndarray, alpha: np.ndarray) -> float:
+    product, expected = mask > 127, alpha > 127
+    return (product & expected).sum() / (product | expected).sum()
+
+def test_white_background_detected():
+    for name, cutout in load_cutouts():
+        mask, check = white_background_mask(on_background(cutout, (250, 250, 250)))
+        assert mask is not None, f"{name}: not detected ({check})"
+        assert iou(mask, np.asarray(cutout.getchannel('A'))) > 0.97, f"{name}: mask differs from the alpha"
+
+def test_other_backgrounds_segmented():
+    rng = np.random.default_rng(0)
+    for name, cutout in load_cutouts():
+        for color in ((180, 190, 200), (255, 240, 200)):
+            mask, check = white_background_mask(on_background(cutout, color))
+            assert mask is None, f"{name} on {color}: wrongly detected ({check})"
+
+        noisy = np.full((cutout.height, cutout.width, 3), 245, dtype=np.int16)
+        noisy += rng.integers(-40, 10, noisy.shape, dtype=np.int16)
+        background = Image.fromarray(noisy.clip(0, 255).astype(np.uint8), 'RGB')
+        background.paste(cutout, mask=cutout.getchannel('A'))
+        mask, check = white_background_mask(background)
+        assert mask is None, f"{name} on noise: wrongly detected ({check})"
+
+def test_blank_image_segmented():
+    mask, check = white_background_mask(Image.new('RGB', (400, 300), (255, 255, 255)))
+    assert mask is None and check["reason"] == "product share out of range"
+
+if __name__ == "__main__":
+    test_white_background_detected()
+    test_other_backgrounds_segmented()
+    test_blank_image_segmented()
+    print("OK white-background fast path")
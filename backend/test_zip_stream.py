@@ -0,0 +1,117 @@
+"""
+Tests for the streaming result ZIPs
+
+stream_zip() output read back with zipfile: STORED images written with data
+descriptors, every member passing its CRC check (testzip) and multi-pipeline
+jobs keeping one folder per pipeline. IncrementalZipWriter: concurrent add(),
+the '.partial' file until close() and discard() of unfinished archives.
+
+Usage:
+    python test_zip_stream.py
+    pytest test_zip_stream.py
+"""
+
+import io
+import os
+import sys
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.services.zip_stream import stream_zip, IncrementalZipWriter
+
+PIPELINES = ["amazon", "ebay", "instagram"]
+DATA_DESCRIPTOR = 0x08
+
+def make_processed_dir(root: Path) -> dict:
+    """Multi-pipeline job layout: <pipeline>/<image>, same names in every folder"""
+    files = {}
+    for index, pipeline in enumerate(PIPELINES):
+        folder = root / pipeline
+        folder.mkdir(parents=True)
+        for name in ("shoe.jpg", "bag.png"):
+            data = os.urandom(3000 + index * 1000)
+            (folder / name).write_bytes(data)
+            files[f"{pipeline}/{name}"] = data
+    (root / "results.txt").write_bytes(b"summary " * 200)
+    files["results.txt"] = b"summary " * 200
+    return files
+
+def entries_for(root: Path):
+    # Same arcnames as the download endpoint: path relative to the processed dir
+    return [(path, path.relative_to(root).as_posix()) for path in sorted(root.rglob("*")) if path.is_file()]
+
+def test_stream_zip():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        files = make_processed_dir(root)
+
+        # Small chunks: members span several yielded chunks
+        chunks = list(stream_zip(entries_for(root), chunk_size=1024))
+        assert len(chunks) > len(files)
+
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+            assert archive.testzip() is None
+            assert sorted(archive.namelist()) == sorted(files)
+            for info in archive.infolist():
+                assert archive.read(info) == files[info.filename]
+                assert info.flag_bits & DATA_DESCRIPTOR
+                expected = zipfile.ZIP_DEFLATED if info.filename.endswith(".txt") else zipfile.ZIP_STORED
+                assert info.compress_type == expected
+
+            folders = {name.split("/")[0] for name in archive.namelist() if "/" in name}
+            assert folders == set(PIPELINES)
+
+def test_stream_zip_empty():
+    with zipfile.ZipFile(io.BytesIO(b"".join(stream_zip([])))) as archive:
+        assert archive.namelist() == [] and archive.testzip() is None
+
+def test_incremental_zip_writer():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "processed"
+        files = make_processed_dir(root)
+        zip_path = Path(tmp) / "job.zip"
+
+        writer = IncrementalZipWriter(zip_path)
+        # Batch workers add results concurrently
+        with ThreadPoolExecutor(4) as executor:
+            list(executor.map(lambda entry: writer.add(*entry), entries_for(root)))
+
+        # Only the partial archive exists until the job finishes
+        assert writer.partial_path.exists() and not zip_path.exists()
+        assert writer.close() == zip_path
+        assert zip_path.exists() and not writer.partial_path.exists()
+        assert writer.entries == len(files)
+
+        with zipfile.ZipFile(zip_path) as archive:
+            assert archive.testzip() is None
+            assert {name: archive.read(name) for name in archive.namelist()} == files
+            assert archive.getinfo("amazon/shoe.jpg").compress_type == zipfile.ZIP_STORED
+
+        try:
+            writer.add(root / "amazon" / "shoe.jpg", "amazon/shoe.jpg")
+            assert False, "add() after close()"
+        except RuntimeError:
+            pass
+
+def test_incremental_zip_writer_discard():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "processed"
+        make_processed_dir(root)
+        zip_path = Path(tmp) / "job.zip"
+
+        writer = IncrementalZipWriter(zip_path)
+        writer.add(root / "ebay" / "shoe.jpg", "ebay/shoe.jpg")
+        writer.discard()
+        assert not writer.partial_path.exists() and not zip_path.exists()
+
+if __name__ == "__main__":
+    test_stream_zip()
+    test_stream_zip_empty()
+    test_incremental_zip_writer()
+    test_incremental_zip_writer_discard()
+    print("OK zip stream")
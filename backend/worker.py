@@ -0,0 +1,155 @@
+"""
+Masterpost Image Worker
+Processes the image tasks queued by the API when PROCESSING_MODE=queue
+
+The API process receives uploads, queues one task per image in the task
+queue (TASK_QUEUE_URL) and serves status, events and downloads. This
+process loads U2-Net once and runs WORKER_THREADS tasks at a time,
+recording each result in the job store (JOB_STORE_URL) - the API's
+progress endpoints and event streams read it from there. Whichever worker
+records a job's last image writes results.json and completes the job.
+
+Start as many workers as needed; they share only the task queue, the job
+store and the uploads/processed folders (run from the backend directory,
+like server.py).
+
+Only for PROCESSING_MODE=queue, which is why the Procfile doesn't start it:
+the API and every worker must use the same TASK_QUEUE_URL and JOB_STORE_URL
+(Redis when they run on different hosts - the SQLite defaults are local
+files, only shared by processes on one machine).
+
+Usage:
+    python worker.py
+    WORKER_THREADS=4 python worker.py
+"""
+
+import os
+
+# Before app imports: this process always preloads the model (when
+# simple_processing is imported below), whatever PROCESSING_MODE says
+os.environ["MASTERPOST_WORKER"] = "1"
+
+import signal
+import socket
+import logging
+import threading
+from pathlib import Path
+
+from app.services import simple_processing  # noqa: F401 - loads U2-Net before the first task
+from app.services.task_queue import get_task_queue, Task
+from app.services.job_store import get_job_store
+from app.services.image_tasks import (
+    process_job_image, process_job_image_multi, failed_file_results, record_and_finalize, result_key
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("worker")
+
+# Concurrent tasks per worker process (batched segmentation groups them)
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", str(min((os.cpu_count() or 4) * 2, 16))))
+
+# Seconds between polls of an empty queue
+POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "0.5"))
+
+class ImageWorker:
+    """Claims tasks from the queue and processes them on WORKER_THREADS threads"""
+
+    def __init__(self, threads: int = WORKER_THREADS):
+        self.threads = threads
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.task_queue = get_task_queue()
+        self.job_store = get_job_store()
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.stats = {"processed": 0, "failed": 0, "abandoned": 0}
+
+    def run_task(self, task: Task):
+        payload = task.payload
+        job_id = payload["job_id"]
+        image_path = Path(payload["image_path"])
+        processed_dir = Path(payload["processed_dir"])
+
+        pipelines = payload.get("pipelines")  # Multi-pipeline job: one result per pipeline
+
+        if task.attempts > self.task_queue.max_attempts:
+            # Its previous workers died mid-task: don't let it crash more of them
+            file_results = failed_file_results(
+                image_path.name, f"Processing abandoned after {task.attempts - 1} attempts", pipelines
+            )
+            stat = "abandoned"
+        else:
+            try:
+                if pipelines:
+                    file_results = process_job_image_multi(
+                        image_path, processed_dir, pipelines,
+                        payload.get("shadow_params"), payload.get("use_premium", False)
+                    )
+                else:
+                    file_results = [process_job_image(
+                        image_path, processed_dir, payload["pipeline"],
+                        payload.get("shadow_params"), payload.get("use_premium", False)
+                    )]
+            except Exception as e:
+                logger.exception(f"[WORKER] Task {task.id} ({image_path.name}) crashed")
+                file_results = failed_file_results(image_path.name, str(e), pipelines)
+            stat = "processed" if any(r["success"] for r in file_results) else "failed"
+
+        # A redelivered task (lease expired, released after an error) records
+        # the same keys again: only outputs not recorded yet are counted
+        for file_result in file_results:
+            progress = record_and_finalize(
+                self.job_store, job_id, file_result, processed_dir,
+                pipelines or payload["pipeline"], payload.get("shadow_params"),
+                key=result_key(image_path, file_result)
+            )
+        self.task_queue.ack(task)
+
+        with self._stats_lock:
+            self.stats[stat] += 1
+        logger.info(f"[WORKER] Job {job_id}: {progress['current']}/{progress['total']} ({image_path.name} {stat})")
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                task = self.task_queue.claim(self.worker_id)
+            except Exception as e:
+                logger.error(f"[WORKER] Cannot claim tasks: {e}")
+                task = None
+
+            if task is None:
+                self._stop.wait(POLL_INTERVAL)
+                continue
+
+            try:
+                self.run_task(task)
+            except Exception:
+                # Result not recorded (e.g. job store down): let another attempt pick it up
+                logger.exception(f"[WORKER] Task {task.id} failed, releasing it")
+                self.task_queue.release(task)
+
+    def run(self):
+        logger.info(f"[WORKER] {self.worker_id} started with {self.threads} threads")
+        threads = [
+            threading.Thread(target=self._loop, name=f"image-worker-{i}", daemon=True)
+            for i in range(self.threads)
+        ]
+        for thread in threads:
+            thread.start()
+
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1.0)
+
+        logger.info(f"[WORKER] {self.worker_id} stopped: {self.stats}")
+
+    def stop(self, *_):
+        """Finish the tasks in progress, claim no new ones"""
+        if not self._stop.is_set():
+            logger.info("[WORKER] Shutting down after the current tasks...")
+        self._stop.set()
+
+if __name__ == "__main__":
+    worker = ImageWorker()
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
@@ -0,0 +1,114 @@
+"""
+Fused Compositor
+Final white-background output without intermediate layers
+
+Every output path used to allocate a full-size white canvas and alpha-paste
+onto it, and the shadow variants added more full-size RGBA/RGB layers
+(transparent canvases, split() bands, RGB copies of the shadow) before the
+final paste. composite_on_white() takes the product, an optional shadow
+alpha and the target canvas, and builds the output in one canvas:
+
+    canvas = white, with shadow_lut[shadow] written in place   (optional)
+    canvas[product box] = blend(canvas, product, alpha)
+
+The shadow is written with numpy into a per-thread canvas buffer that is
+reused across images (the shade lookup too), and the product is blended
+with PIL's paste kernel restricted to the product's bounding box: a C
+single pass with PIL's exact rounding, faster here than a multi-pass
+numpy/cv2 blend, so outputs stay identical to the paste-on-white code.
+"""
+
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+WHITE = 255
+
+class _ThreadBuffers(threading.local):
+    """Reusable arrays of the calling thread (grown on demand, never shrunk)"""
+
+    def __init__(self):
+        self.arrays = {}
+
+    def get(self, name: str, shape: tuple, dtype=np.uint8) -> np.ndarray:
+        size = int(np.prod(shape))
+        array = self.arrays.get(name)
+        if array is None or array.size < size or array.dtype != dtype:
+            array = np.empty(size, dtype=dtype)
+            self.arrays[name] = array
+        return array[:size].reshape(shape)
+
+_buffers = _ThreadBuffers()
+
+def shadow_lut(color: int) -> np.ndarray:
+    """Shadow alpha -> gray on white for a flat shadow color (PIL paste rounding)"""
+    s = np.arange(256, dtype=np.uint32)
+    tmp = WHITE * (255 - s) + color * s + 128
+    return (((tmp >> 8) + tmp) >> 8).astype(np.uint8)
+
+def _clip(left: int, top: int, width: int, height: int, canvas_w: int, canvas_h: int):
+    """Layer placed at (left, top) -> (canvas slices, layer slices), None if outside"""
+    x0, y0 = max(left, 0), max(top, 0)
+    x1, y1 = min(left + width, canvas_w), min(top + height, canvas_h)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return (slice(y0, y1), slice(x0, x1)), (slice(y0 - top, y1 - top), slice(x0 - left, x1 - left))
+
+def composite_on_white(image: Image.Image,
+                       canvas_size: Optional[Tuple[int, int]] = None,
+                       offset: Tuple[int, int] = (0, 0),
+                       shadow: Optional[np.ndarray] = None,
+                       shadow_offset: Tuple[int, int] = (0, 0),
+                       shadow_lut_table: Optional[np.ndarray] = None,
+                       shadow_color: int = 150,
+                       alpha: Optional[Image.Image] = None) -> Image.Image:
+    """
+    Composite a product (and optional shadow) onto white -> new RGB image
+
+    Same result as Image.new('RGB', canvas_size, white) + paste(shadow color,
+    shadow mask) + paste(image, offset, image) in one canvas.
+
+    Args:
+        image: Product, RGBA (alpha = its mask) or RGB (opaque)
+        canvas_size: Output (width, height); defaults to the product size
+        offset: Product position on the canvas (may be partly outside)
+        shadow: Shadow alpha, HxW uint8, already blurred
+        shadow_offset: Shadow position on the canvas
+        shadow_lut_table: Shadow alpha -> gray (default: flat shadow_color)
+        shadow_color: Shadow gray when no table is given
+        alpha: Product mask when it is already split out ('L')
+    """
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    canvas_w, canvas_h = canvas_size or image.size
+
+    if shadow is None:
+        canvas = Image.new('RGB', (canvas_w, canvas_h), (WHITE, WHITE, WHITE))
+    else:
+        pixels = _buffers.get("canvas", (canvas_h, canvas_w, 3))
+        pixels.fill(WHITE)
+        placed = _clip(shadow_offset[0], shadow_offset[1], shadow.shape[1], shadow.shape[0], canvas_w, canvas_h)
+        if placed:
+            target, source = placed
+            lut = shadow_lut_table if shadow_lut_table is not None else shadow_lut(shadow_color)
+            shade = _buffers.get("shade", shadow[source].shape)
+            np.take(lut, shadow[source], out=shade)
+            pixels[target] = shade[:, :, None]
+        # Copies out of the reusable buffer
+        canvas = Image.fromarray(pixels, 'RGB')
+
+    if image.mode == 'RGBA' or alpha is not None:
+        mask = alpha if alpha is not None else image
+        bbox = mask.getbbox()  # RGBA: alpha only
+        if bbox:
+            # Only the product's bounding box changes the canvas
+            if bbox != (0, 0) + image.size:
+                image = image.crop(bbox)
+                mask = mask.crop(bbox) if alpha is not None else image
+            canvas.paste(image, (offset[0] + bbox[0], offset[1] + bbox[1]), mask)
+    else:
+        canvas.paste(image, offset)
+
+    return canvas
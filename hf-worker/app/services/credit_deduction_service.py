@@ -3,12 +3,14 @@ Servicio para deducir créditos después de procesar
 """
 
 from app.services.credit_service import use_credits
-from typing import Dict, Any
+from typing import Dict, Any, List
 import logging
 import asyncio
 
 logger = logging.getLogger(__name__)
 
+CREDITS_PER_IMAGE = {"basic": 1, "premium": 3}
+
 async def deduct_credits_for_processing(
     user_id: str,
     images_count: int,
@@ -31,7 +33,7 @@ async def deduct_credits_for_processing(
     """
 
     # 1. Calcular créditos a deducir
-    credits_per_image = 1 if processing_tier.lower() == "basic" else 3
+    credits_per_image = CREDITS_PER_IMAGE["basic"] if processing_tier.lower() == "basic" else CREDITS_PER_IMAGE["premium"]
 
     # Si algunas imágenes fallaron, solo cobrar las exitosas
     actual_count = successful_count if successful_count is not None else images_count
@@ -98,6 +100,72 @@ async def deduct_credits_for_processing(
             "job_id": job_id
         }
 
+def credits_for_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Créditos por resultado según el método que lo produjo realmente
+
+    Una imagen Premium que terminó en Basic (fallo de Qwen o hedge ganado
+    por el procesamiento local, ver simple_processing.py) tiene
+    method="local_rembg" y se cobra como Basic.
+
+    Args:
+        results: Resultados por imagen (con "success" y "method")
+
+    Returns:
+        Dict con imágenes y créditos por tier
+    """
+    premium = sum(1 for r in results if r.get("success") and r.get("method") == "qwen_premium")
+    basic = sum(1 for r in results if r.get("success") and r.get("method") != "qwen_premium")
+    return {
+        "premium_images": premium,
+        "basic_images": basic,
+        "premium_fallbacks": sum(1 for r in results if r.get("success") and r.get("premium_fallback")),
+        "total_credits": premium * CREDITS_PER_IMAGE["premium"] + basic * CREDITS_PER_IMAGE["basic"]
+    }
+
+async def deduct_credits_for_results(
+    user_id: str,
+    results: List[Dict[str, Any]],
+    job_id: str
+) -> Dict[str, Any]:
+    """
+    Deducir créditos por resultado (una transacción por tier usado)
+
+    Args:
+        user_id: ID del usuario
+        results: Resultados por imagen del job
+        job_id: ID del job procesado
+
+    Returns:
+        Dict con resultado de la deducción
+    """
+    billing = credits_for_results(results)
+    deductions = {}
+
+    for tier in ("premium", "basic"):
+        count = billing[f"{tier}_images"]
+        if count:
+            deductions[tier] = await deduct_credits_with_retry(
+                user_id=user_id,
+                images_count=count,
+                processing_tier=tier,
+                job_id=job_id
+            )
+
+    if billing["premium_fallbacks"]:
+        logger.info(
+            f"[DEDUCTION] Job {job_id}: {billing['premium_fallbacks']} Premium image(s) "
+            f"served by Basic, charged as Basic"
+        )
+
+    return {
+        "success": bool(deductions) and all(d["success"] for d in deductions.values()),
+        "credits_deducted": sum(d["credits_deducted"] for d in deductions.values()),
+        "billing": billing,
+        "deductions": deductions,
+        "job_id": job_id
+    }
+
 async def deduct_credits_with_retry(
     user_id: str,
     images_count: int,
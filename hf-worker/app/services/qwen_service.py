@@ -6,6 +6,7 @@ https://help.aliyun.com/zh/model-studio/developer-reference/qwen-image-edit-api
 
 import os
 import json
+import asyncio
 import base64
 import mimetypes
 import logging
@@ -13,16 +14,23 @@ import dashscope
 from dashscope import MultiModalConversation
 from pathlib import Path
 import requests
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from dotenv import load_dotenv
 
+from .qwen_client import DEFAULT_BASE_URL, ClientCall, get_qwen_client
+from .premium_payload import prepare_upload_image
+
 # Load environment variables
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-# Configure Singapore region
-dashscope.base_http_api_url = 'https://dashscope-intl.aliyuncs.com/api/v1'
+# Configure Singapore region (QWEN_BASE_URL overrides it, e.g. a local stub server)
+dashscope.base_http_api_url = os.getenv('QWEN_BASE_URL', DEFAULT_BASE_URL)
+
+# Premium client: "async" (pooled httpx client with rate limiting and retries,
+# see qwen_client.py) or "sdk" (blocking MultiModalConversation.call)
+QWEN_CLIENT = os.getenv('QWEN_CLIENT', 'async').lower()
 
 
 class QwenImageEditService:
@@ -46,17 +54,23 @@ class QwenImageEditService:
         else:
             logger.warning("WARNING: DASHSCOPE_API_KEY not configured")
 
-    def encode_image_to_base64(self, file_path: str) -> str:
+    def encode_image_to_base64(self, file_path: str, pipeline: str = None) -> str:
         """
         Convert image to base64 according to official specification
         Format: data:{MIME_type};base64,{base64_data}
 
         Args:
             file_path: Path to image file
+            pipeline: If given, the image is first downsized to the pipeline's
+                      output size and re-encoded without metadata
 
         Returns:
             Base64 encoded image with MIME type prefix
         """
+        if pipeline:
+            image_bytes, mime_type = prepare_upload_image(file_path, pipeline)
+            return f"data:{mime_type};base64,{base64.b64encode(image_bytes).decode('utf-8')}"
+
         path = Path(file_path)
 
         # Detect MIME type
@@ -76,7 +90,8 @@ class QwenImageEditService:
         self,
         input_path: str,
         output_path: str,
-        prompt: str = None
+        prompt: str = None,
+        pipeline: str = "amazon"
     ) -> Dict[str, Any]:
         """
         Remove background using Qwen Image Edit API
@@ -85,6 +100,7 @@ class QwenImageEditService:
             input_path: Path to input image
             output_path: Path to save processed image
             prompt: Instructions for the model (optional)
+            pipeline: Pipeline whose output size bounds the uploaded image
 
         Returns:
             Dict with success status and details
@@ -105,8 +121,8 @@ Maintain original product colors."""
             logger.info(f"Input: {Path(input_path).name}")
             logger.info(f"Prompt: {prompt[:100]}...")
 
-            # Convert image to base64
-            image_base64 = self.encode_image_to_base64(input_path)
+            # Downsize + convert image to base64
+            image_base64 = self.encode_image_to_base64(input_path, pipeline)
             logger.info(f"Image encoded: {len(image_base64)} characters")
 
             # Build messages according to official documentation
@@ -242,10 +258,15 @@ Remove all background elements."""
 
         prompt = prompts.get(pipeline.lower(), prompts["amazon"])
 
+        if QWEN_CLIENT == "async":
+            client = get_qwen_client()
+            return await asyncio.wrap_future(client.submit(client.remove_background(image_path, output_path, prompt, pipeline)))
+
         return self.remove_background(
             input_path=image_path,
             output_path=output_path,
-            prompt=prompt
+            prompt=prompt,
+            pipeline=pipeline
         )
 
 
@@ -253,6 +274,30 @@ Remove all background elements."""
 qwen_service = QwenImageEditService()
 
 
+# Optimized prompts by pipeline
+PIPELINE_PROMPTS = {
+    "amazon": """Remove the background completely from this product image and replace it with pure white (RGB 255, 255, 255).
+Keep ONLY the main product, remove everything else.
+Preserve all product details with maximum precision.
+Ensure the product covers exactly 85% of the image area.
+Remove ALL shadows, reflections, and background elements.""",
+
+    "ebay": """Remove the background completely and replace with pure white (RGB 255, 255, 255).
+Preserve MAXIMUM detail quality for zoom inspection.
+Keep all fine details: textures, engravings, small text.
+Remove all background shadows and elements.""",
+
+    "instagram": """Remove the background completely and replace with pure white (RGB 255, 255, 255).
+Create a visually appealing, social-media ready image.
+Enhance colors while maintaining natural look.
+Remove all background elements."""
+}
+
+
+def get_pipeline_prompt(pipeline: str) -> str:
+    return PIPELINE_PROMPTS.get(pipeline.lower(), PIPELINE_PROMPTS["amazon"])
+
+
 # Wrapper for compatibility with existing code
 def remove_background_premium_sync(
     input_path: str,
@@ -278,34 +323,42 @@ def remove_background_premium_sync(
             "fallback_to_basic": True
         }
 
-    # Optimized prompts by pipeline
-    prompts = {
-        "amazon": """Remove the background completely from this product image and replace it with pure white (RGB 255, 255, 255).
-Keep ONLY the main product, remove everything else.
-Preserve all product details with maximum precision.
-Ensure the product covers exactly 85% of the image area.
-Remove ALL shadows, reflections, and background elements.""",
-
-        "ebay": """Remove the background completely and replace with pure white (RGB 255, 255, 255).
-Preserve MAXIMUM detail quality for zoom inspection.
-Keep all fine details: textures, engravings, small text.
-Remove all background shadows and elements.""",
-
-        "instagram": """Remove the background completely and replace with pure white (RGB 255, 255, 255).
-Create a visually appealing, social-media ready image.
-Enhance colors while maintaining natural look.
-Remove all background elements."""
-    }
+    prompt = get_pipeline_prompt(pipeline)
 
-    prompt = prompts.get(pipeline.lower(), prompts["amazon"])
+    if QWEN_CLIENT == "async":
+        # Shared pooled client: rate limited to the quota, retried on 429/5xx
+        return get_qwen_client().remove_background_blocking(input_path, output_path, prompt, pipeline)
 
     return qwen_service.remove_background(
         input_path=input_path,
         output_path=output_path,
-        prompt=prompt
+        prompt=prompt,
+        pipeline=pipeline
     )
 
 
+def submit_premium(input_path: str, output_path: str, pipeline: str = "amazon") -> Optional[ClientCall]:
+    """
+    Start a Premium request without waiting for it (used for hedging)
+
+    Returns the running call (its future resolves to the remove_background
+    dict, cancel() aborts the request), or None when only the blocking SDK
+    path is available (QWEN_CLIENT=sdk or no API key).
+    """
+    if not qwen_service.available or QWEN_CLIENT != "async":
+        return None
+
+    client = get_qwen_client()
+    return client.spawn(client.remove_background(input_path, output_path, get_pipeline_prompt(pipeline), pipeline))
+
+
+def premium_latency_percentile(pct: float) -> Optional[float]:
+    """Recent end-to-end Premium latency percentile in seconds (None until enough samples)"""
+    if QWEN_CLIENT != "async":
+        return None
+    return get_qwen_client().latency_percentile(pct)
+
+
 def health_check() -> Dict[str, Any]:
     """Check Qwen API health"""
     return {
@@ -313,5 +366,6 @@ def health_check() -> Dict[str, Any]:
         "available": qwen_service.available,
         "api_key_configured": bool(qwen_service.api_key),
         "model": qwen_service.model,
-        "base_url": dashscope.base_http_api_url
+        "base_url": dashscope.base_http_api_url,
+        "client": QWEN_CLIENT
     }
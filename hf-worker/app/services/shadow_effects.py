@@ -3,11 +3,95 @@ Shadow Effects Module for Masterpost Worker
 Simplified version for HF Spaces deployment
 """
 
-from PIL import Image, ImageFilter
+import cv2
+import numpy as np
+from PIL import Image
 import logging
+from typing import Tuple
 
 logger = logging.getLogger(__name__)
 
+# Blur pixels per downscale step: the shadow blur runs at 1/N resolution
+SHADOW_BLUR_DOWNSCALE = 4
+
+def _shadow_luts(intensity: float, color: int, threshold: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Shadow LUTs: alpha -> shadow alpha, and blurred shadow alpha -> final gray
+
+    Matches the previous PIL render (color pasted through the mask onto a
+    transparent layer, RGBA blur, pasted on white): with s = blur(alpha)/255
+    the final pixel is color * s^2 + 255 * (1 - s), so one LUT is enough.
+    """
+    values = np.arange(256)
+    alpha_lut = np.where(values > threshold, (values * intensity).astype(np.int64), 0).clip(0, 255).astype(np.uint8)
+    s = values / 255.0
+    shade_lut = np.rint(color * s * s + 255.0 * (1.0 - s)).clip(0, 255).astype(np.uint8)
+    return alpha_lut, shade_lut
+
+def render_drop_shadow(img: Image.Image, intensity: float, offset: Tuple[int, int],
+                       blur_radius: float, margin: int, color: int = 150,
+                       threshold: int = 5) -> Image.Image:
+    """
+    Vectorized drop shadow on a white background (RGB)
+
+    - Shadow alpha from a LUT (no per-pixel lambdas)
+    - Blur only over the mask's bounding box, at reduced resolution
+      (downscale -> GaussianBlur -> upscale)
+    - A single composite into one RGB buffer: shadow, then product
+    """
+    if img.mode != 'RGBA':
+        img = img.convert('RGBA')
+
+    pixels = np.asarray(img)
+    alpha = pixels[:, :, 3]
+    height, width = alpha.shape
+    offset_x, offset_y = offset
+
+    canvas = np.full((height + margin * 2, width + margin * 2, 3), 255, dtype=np.uint8)
+
+    alpha_lut, shade_lut = _shadow_luts(intensity, color, threshold)
+    shadow_alpha = cv2.LUT(alpha, alpha_lut)
+
+    x, y, w, h = cv2.boundingRect(shadow_alpha)
+    if w and h:
+        # Blur region: bbox + 3 sigmas, aligned to the downscale factor
+        factor = max(1, int(blur_radius) // SHADOW_BLUR_DOWNSCALE)
+        pad = int(np.ceil(3 * blur_radius))
+        region_w = -(-(w + 2 * pad) // factor) * factor
+        region_h = -(-(h + 2 * pad) // factor) * factor
+
+        region = np.zeros((region_h, region_w), dtype=np.uint8)
+        region[pad:pad + h, pad:pad + w] = shadow_alpha[y:y + h, x:x + w]
+
+        if blur_radius > 0:
+            small = cv2.resize(region, (region_w // factor, region_h // factor), interpolation=cv2.INTER_AREA)
+            small = cv2.GaussianBlur(small, (0, 0), blur_radius / factor)
+            region = cv2.resize(small, (region_w, region_h), interpolation=cv2.INTER_LINEAR)
+
+        shade = cv2.cvtColor(cv2.LUT(region, shade_lut), cv2.COLOR_GRAY2RGB)
+
+        # Position on the canvas (clipped to its edges)
+        left = margin + offset_x + x - pad
+        top = margin + offset_y + y - pad
+        x0, y0 = max(left, 0), max(top, 0)
+        x1 = min(left + region_w, canvas.shape[1])
+        y1 = min(top + region_h, canvas.shape[0])
+        if x1 > x0 and y1 > y0:
+            canvas[y0:y1, x0:x1] = shade[y0 - top:y1 - top, x0 - left:x1 - left]
+
+    # Product on top, only inside its bounding box: out = p * a + bg * (1 - a)
+    x, y, w, h = cv2.boundingRect(alpha)
+    if w and h:
+        a = cv2.cvtColor(alpha[y:y + h, x:x + w], cv2.COLOR_GRAY2RGB)
+        product = np.ascontiguousarray(pixels[y:y + h, x:x + w, :3])
+        target = canvas[margin + y:margin + y + h, margin + x:margin + x + w]
+        target[:] = cv2.add(
+            cv2.multiply(product, a, scale=1 / 255),
+            cv2.multiply(target, cv2.bitwise_not(a), scale=1 / 255)
+        )
+
+    return Image.fromarray(canvas, 'RGB')
+
 def apply_simple_drop_shadow(image, intensity=0.5):
     """
     Simplified drop shadow - optimized for performance
@@ -26,42 +110,16 @@ def apply_simple_drop_shadow(image, intensity=0.5):
         if image.mode != 'RGBA':
             image = image.convert('RGBA')
 
-        width, height = image.size
-
         # Shadow parameters (fixed for simplicity and performance)
         offset_x = 15
         offset_y = 15
         blur_radius = 20
-
-        # Create expanded canvas for shadow
         padding = blur_radius + offset_x + offset_y
-        shadow_size = (width + padding * 2, height + padding * 2)
-
-        # Extract alpha channel for shadow mask
-        alpha = image.split()[3]
-
-        # Create shadow layer
-        shadow = Image.new('RGBA', image.size, (0, 0, 0, 0))
-        shadow_alpha = alpha.point(lambda x: int(x * intensity) if x > 10 else 0)
-        shadow.paste((100, 100, 100, 255), (0, 0), shadow_alpha)
-
-        # Apply Gaussian blur to shadow
-        shadow = shadow.filter(ImageFilter.GaussianBlur(blur_radius))
-
-        # Create final canvas with WHITE background
-        result = Image.new('RGB', shadow_size, (255, 255, 255))
-
-        # Position shadow with offset
-        shadow_x = padding + offset_x
-        shadow_y = padding + offset_y
-
-        # Paste shadow (convert to RGB for white background)
-        shadow_rgb = Image.new('RGB', shadow.size, (255, 255, 255))
-        shadow_rgb.paste(shadow, mask=shadow.split()[3] if shadow.mode == 'RGBA' else None)
-        result.paste(shadow_rgb, (shadow_x, shadow_y))
 
-        # Paste original product on top of shadow
-        result.paste(image, (padding, padding), image)
+        result = render_drop_shadow(
+            image, intensity=intensity, offset=(offset_x, offset_y), blur_radius=blur_radius,
+            margin=padding, color=100, threshold=10
+        )
 
         logger.info(f"✓ Shadow applied successfully, result size: {result.size}")
         return result
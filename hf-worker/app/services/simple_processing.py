@@ -13,6 +13,8 @@ from pathlib import Path
 
 # Import shadow effects module (working version with class-based approach)
 from ..processing.shadow_effects import apply_professional_shadow, ShadowEffects
+from ..processing.compositor import composite_on_white
+from .result_cache import get_result_cache, hash_bytes, build_cache_key
 
 # Import Qwen premium service
 try:
@@ -34,6 +36,10 @@ except Exception as e:
     logger.error(f"[OPTIMIZATION] Failed to pre-load model: {e}")
     REMBG_SESSION = None
 
+# Part of the result cache key: bump RESULT_CACHE_VERSION when rendering changes
+RESULT_CACHE_VERSION = os.getenv("RESULT_CACHE_VERSION", "2")
+BASIC_MODEL_VERSION = f"u2net|v{RESULT_CACHE_VERSION}"
+
 def apply_simple_shadow(img_rgba: Image.Image, shadow_type: str = 'drop', intensity: float = 0.5, blur_radius: int = 15) -> Image.Image:
     """
     Simple shadow effect using PIL in-memory (no temp files)
@@ -210,15 +216,11 @@ def remove_background_simple(input_path: str, output_path: str, shadow_params: d
                 logger.error("=" * 60)
                 import traceback
                 traceback.print_exc()
-                # Create white background as fallback
-                white_bg = Image.new('RGB', img_no_bg.size, (255, 255, 255))
-                white_bg.paste(img_no_bg, (0, 0), img_no_bg)
-                img_final = white_bg
+                # White background as fallback
+                img_final = composite_on_white(img_no_bg)
         else:
-            # Create white background (no shadow)
-            white_bg = Image.new('RGB', img_no_bg.size, (255, 255, 255))
-            white_bg.paste(img_no_bg, (0, 0), img_no_bg)
-            img_final = white_bg
+            # White background (no shadow)
+            img_final = composite_on_white(img_no_bg)
 
         # Ensure output directory exists
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
@@ -237,6 +239,93 @@ def process_image_simple(input_path: str, output_path: str, pipeline: str = "ama
     """
     Process image with Basic (local rembg) or Premium (Qwen API) processing
 
+    Results are cached by content (see result_cache.py): re-uploads of an
+    image with the same settings are served from the cache without running
+    segmentation or calling the Premium API.
+
+    Args:
+        input_path: Path to input image
+        output_path: Path for processed image
+        pipeline: Pipeline type (amazon, instagram, ebay)
+        shadow_params: Optional shadow parameters dict
+        use_premium: If True, use Qwen API (Premium, 3 credits)
+                     If False, use local rembg (Basic, 1 credit)
+
+    Returns:
+        dict: Processing result with cost information
+    """
+    cache = get_result_cache()
+    if cache is None:
+        return _process_image_uncached(input_path, output_path, pipeline, shadow_params, use_premium)
+
+    premium_available = use_premium and QWEN_AVAILABLE and qwen_service.available
+    tier = "premium" if premium_available else "basic"
+    model_version = f"{qwen_service.model}|v{RESULT_CACHE_VERSION}" if premium_available else BASIC_MODEL_VERSION
+
+    with open(input_path, 'rb') as f:
+        input_hash = hash_bytes(f.read())
+    cache_key = build_cache_key(
+        input_hash, pipeline, tier,
+        None if tier == "premium" else shadow_params,  # Premium ignores shadow settings
+        model_version
+    )
+
+    cached = cache.get(cache_key)
+    if cached is not None:
+        with open(output_path, 'wb') as f:
+            f.write(cached)
+        logger.info(f"⚡ Result cache hit ({tier}) for: {Path(input_path).name}")
+        return build_cached_result(input_path, output_path, pipeline, shadow_params, tier)
+
+    result = _process_image_uncached(input_path, output_path, pipeline, shadow_params, use_premium)
+
+    # Only cache results produced by the requested tier (not Premium -> Basic fallbacks)
+    produced_tier = "premium" if result.get("method") == "qwen_premium" else "basic"
+    if result.get("success") and produced_tier == tier:
+        try:
+            with open(result["output_path"], 'rb') as f:
+                cache.put(cache_key, f.read())
+        except Exception as e:
+            logger.warning(f"Result cache store failed: {e}")
+
+    return result
+
+def build_cached_result(input_path: str, output_path: str, pipeline: str, shadow_params: dict, tier: str) -> dict:
+    """Result dict for a cache hit (same shape as a freshly processed image)"""
+    if tier == "premium":
+        return {
+            "success": True,
+            "method": "qwen_premium",
+            "pipeline": pipeline,
+            "input_path": input_path,
+            "output_path": output_path,
+            "cost": 0.0,  # No API call was made
+            "credits_used": 3,
+            "shadow_applied": False,
+            "shadow_type": None,
+            "cache_hit": True,
+            "message": "Background removed successfully with Premium AI (cached)"
+        }
+
+    shadow_enabled = bool(shadow_params and shadow_params.get('enabled', False))
+    return {
+        "success": True,
+        "method": "local_rembg",
+        "pipeline": pipeline,
+        "input_path": input_path,
+        "output_path": output_path,
+        "cost": 0.0,
+        "credits_used": 1,
+        "shadow_applied": shadow_enabled,
+        "shadow_type": shadow_params.get('type', 'drop') if shadow_enabled else None,
+        "cache_hit": True,
+        "message": "Background removed successfully (cached)"
+    }
+
+def _process_image_uncached(input_path: str, output_path: str, pipeline: str = "amazon", shadow_params: dict = None, use_premium: bool = False) -> dict:
+    """
+    Process image with Basic (local rembg) or Premium (Qwen API) processing
+
     Args:
         input_path: Path to input image
         output_path: Path for processed image
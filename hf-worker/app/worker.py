@@ -4,11 +4,12 @@ Handles background removal and shadow effects using rembg
 """
 
 import os
+import asyncio
 import tempfile
 import logging
 from pathlib import Path
 from rembg import remove, new_session
-from PIL import Image
+from PIL import Image, ImageOps
 import httpx
 from typing import Optional
 
@@ -21,6 +22,9 @@ except ImportError:
 
 # Import shadow effects
 from services.shadow_effects import apply_simple_drop_shadow
+from processing.compositor import composite_on_white
+from services.segmentation import create_segmenter, mask_to_image
+from services.result_cache import get_result_cache, hash_bytes, build_cache_key
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -50,6 +54,20 @@ except Exception as e:
     logger.error(f"Failed to pre-load model: {e}")
     REMBG_SESSION = None
 
+# Micro-batched U2-Net inference shared by concurrent jobs
+# (REMBG_MAX_BATCH=1 runs inference per image in the calling thread)
+SEGMENTER = create_segmenter(
+    REMBG_SESSION,
+    max_batch_size=int(os.getenv("REMBG_MAX_BATCH", "8")),
+    max_wait_ms=float(os.getenv("REMBG_MAX_WAIT_MS", "20"))
+)
+
+# Content-addressed result cache (HF Spaces only allows writing to /tmp)
+os.environ.setdefault("RESULT_CACHE_DIR", "/tmp/masterpost_cache")
+RESULT_CACHE = get_result_cache()
+RESULT_CACHE_VERSION = os.getenv("RESULT_CACHE_VERSION", "2")
+WORKER_MODEL_VERSION = f"u2net|worker|v{RESULT_CACHE_VERSION}"
+
 async def process_image_job(
     job_id: str,
     image_url: str,
@@ -91,112 +109,63 @@ async def process_image_job(
 
         update_job_status(job_id, "processing", 30)
 
-        # 2. Save to temporary file (HF Spaces only allows writing to /tmp)
-        logger.info("[2/5] Saving to temporary file")
-        with tempfile.NamedTemporaryFile(suffix=".jpg", dir="/tmp", delete=False) as tmp_input:
-            tmp_input.write(image_data)
-            tmp_input.flush()
-            input_path = tmp_input.name
-            logger.info(f"✓ Saved to {input_path}")
-
-        try:
-            # 3. Remove background with rembg
-            logger.info("[3/5] Removing background with rembg")
-            with Image.open(input_path) as img:
-                logger.info(f"  Original size: {img.size}")
-
-                # Remove background
-                if REMBG_SESSION:
-                    output = remove(img, session=REMBG_SESSION)
-                    logger.info("  Using pre-loaded session")
-                else:
-                    output = remove(img)
-                    logger.info("  Using default session")
-
-                # Ensure RGBA mode
-                if output.mode != 'RGBA':
-                    output = output.convert('RGBA')
-
-                logger.info(f"✓ Background removed, output mode: {output.mode}")
-
-            update_job_status(job_id, "processing", 60)
-
-            # 4. Apply shadow effects if enabled
-            if enable_shadows and shadow_type and shadow_type != "none":
-                logger.info(f"[4/5] Applying {shadow_type} shadow (intensity: {shadow_intensity})")
-
-                try:
-                    output = apply_simple_drop_shadow(
-                        image=output,
-                        intensity=shadow_intensity
-                    )
-                    logger.info(f"✓ Shadow applied successfully")
-                except Exception as shadow_error:
-                    logger.error(f"Shadow application failed: {shadow_error}")
-                    logger.info("  Falling back to white background without shadow")
-                    # Create white background as fallback
-                    white_bg = Image.new('RGB', output.size, (255, 255, 255))
-                    white_bg.paste(output, (0, 0), output)
-                    output = white_bg
-            else:
-                logger.info("[4/5] No shadow - creating white background")
-                # Create white background
-                white_bg = Image.new('RGB', output.size, (255, 255, 255))
-                white_bg.paste(output, (0, 0), output)
-                output = white_bg
-
-            update_job_status(job_id, "processing", 80)
-
-            # 5. Save result
-            logger.info("[5/5] Saving processed result")
-            result_path = f"/tmp/{job_id}_result.jpg"
-            output.save(result_path, "JPEG", quality=95)
-            logger.info(f"✓ Result saved to {result_path}")
-
-            # 6. Upload to Supabase Storage (if available)
-            result_url = None
-            if supabase:
-                logger.info("Uploading result to Supabase Storage")
-                try:
-                    with open(result_path, "rb") as f:
-                        file_data = f.read()
-
-                    # Upload to 'processed' bucket
-                    filename = f"{job_id}_result.jpg"
-                    upload_result = supabase.storage.from_("processed").upload(
-                        filename,
-                        file_data,
-                        {"content-type": "image/jpeg", "upsert": "true"}
-                    )
-
-                    # Get public URL
-                    result_url = supabase.storage.from_("processed").get_public_url(filename)
-                    logger.info(f"✓ Uploaded to: {result_url}")
-
-                except Exception as upload_error:
-                    logger.error(f"Upload to Supabase failed: {upload_error}")
-                    logger.info("  Job will complete without storage URL")
-            else:
-                logger.warning("⚠ Supabase not available, cannot upload result")
-
-            # 7. Update job status to completed
-            update_job_status(job_id, "completed", 100, result_url)
-
-            # 8. Cleanup temporary files
-            logger.info("Cleaning up temporary files")
-            if os.path.exists(input_path):
-                os.remove(input_path)
-            if os.path.exists(result_path):
-                os.remove(result_path)
+        result_path = f"/tmp/{job_id}_result.jpg"
+
+        # Same image + same settings -> reuse the stored result (no segmentation)
+        cache_key = build_cache_key(
+            hash_bytes(image_data), pipeline, "basic",
+            {"enabled": enable_shadows and shadow_type not in (None, "none"), "type": shadow_type, "intensity": shadow_intensity},
+            WORKER_MODEL_VERSION
+        )
+        cached = RESULT_CACHE.get(cache_key) if RESULT_CACHE else None
+
+        if cached is not None:
+            logger.info("✓ Result cache hit - skipping background removal")
+            with open(result_path, "wb") as f:
+                f.write(cached)
+        else:
+            await render_result(image_data, result_path, shadow_type, enable_shadows, shadow_intensity, job_id)
+            if RESULT_CACHE:
+                with open(result_path, "rb") as f:
+                    RESULT_CACHE.put(cache_key, f.read())
+
+        # 6. Upload to Supabase Storage (if available)
+        result_url = None
+        if supabase:
+            logger.info("Uploading result to Supabase Storage")
+            try:
+                with open(result_path, "rb") as f:
+                    file_data = f.read()
+
+                # Upload to 'processed' bucket
+                filename = f"{job_id}_result.jpg"
+                upload_result = supabase.storage.from_("processed").upload(
+                    filename,
+                    file_data,
+                    {"content-type": "image/jpeg", "upsert": "true"}
+                )
+
+                # Get public URL
+                result_url = supabase.storage.from_("processed").get_public_url(filename)
+                logger.info(f"✓ Uploaded to: {result_url}")
+
+            except Exception as upload_error:
+                logger.error(f"Upload to Supabase failed: {upload_error}")
+                logger.info("  Job will complete without storage URL")
+        else:
+            logger.warning("⚠ Supabase not available, cannot upload result")
+
+        # 7. Update job status to completed
+        update_job_status(job_id, "completed", 100, result_url)
+
+        # 8. Cleanup temporary files
+        logger.info("Cleaning up temporary files")
+        if os.path.exists(result_path):
+            os.remove(result_path)
 
-            logger.info("=" * 80)
-            logger.info(f"✓ Job {job_id} completed successfully")
-            logger.info("=" * 80)
-
-        finally:
-            # Ensure temp input file is always cleaned up
-            if os.path.exists(input_path):
-                os.remove(input_path)
+        logger.info("=" * 80)
+        logger.info(f"✓ Job {job_id} completed successfully")
+        logger.info("=" * 80)
 
     except httpx.HTTPError as http_error:
         logger.error(f"HTTP error downloading image: {http_error}")
@@ -205,6 +174,83 @@ async def process_image_job(
         logger.error(f"Job {job_id} failed: {str(e)}", exc_info=True)
         update_job_status(job_id, "failed", 0, error=str(e))
 
+async def render_result(
+    image_data: bytes,
+    result_path: str,
+    shadow_type: Optional[str],
+    enable_shadows: bool,
+    shadow_intensity: float,
+    job_id: str
+):
+    """Background removal + shadow/white background, saved as JPEG to result_path"""
+    # 2. Save to temporary file (HF Spaces only allows writing to /tmp)
+    logger.info("[2/5] Saving to temporary file")
+    with tempfile.NamedTemporaryFile(suffix=".jpg", dir="/tmp", delete=False) as tmp_input:
+        tmp_input.write(image_data)
+        tmp_input.flush()
+        input_path = tmp_input.name
+        logger.info(f"✓ Saved to {input_path}")
+
+    try:
+        # 3. Remove background with rembg
+        logger.info("[3/5] Removing background with rembg")
+        with Image.open(input_path) as img:
+            logger.info(f"  Original size: {img.size}")
+
+            # Remove background
+            if SEGMENTER:
+                # Await the batched mask so concurrent jobs can share one ONNX run
+                img = ImageOps.exif_transpose(img)
+                lowres_mask = await asyncio.wrap_future(SEGMENTER.submit(img))
+                output = img.convert('RGBA')
+                output.putalpha(mask_to_image(lowres_mask, img.size))
+                logger.info("  Using batched segmenter")
+            elif REMBG_SESSION:
+                output = remove(img, session=REMBG_SESSION)
+                logger.info("  Using pre-loaded session")
+            else:
+                output = remove(img)
+                logger.info("  Using default session")
+
+            # Ensure RGBA mode
+            if output.mode != 'RGBA':
+                output = output.convert('RGBA')
+
+            logger.info(f"✓ Background removed, output mode: {output.mode}")
+
+        update_job_status(job_id, "processing", 60)
+
+        # 4. Apply shadow effects if enabled
+        if enable_shadows and shadow_type and shadow_type != "none":
+            logger.info(f"[4/5] Applying {shadow_type} shadow (intensity: {shadow_intensity})")
+
+            try:
+                output = apply_simple_drop_shadow(
+                    image=output,
+                    intensity=shadow_intensity
+                )
+                logger.info(f"✓ Shadow applied successfully")
+            except Exception as shadow_error:
+                logger.error(f"Shadow application failed: {shadow_error}")
+                logger.info("  Falling back to white background without shadow")
+                # White background as fallback
+                output = composite_on_white(output)
+        else:
+            logger.info("[4/5] No shadow - creating white background")
+            output = composite_on_white(output)
+
+        update_job_status(job_id, "processing", 80)
+
+        # 5. Save result
+        logger.info("[5/5] Saving processed result")
+        output.save(result_path, "JPEG", quality=95)
+        logger.info(f"✓ Result saved to {result_path}")
+
+    finally:
+        # Ensure temp input file is always cleaned up
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
 def update_job_status(
     job_id: str,
     status: str,
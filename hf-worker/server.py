@@ -23,6 +23,7 @@ from fastapi.staticfiles import StaticFiles
 # Import our simple processing function
 from app.services.simple_processing import process_image_simple
 from app.services.batch_processor import SmartBatchProcessor
+from app.services.result_cache import get_result_cache
 
 # Set up logging with detailed format for HF Spaces
 logging.basicConfig(
@@ -999,6 +1000,14 @@ async def get_all_gallery_items():
 # END GALLERY ENDPOINTS
 # =======================================
 
+@app.get("/api/v1/metrics/cache")
+async def get_cache_metrics():
+    """Result cache metrics (hit rate, tier usage, evictions)"""
+    result_cache = get_result_cache()
+    if not result_cache:
+        return {"enabled": False}
+    return {"enabled": True, **result_cache.get_stats()}
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""